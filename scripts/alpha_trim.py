@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Trim the transparent margins of background-removed wrapper photos.
+
+The *-removebg-preview uploads and the bg_remove outputs keep the frame
+of the original photo: often half of the pixels are fully transparent,
+and every resize, encode and transfer afterwards pays for them. This
+stage finds the alpha bounding box with one reduction per axis, crops to
+it plus a padding, and writes the result to attached_assets/trimmed/.
+
+The crop box is recorded in the wrapper catalog (trims table), keyed by
+the trimmed file's URL, so the original placement can be rebuilt:
+
+    with WrapperCatalog.open() as catalog:
+        catalog.trim("/attached_assets/trimmed/x_trimmed.png")
+        # {"source": "/attached_assets/x.png", "left": 40, "top": 45, ...}
+
+Images without an alpha channel, or whose margins are already within the
+padding, are left as they are and reported as not trimmed.
+
+Usage:
+    python scripts/alpha_trim.py [images ...] [--padding 8] [--threshold 0] [--in-place] [--jobs N]
+"""
+
+import argparse
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from asset_store import ASSETS_DIR
+from rotation_engine import add_jobs_argument
+from wrapper_catalog import CATALOG_FILE, WrapperCatalog
+
+TRIMMED_DIR = os.path.join(ASSETS_DIR, "trimmed")
+DEFAULT_PADDING = 8
+# Alpha values at or below this count as transparent (feathering leaves faint specks)
+DEFAULT_THRESHOLD = 0
+DEFAULT_PATTERNS = (
+    os.path.join(ASSETS_DIR, "*-removebg-preview*.png"),
+    os.path.join(ASSETS_DIR, "processed", "*.png"),
+)
+
+
+def alpha_bbox(alpha, threshold=DEFAULT_THRESHOLD):
+    """(left, top, right, bottom) of the pixels more opaque than threshold, or None if there are none"""
+    visible = alpha > threshold
+    rows = np.flatnonzero(visible.any(axis=1))
+    if len(rows) == 0:
+        return None
+    columns = np.flatnonzero(visible.any(axis=0))
+    return int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1
+
+
+def padded_box(bbox, size, padding=DEFAULT_PADDING):
+    """Grow a box by padding on every side, clamped to the image"""
+    left, top, right, bottom = bbox
+    width, height = size
+    return max(0, left - padding), max(0, top - padding), min(width, right + padding), min(height, bottom + padding)
+
+
+def trim_box(img, padding=DEFAULT_PADDING, threshold=DEFAULT_THRESHOLD):
+    """Crop box for an image, or None when there is nothing to trim"""
+    if 'A' not in img.getbands() and not img.has_transparency_data:
+        return None
+    alpha = np.asarray(img.getchannel('A') if 'A' in img.getbands() else img.convert('RGBA').getchannel('A'))
+    bbox = alpha_bbox(alpha, threshold)
+    if bbox is None:
+        return None
+    box = padded_box(bbox, img.size, padding)
+    return None if box == (0, 0) + img.size else box
+
+
+def trimmed_path(input_path, output_dir=TRIMMED_DIR):
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(output_dir, f"{stem}_trimmed.png")
+
+
+def trim_file(input_path, output_path, padding=DEFAULT_PADDING, threshold=DEFAULT_THRESHOLD):
+    """Crop one image to its alpha bounding box; returns a result dict
+
+    When there is nothing to trim no file is written and output_path is
+    the input itself.
+    """
+    result = {
+        "input_path": input_path,
+        "output_path": input_path,
+        "width": None,
+        "height": None,
+        "box": None,
+        "trimmed": False,
+        "success": False,
+        "error": None,
+    }
+    try:
+        with Image.open(input_path) as img:
+            result["width"], result["height"] = img.size
+            box = trim_box(img, padding, threshold)
+            if box is not None:
+                os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+                temp_path = output_path + '.tmp'
+                img.crop(box).save(temp_path, 'PNG', icc_profile=img.info.get('icc_profile'))
+                os.replace(temp_path, output_path)
+                result["output_path"] = output_path
+                result["box"] = list(box)
+                result["trimmed"] = True
+        result["success"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def _trim_file(args):
+    return trim_file(*args)
+
+
+def trim_files(jobs_list, padding=DEFAULT_PADDING, threshold=DEFAULT_THRESHOLD, jobs=None):
+    """Trim (input_path, output_path) pairs in a process pool, yielding results in order"""
+    work = [(input_path, output_path, padding, threshold) for input_path, output_path in jobs_list]
+    if (jobs is not None and jobs <= 1) or len(work) <= 1:
+        yield from map(_trim_file, work)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(_trim_file, work)
+
+
+def site_url(path):
+    """/attached_assets/... URL of a file, as the catalog stores paths"""
+    return '/' + os.path.relpath(path).replace(os.sep, '/')
+
+
+def record_trims(results, padding=DEFAULT_PADDING):
+    """Record the crop box of every trimmed result in the wrapper catalog"""
+    trims = [
+        {
+            "path": site_url(result["output_path"]),
+            "source": site_url(result["input_path"]),
+            "source_width": result["width"],
+            "source_height": result["height"],
+            "box": result["box"],
+            "padding": padding,
+        }
+        for result in results if result["trimmed"]
+    ]
+    if trims:
+        with WrapperCatalog.open() as catalog:
+            catalog.record_trims(trims)
+    return len(trims)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crop background-removed images to their alpha bounding box")
+    parser.add_argument("images", nargs="*", help=f"images or glob patterns (default: {' '.join(DEFAULT_PATTERNS)})")
+    parser.add_argument("--padding", type=int, default=DEFAULT_PADDING,
+                        help=f"transparent pixels kept around the bounding box (default: {DEFAULT_PADDING})")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+                        help=f"alpha values up to this count as transparent (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--in-place", action="store_true", help=f"overwrite the images instead of writing {TRIMMED_DIR}")
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    inputs = []
+    for pattern in args.images or DEFAULT_PATTERNS:
+        matches = sorted(glob.glob(pattern)) or ([pattern] if args.images else [])
+        inputs.extend(path for path in matches if path not in inputs)
+    pairs = [(path, path if args.in_place else trimmed_path(path)) for path in inputs]
+    print(f"Trimming {len(pairs)} images...")
+
+    results = []
+    pixels_before = pixels_after = 0
+    for result in trim_files(pairs, args.padding, args.threshold, args.jobs):
+        results.append(result)
+        name = os.path.basename(result["input_path"])
+        if not result["success"]:
+            print(f"✗ Error trimming {name}: {result['error']}")
+        elif not result["trimmed"]:
+            print(f"↺ Nothing to trim: {name}")
+        else:
+            left, top, right, bottom = result["box"]
+            before = result["width"] * result["height"]
+            after = (right - left) * (bottom - top)
+            pixels_before += before
+            pixels_after += after
+            print(f"✓ {name}: {result['width']}x{result['height']} -> {right - left}x{bottom - top} "
+                  f"at ({left}, {top}), -{100 * (before - after) / before:.0f}% pixels")
+
+    recorded = record_trims(results, args.padding)
+    if recorded:
+        print(f"\n📊 {recorded} images trimmed: {pixels_before / 1e6:.1f} MP -> {pixels_after / 1e6:.1f} MP "
+              f"(-{100 * (pixels_before - pixels_after) / pixels_before:.0f}%)")
+        print(f"📋 Crop offsets recorded in: {CATALOG_FILE}")
+    else:
+        print("\n📊 Nothing trimmed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,102 +1,128 @@
 #!/usr/bin/env python3
 """
 Apply all wrapper photo updates to server/storage.ts efficiently
+
+Once scripts/seed_data.py export has run, the site reads the NDJSON seed
+dataset instead, so the same updates are applied to its records.
 """
 
-import re
+from perceptual_hash import NearDuplicateGuard
+from seed_data import SeedDataset
+from storage_ts import StorageFile, parse_value
+
+# Define updates as (promotion_slug, new_wrapper_urls_to_add)
+WRAPPER_UPDATES = {
+    'cartoon-network-2019': [
+        '"/attached_assets/rotated/Cartoon network chocolate_1755196507571_rotated.png"',
+        '"/attached_assets/rotated/Chocolate Cartoon network_1755196507572_rotated.png"'
+    ],
+    'ecolokitos-2012': [
+        '"/attached_assets/rotated/Cajeta frontal ecolokitos_1755196507570_rotated.png"',
+        '"/attached_assets/rotated/Chocolate frontal ecolokitos_1755196507572_rotated.png"'
+    ],
+    'funki-punky-extremo-2011': [
+        '"/attached_assets/rotated/Cajeta funki punky extremo_1755196507570_rotated.png"'
+    ],
+    'tortugas-ninja-2014': [
+        '"/attached_assets/rotated/Cajeta tortugas ninja_1755196507571_rotated.png"'
+    ],
+    'conexion-alien-2004': [
+        '"/attached_assets/rotated/Chocolate conexion alien 2004 frontal_1755196507572_rotated.png"'
+    ],
+    'spiderman-3-2007': [
+        '"/attached_assets/rotated/Chocolate frontal spiderman 3_1755196507572_rotated.png"'
+    ],
+    'reyes-de-las-olas-2011': [
+        '"/attached_assets/rotated/Chocolate frontalreyes de las olas_1755196507573_rotated.png"'
+    ],
+    'dance-mania-2008': [
+        '"/attached_assets/rotated/Dance mania 2008 vainilla frontal_1755196507566_rotated.png"'
+    ],
+    'askistix-2004': [
+        '"/attached_assets/rotated/Askistix 2004 chocolate frontal_1755196507567_rotated.png"'
+    ],
+    'avengers-2012': [
+        '"/attached_assets/rotated/Avengers cajeta_1755196507567_rotated.png"',
+        '"/attached_assets/rotated/Avengers vainilla_1755196507568_rotated.png"'
+    ]
+}
+
+# imageUrl for promotions that didn't have images
+IMAGE_UPDATES = {
+    'cartoon-network-2019': '"/attached_assets/rotated/Cartoon network chocolate_1755196507571_rotated.png"',
+    'ecolokitos-2012': '"/attached_assets/rotated/Cajeta frontal ecolokitos_1755196507570_rotated.png"',
+    'funki-punky-extremo-2011': '"/attached_assets/rotated/Cajeta funki punky extremo_1755196507570_rotated.png"',
+    'tortugas-ninja-2014': '"/attached_assets/rotated/Cajeta tortugas ninja_1755196507571_rotated.png"',
+    'conexion-alien-2004': '"/attached_assets/rotated/Chocolate conexion alien 2004 frontal_1755196507572_rotated.png"',
+    'spiderman-3-2007': '"/attached_assets/rotated/Chocolate frontal spiderman 3_1755196507572_rotated.png"',
+    'reyes-de-las-olas-2011': '"/attached_assets/rotated/Chocolate frontalreyes de las olas_1755196507573_rotated.png"',
+    'dance-mania-2008': '"/attached_assets/rotated/Dance mania 2008 vainilla frontal_1755196507566_rotated.png"',
+    'askistix-2004': '"/attached_assets/rotated/Askistix 2004 chocolate frontal_1755196507567_rotated.png"',
+    'avengers-2012': '"/attached_assets/rotated/Avengers cajeta_1755196507567_rotated.png"'
+}
+
+
+def update_storage(guard):
+    # Parse the storage file once; all updates are written in a single splice
+    storage = StorageFile.load()
 
-def main():
-    # Read the current storage file
-    with open('server/storage.ts', 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Define updates as (promotion_slug, new_wrapper_urls_to_add)
-    wrapper_updates = {
-        'cartoon-network-2019': [
-            '"/attached_assets/rotated/Cartoon network chocolate_1755196507571_rotated.png"',
-            '"/attached_assets/rotated/Chocolate Cartoon network_1755196507572_rotated.png"'
-        ],
-        'ecolokitos-2012': [
-            '"/attached_assets/rotated/Cajeta frontal ecolokitos_1755196507570_rotated.png"',
-            '"/attached_assets/rotated/Chocolate frontal ecolokitos_1755196507572_rotated.png"'
-        ],
-        'funki-punky-extremo-2011': [
-            '"/attached_assets/rotated/Cajeta funki punky extremo_1755196507570_rotated.png"'
-        ],
-        'tortugas-ninja-2014': [
-            '"/attached_assets/rotated/Cajeta tortugas ninja_1755196507571_rotated.png"'
-        ],
-        'conexion-alien-2004': [
-            '"/attached_assets/rotated/Chocolate conexion alien 2004 frontal_1755196507572_rotated.png"'
-        ],
-        'spiderman-3-2007': [
-            '"/attached_assets/rotated/Chocolate frontal spiderman 3_1755196507572_rotated.png"'
-        ],
-        'reyes-de-las-olas-2011': [
-            '"/attached_assets/rotated/Chocolate frontalreyes de las olas_1755196507573_rotated.png"'
-        ],
-        'dance-mania-2008': [
-            '"/attached_assets/rotated/Dance mania 2008 vainilla frontal_1755196507566_rotated.png"'
-        ],
-        'askistix-2004': [
-            '"/attached_assets/rotated/Askistix 2004 chocolate frontal_1755196507567_rotated.png"'
-        ],
-        'avengers-2012': [
-            '"/attached_assets/rotated/Avengers cajeta_1755196507567_rotated.png"',
-            '"/attached_assets/rotated/Avengers vainilla_1755196507568_rotated.png"'
-        ]
-    }
-    
     # Apply updates
-    for slug, new_urls in wrapper_updates.items():
+    for slug, new_urls in WRAPPER_UPDATES.items():
         # Find the promotion with this slug
-        pattern = rf'(slug: "{slug}".*?wrapperPhotosUrls: \[)(.*?)(\])'
-        match = re.search(pattern, content, re.DOTALL)
+        promotion = storage.find(slug=slug)
         
-        if match:
-            prefix = match.group(1)
-            current_urls = match.group(2)
-            suffix = match.group(3)
-            
-            # If wrapperPhotosUrls is null, initialize it
-            if 'null' in current_urls:
-                new_urls_str = '\n        ' + ',\n        '.join(new_urls) + '\n      '
+        if promotion:
+            added = guard.append_photos(storage, promotion, new_urls)
+            if added:
+                print(f"Updated {slug} with {len(added)} new wrapper photos")
             else:
-                # Add to existing URLs
-                new_urls_str = current_urls.rstrip() + ',\n        ' + ',\n        '.join(new_urls) + '\n      '
-            
-            replacement = prefix + new_urls_str + suffix
-            content = content.replace(match.group(0), replacement)
-            print(f"Updated {slug} with {len(new_urls)} new wrapper photos")
+                print(f"{slug} already has these wrapper photos")
         else:
             print(f"Could not find promotion with slug: {slug}")
     
-    # Also update imageUrl for promotions that didn't have images
-    image_updates = {
-        'cartoon-network-2019': '"/attached_assets/rotated/Cartoon network chocolate_1755196507571_rotated.png"',
-        'ecolokitos-2012': '"/attached_assets/rotated/Cajeta frontal ecolokitos_1755196507570_rotated.png"',
-        'funki-punky-extremo-2011': '"/attached_assets/rotated/Cajeta funki punky extremo_1755196507570_rotated.png"',
-        'tortugas-ninja-2014': '"/attached_assets/rotated/Cajeta tortugas ninja_1755196507571_rotated.png"',
-        'conexion-alien-2004': '"/attached_assets/rotated/Chocolate conexion alien 2004 frontal_1755196507572_rotated.png"',
-        'spiderman-3-2007': '"/attached_assets/rotated/Chocolate frontal spiderman 3_1755196507572_rotated.png"',
-        'reyes-de-las-olas-2011': '"/attached_assets/rotated/Chocolate frontalreyes de las olas_1755196507573_rotated.png"',
-        'dance-mania-2008': '"/attached_assets/rotated/Dance mania 2008 vainilla frontal_1755196507566_rotated.png"',
-        'askistix-2004': '"/attached_assets/rotated/Askistix 2004 chocolate frontal_1755196507567_rotated.png"',
-        'avengers-2012': '"/attached_assets/rotated/Avengers cajeta_1755196507567_rotated.png"'
-    }
-    
-    for slug, image_url in image_updates.items():
+    for slug, image_url in IMAGE_UPDATES.items():
         # Update imageUrl from null to the new image
-        pattern = rf'(slug: "{slug}".*?imageUrl: )null'
-        if re.search(pattern, content, re.DOTALL):
-            content = re.sub(pattern, rf'\1{image_url}', content, flags=re.DOTALL)
+        promotion = storage.find(slug=slug)
+        if promotion and promotion.get('imageUrl') is None:
+            storage.set_value(promotion, 'imageUrl', image_url)
             print(f"Updated imageUrl for {slug}")
     
     # Write the updated content back
-    with open('server/storage.ts', 'w', encoding='utf-8') as f:
-        f.write(content)
+    storage.save()
+
+def update_seed(guard):
+    dataset = SeedDataset.load()
+
+    for slug, new_urls in WRAPPER_UPDATES.items():
+        promotion = dataset.find('promotions', slug=slug)
+        if promotion is None:
+            print(f"Could not find promotion with slug: {slug}")
+            continue
+        urls, rejected = guard.filter(promotion.get('wrapperPhotosUrls') or [], [parse_value(url) for url in new_urls])
+        guard.report(rejected)
+        added = dataset.append_unique('promotions', promotion['key'], 'wrapperPhotosUrls', urls)
+        if added:
+            print(f"Updated {slug} with {len(added)} new wrapper photos")
+        else:
+            print(f"{slug} already has these wrapper photos")
+
+    for slug, image_url in IMAGE_UPDATES.items():
+        promotion = dataset.find('promotions', slug=slug)
+        if promotion and promotion.get('imageUrl') is None:
+            dataset.upsert('promotions', {'key': promotion['key'], 'imageUrl': parse_value(image_url)})
+            print(f"Updated imageUrl for {slug}")
+
+    dataset.save()
+
+def main():
+    guard = NearDuplicateGuard()
+    if SeedDataset.exists():
+        update_seed(guard)
+    else:
+        update_storage(guard)
+    guard.save()
     
     print("\nAll wrapper photo updates applied successfully!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Content-addressed index and dedup store for attached_assets.
+
+The same photo is often uploaded several times under different timestamp
+suffixes. This script hashes every asset (SHA-256 plus size), groups
+byte-identical files and writes an alias map that points every duplicate
+at one canonical file, so later stages only process each blob once.
+
+The hash index doubles as a scan index, like git's: every entry keeps the
+size, mtime_ns and inode the file had when it was hashed, so a rescan only
+stats the tree and re-hashes the files whose stat changed. A file whose
+mtime is not older than the previous scan could have changed again within
+the same timestamp tick, so it is re-hashed once more on the next scan.
+Each entry also records "seen_ns", the scan that first saw its current
+content, which lets consumers pick up new uploads since their last run.
+
+Usage:
+    python scripts/asset_store.py scan
+    python scripts/asset_store.py index [--full]
+    python scripts/asset_store.py dedup [--link]
+
+With --link every duplicate is replaced by a hard link to a single blob
+in attached_assets/.store, so the tree keeps its URLs but stores the
+pixels once. Only uploads are linked: the generated directories are
+rewritten by the tooling and never share an inode with anything else.
+Every writer replaces its output through a temporary file, so rewriting
+a linked upload leaves its siblings and the blob untouched.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from rotation_engine import add_jobs_argument
+
+ASSETS_DIR = "attached_assets"
+STORE_DIR = os.path.join(ASSETS_DIR, ".store")
+INDEX_FILE = os.path.join(ASSETS_DIR, "asset_index.json")
+ALIASES_FILE = os.path.join(ASSETS_DIR, "asset_aliases.json")
+
+# Files written by the tooling itself are never part of the index
+IGNORED_SUFFIXES = ('.json', '.txt', '.tmp')
+# Top-level directories of generated outputs, which are never hard-linked
+GENERATED_DIRS = ('rotated', 'processed', 'derivatives', 'trimmed')
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """Return the SHA-256 hex digest and size of a file"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def _walk(assets_dir, directory=''):
+    """Yield (relative posix path, DirEntry) for every asset, in sorted order"""
+    try:
+        with os.scandir(os.path.join(assets_dir, directory)) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except OSError:
+        # Unreadable or missing directories are skipped, as os.walk does
+        return
+    for entry in entries:
+        # Skip the blob store and hidden tooling directories
+        if entry.name.startswith('.'):
+            continue
+        name = f"{directory}/{entry.name}" if directory else entry.name
+        if entry.is_dir(follow_symlinks=False):
+            yield from _walk(assets_dir, name)
+        elif not entry.name.lower().endswith(IGNORED_SUFFIXES) and entry.is_file():
+            yield name, entry
+
+
+def list_assets(assets_dir=ASSETS_DIR):
+    """List every asset file below assets_dir as a relative posix path"""
+    return [name for name, _ in _walk(assets_dir)]
+
+
+def stat_assets(assets_dir=ASSETS_DIR):
+    """{relative_path: {"size", "mtime_ns", "ino"}} for every asset, without reading any file"""
+    stats = {}
+    for name, entry in _walk(assets_dir):
+        stat = entry.stat()
+        stats[name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "ino": entry.inode()}
+    return stats
+
+
+def scan_assets(assets_dir=ASSETS_DIR, previous=None, scanned_at_ns=0, jobs=None):
+    """Rescan the tree, hashing only new files and files whose stat changed
+
+    previous is the last index and scanned_at_ns the time its scan started.
+    Returns (files, changes) where changes lists the "added", "modified"
+    and "removed" names.
+    """
+    previous = previous or {}
+    started_ns = time.time_ns()
+    stats = stat_assets(assets_dir)
+
+    files = {}
+    pending = []
+    changes = {"added": [], "modified": [], "removed": sorted(set(previous) - set(stats))}
+    for name, stat in stats.items():
+        known = previous.get(name)
+        unchanged = known is not None and all(known.get(key) == stat[key] for key in ("size", "mtime_ns", "ino"))
+        # Racy entries were written in the tick of the last scan and may have changed unseen
+        if unchanged and stat["mtime_ns"] < scanned_at_ns:
+            files[name] = known
+        else:
+            pending.append(name)
+
+    # hashlib releases the GIL on large buffers, so threads keep every core busy
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        hashes = executor.map(hash_file, [os.path.join(assets_dir, name) for name in pending])
+        for name, (sha256, size) in zip(pending, hashes):
+            known = previous.get(name)
+            if known is not None and known["sha256"] == sha256:
+                # Touched or racy, same content: keep when it was first seen
+                seen_ns = known.get("seen_ns", started_ns)
+            else:
+                seen_ns = started_ns
+                changes["modified" if known is not None else "added"].append(name)
+            stat = stats[name]
+            files[name] = {"sha256": sha256, "size": size, "mtime_ns": stat["mtime_ns"], "ino": stat["ino"],
+                           "seen_ns": seen_ns}
+
+    return dict(sorted(files.items())), changes
+
+
+def build_index(assets_dir=ASSETS_DIR, jobs=None):
+    """Hash every asset and return {relative_path: {"sha256", "size", "mtime_ns", "ino", "seen_ns"}}"""
+    return scan_assets(assets_dir, jobs=jobs)[0]
+
+
+def load_scan(index_file=INDEX_FILE):
+    """The saved index and the time its scan started, or ({}, 0)"""
+    if os.path.exists(index_file):
+        with open(index_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data["files"], data.get("scanned_at_ns", 0)
+    return {}, 0
+
+
+def load_index(index_file=INDEX_FILE):
+    """Load the saved hash index, or an empty one"""
+    return load_scan(index_file)[0]
+
+
+def save_index(files, index_file=INDEX_FILE, scanned_at_ns=None):
+    """Write the hash index to disk"""
+    data = {"files": files}
+    if scanned_at_ns is not None:
+        data["scanned_at_ns"] = scanned_at_ns
+    temp_path = index_file + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        # json.dumps without indentation runs the C encoder (json.dump streams
+        # through the Python one), so a rescan of a large tree is not
+        # dominated by writing the index
+        f.write(json.dumps(data, ensure_ascii=False))
+    os.replace(temp_path, index_file)
+
+
+def update_index(assets_dir=ASSETS_DIR, index_file=INDEX_FILE, jobs=None, full=False):
+    """Rescan against the saved index, save it and return (files, changes)
+
+    With full=True every file is re-hashed, but the saved index still
+    provides the changes and when each file was first seen.
+    """
+    previous, scanned_at_ns = load_scan(index_file)
+    started_ns = time.time_ns()
+    files, changes = scan_assets(assets_dir, previous, 0 if full else scanned_at_ns, jobs)
+    save_index(files, index_file, started_ns)
+    return files, changes
+
+
+def group_duplicates(files):
+    """Group index entries by content, returning {sha256: [names]} for duplicates only"""
+    groups = {}
+    for name, entry in files.items():
+        key = (entry["sha256"], entry["size"])
+        groups.setdefault(key, []).append(name)
+
+    return {
+        sha256: sorted(names)
+        for (sha256, size), names in groups.items()
+        if len(names) > 1
+    }
+
+
+def is_generated(name):
+    """Whether an index name lives in one of the generated output directories"""
+    return name.split('/', 1)[0] in GENERATED_DIRS
+
+
+def build_alias_map(files):
+    """Pick a canonical file for every duplicate group and map aliases to it
+
+    The canonical file is the first upload in sorted order, which keeps the
+    choice stable between runs; generated outputs are only chosen when the
+    group has no upload, since they get rewritten.
+    """
+    blobs = {}
+    aliases = {}
+    for sha256, names in group_duplicates(files).items():
+        canonical = next((name for name in names if not is_generated(name)), names[0])
+        others = [name for name in names if name != canonical]
+        blobs[sha256] = {
+            "size": files[canonical]["size"],
+            "canonical": canonical,
+            "aliases": others,
+        }
+        for name in others:
+            aliases[name] = canonical
+    return {"blobs": blobs, "aliases": aliases}
+
+
+def load_aliases(aliases_file=ALIASES_FILE):
+    """Load the alias map as {alias: canonical}, or an empty one"""
+    if os.path.exists(aliases_file):
+        with open(aliases_file, 'r', encoding='utf-8') as f:
+            return json.load(f)["aliases"]
+    return {}
+
+
+def resolve_asset_url(url, aliases):
+    """Map an /attached_assets/... URL to its canonical file's URL"""
+    prefix = f"/{ASSETS_DIR}/"
+    if not url.startswith(prefix):
+        return url
+    canonical = aliases.get(url[len(prefix):])
+    return prefix + canonical if canonical else url
+
+
+def blob_path(sha256, store_dir=STORE_DIR):
+    """Location of a blob in the content-addressed store"""
+    return os.path.join(store_dir, sha256[:2], sha256)
+
+
+def link_duplicates(alias_map, assets_dir=ASSETS_DIR, store_dir=STORE_DIR):
+    """Collapse every duplicate group of uploads into one blob shared through hard links
+
+    Files in GENERATED_DIRS keep their own inode. Returns the number of
+    bytes freed.
+    """
+    freed = 0
+    for sha256, blob in alias_map["blobs"].items():
+        target = blob_path(sha256, store_dir)
+        names = [name for name in [blob["canonical"]] + blob["aliases"] if not is_generated(name)]
+        if os.path.exists(target):
+            # Give generated files linked by an earlier run their own copy back
+            for name in [blob["canonical"]] + blob["aliases"]:
+                path = os.path.join(assets_dir, name)
+                if is_generated(name) and os.path.samefile(path, target):
+                    temp_path = path + ".tmp"
+                    shutil.copy2(target, temp_path)
+                    os.replace(temp_path, path)
+        if len(names) < 2:
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if not os.path.exists(target):
+            os.link(os.path.join(assets_dir, names[0]), target)
+
+        for name in names:
+            path = os.path.join(assets_dir, name)
+            if os.path.samefile(path, target):
+                continue
+            # Link next to the file first so a failure never loses the asset
+            temp_path = path + ".tmp"
+            os.link(target, temp_path)
+            os.replace(temp_path, path)
+            freed += blob["size"]
+    return freed
+
+
+def _print_changes(files, changes):
+    print(f"🔍 {len(files)} assets: {len(changes['added'])} added, "
+          f"{len(changes['modified'])} modified, {len(changes['removed'])} removed")
+
+
+def cmd_scan(args):
+    """Rescan the tree and list what changed since the last scan"""
+    files, changes = update_index(jobs=args.jobs)
+    for kind, mark in (("added", "+"), ("modified", "~"), ("removed", "-")):
+        for name in changes[kind]:
+            print(f"  {mark} {name}")
+    _print_changes(files, changes)
+    print(f"📋 Index saved to: {INDEX_FILE}")
+
+
+def cmd_index(args):
+    """Update the content hash index, re-hashing only changed files unless --full"""
+    files, changes = update_index(jobs=args.jobs, full=args.full)
+    _print_changes(files, changes)
+    total = sum(entry["size"] for entry in files.values())
+    print(f"✓ Indexed {len(files)} assets ({total / 1024 / 1024:.1f} MB)")
+    print(f"📋 Index saved to: {INDEX_FILE}")
+
+
+def cmd_dedup(args):
+    """Write the alias map and optionally collapse duplicates into blobs"""
+    files, _ = update_index(jobs=args.jobs)
+    alias_map = build_alias_map(files)
+
+    with open(ALIASES_FILE, 'w', encoding='utf-8') as f:
+        json.dump(alias_map, f, indent=2, ensure_ascii=False)
+
+    duplicate_bytes = sum(
+        blob["size"] * len(blob["aliases"]) for blob in alias_map["blobs"].values()
+    )
+    print(f"🔍 Found {len(alias_map['blobs'])} duplicated blobs "
+          f"({len(alias_map['aliases'])} aliases, {duplicate_bytes / 1024 / 1024:.1f} MB)")
+    print(f"📋 Alias map saved to: {ALIASES_FILE}")
+
+    if args.link:
+        freed = link_duplicates(alias_map)
+        print(f"✅ Linked duplicates into {STORE_DIR}, freed {freed / 1024 / 1024:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed dedup store for attached_assets")
+    add_jobs_argument(parser)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("scan", help="list the assets added, modified or removed since the last scan"
+                          ).set_defaults(func=cmd_scan)
+
+    index_parser = subparsers.add_parser("index", help="hash every new or changed asset")
+    index_parser.add_argument("--full", action="store_true", help="re-hash every asset, ignoring the saved index")
+    index_parser.set_defaults(func=cmd_index)
+
+    dedup_parser = subparsers.add_parser("dedup", help="write the alias map for duplicated assets")
+    dedup_parser.add_argument("--link", action="store_true",
+                              help="replace duplicates with hard links to a single blob")
+    dedup_parser.set_defaults(func=cmd_dedup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Offline background removal for wrapper photos shot on plain backgrounds.
+
+1. Estimate the background colour from the image border
+2. Mark pixels within a colour distance of it as background candidates
+3. Flood fill the candidates from the border, so wrapper areas with a
+   similar colour that do not touch the border are kept. The fill runs on
+   a block-reduced mask first and is then refined at full resolution
+4. Feather the alpha edge with a box blur
+
+Everything runs on whole NumPy arrays. The flood fill propagates along
+row and column runs at a time, so there are no per-pixel Python loops.
+
+Usage:
+    python scripts/background_removal.py input.jpg output.png [--threshold 60] [--feather 2]
+"""
+
+import argparse
+import os
+import numpy as np
+from PIL import Image, ImageOps
+
+DEFAULT_THRESHOLD = 60.0
+DEFAULT_FEATHER = 2
+# Longest side of the reduced mask used for the coarse flood fill
+WORK_SIZE = 1024
+# The threshold grows with the border's colour spread so shadows and gradients stay background
+SPREAD_FACTOR = 3.0
+
+
+def estimate_border_color(rgb, border=8):
+    """Median colour and spread of a band of pixels along the image border"""
+    band = np.concatenate([
+        rgb[:border].reshape(-1, 3),
+        rgb[-border:].reshape(-1, 3),
+        rgb[:, :border].reshape(-1, 3),
+        rgb[:, -border:].reshape(-1, 3),
+    ]).astype(np.float32)
+    color = np.median(band, axis=0)
+    spread = np.median(np.linalg.norm(band - color, axis=1))
+    return color, float(spread)
+
+
+def _propagate_rows(seed, candidate):
+    """Grow seed pixels along each horizontal run of candidate pixels"""
+    starts = candidate.copy()
+    starts[:, 1:] &= ~candidate[:, :-1]
+    run_ids = np.cumsum(starts.ravel()).reshape(candidate.shape) * candidate
+
+    seeded = np.zeros(run_ids.max() + 1, dtype=bool)
+    seeded[run_ids[seed & candidate]] = True
+    seeded[0] = False
+    return seeded[run_ids]
+
+
+def _border_seed(candidate):
+    """Candidate pixels on the outer edge of the mask"""
+    seed = np.zeros_like(candidate)
+    seed[0, :] = seed[-1, :] = True
+    seed[:, 0] = seed[:, -1] = True
+    return seed & candidate
+
+
+def _grow(filled, candidate):
+    """Alternate row-run and column-run propagation until nothing changes"""
+    while True:
+        grown = _propagate_rows(filled, candidate)
+        grown = _propagate_rows(grown.T, candidate.T).T
+        if np.array_equal(grown, filled):
+            return filled
+        filled = grown
+
+
+def _reduce_all(mask, factor):
+    """Block-reduce a mask, keeping blocks whose pixels are all set"""
+    height, width = mask.shape
+    height, width = height // factor * factor, width // factor * factor
+    blocks = mask[:height, :width].reshape(height // factor, factor, width // factor, factor)
+    return blocks.all(axis=(1, 3))
+
+
+def _dilate(mask):
+    """Grow a mask by one pixel in all eight directions"""
+    padded = np.pad(mask, 1)
+    height, width = mask.shape
+    grown = mask.copy()
+    for dy in range(3):
+        for dx in range(3):
+            grown |= padded[dy:dy + height, dx:dx + width]
+    return grown
+
+
+def flood_fill_from_border(candidate, work_size=WORK_SIZE):
+    """Candidate pixels connected (4-neighbourhood) to the image border
+
+    Each pass fills whole row or column runs at once, so even winding
+    regions converge in a handful of iterations. Large masks are filled on
+    a conservative block-reduced copy instead; the coarse fill is grown by
+    one block and intersected with the full-resolution candidates, which
+    keeps the edge detail without iterating over every pixel. Background
+    reachable only through gaps narrower than a block stays opaque, which
+    errs on the side of keeping the wrapper.
+    """
+    factor = -(-max(candidate.shape) // work_size)
+    if factor < 2:
+        return _grow(_border_seed(candidate), candidate)
+
+    coarse_candidate = _reduce_all(candidate, factor)
+    coarse = _dilate(_grow(_border_seed(coarse_candidate), coarse_candidate))
+    upsampled = np.repeat(np.repeat(coarse, factor, axis=0), factor, axis=1)
+    region = np.pad(upsampled, [(0, candidate.shape[0] - upsampled.shape[0]),
+                                (0, candidate.shape[1] - upsampled.shape[1])], mode='edge')
+    return (region & candidate) | _border_seed(candidate)
+
+
+def box_blur(mask, radius):
+    """Box blur a float array with an integral image"""
+    if radius <= 0:
+        return mask
+    size = 2 * radius + 1
+    padded = np.pad(mask, radius + 1, mode='edge')
+    integral = padded.cumsum(axis=0).cumsum(axis=1)
+    total = (
+        integral[size:, size:]
+        - integral[:-size, size:]
+        - integral[size:, :-size]
+        + integral[:-size, :-size]
+    )
+    height, width = mask.shape
+    return total[:height, :width] / (size * size)
+
+
+def remove_background_array(rgb, threshold=DEFAULT_THRESHOLD, feather=DEFAULT_FEATHER):
+    """Return an RGBA array with the plain background made transparent"""
+    color, spread = estimate_border_color(rgb)
+    limit = max(threshold, SPREAD_FACTOR * spread)
+
+    # Squared integer distances avoid a float copy and a square root per pixel
+    difference = rgb.astype(np.int32) - np.round(color).astype(np.int32)
+    distance_squared = np.einsum('ijk,ijk->ij', difference, difference)
+    background = flood_fill_from_border(distance_squared < limit * limit)
+
+    alpha = box_blur((~background).astype(np.float32), feather)
+    rgba = np.dstack([rgb, np.clip(alpha * 255.0 + 0.5, 0, 255).astype(np.uint8)])
+    return rgba
+
+
+def remove_background_image(img, threshold=DEFAULT_THRESHOLD, feather=DEFAULT_FEATHER):
+    """Remove the background of a Pillow image, returning an RGBA image"""
+    if img.getexif().get(0x0112, 1) != 1:
+        img = ImageOps.exif_transpose(img)
+    if img.mode == 'RGBA' and img.getextrema()[3][0] < 255:
+        # Already cut out (e.g. *-removebg-preview files)
+        return img
+    rgb = np.asarray(img.convert('RGB'))
+    return Image.fromarray(remove_background_array(rgb, threshold, feather), 'RGBA')
+
+
+def remove_background_file(image_path, output_path, threshold=DEFAULT_THRESHOLD, feather=DEFAULT_FEATHER):
+    """Remove the background of an image file and save it as PNG"""
+    temp_path = str(output_path) + ".tmp"
+    with Image.open(image_path) as img:
+        remove_background_image(img, threshold, feather).save(temp_path, 'PNG')
+    os.replace(temp_path, output_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline background removal for wrapper photos")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"colour distance from the border that counts as background (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--feather", type=int, default=DEFAULT_FEATHER,
+                        help=f"alpha feather radius in pixels (default: {DEFAULT_FEATHER})")
+    args = parser.parse_args()
+
+    remove_background_file(args.input, args.output, args.threshold, args.feather)
+    print(f"Background removed: {args.input} -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
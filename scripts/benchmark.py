@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the wrapper pipeline stages.
+
+Builds a synthetic corpus per scale under attached_assets/.bench/:
+wrapper photos at realistic sizes (12 MP JPEGs of about 4 MB and RGBA
+cut-out PNGs) named like real uploads, and a storage.ts with one
+promotion per photo, generated with the same promotion_definition the
+batch scripts use. Only a handful of template images are rendered; the
+corpus files are hard links to them, so 10k photos cost no extra disk
+and every stage still opens and reads 10k real files.
+
+Hard links share the templates' pages in the page cache, so hashing
+them would only time a few reads. The hash and rescan stages instead
+run over distinct files: template copies with a unique trailer, up to
+--distinct files (the rest is extrapolated). They are read right after
+being written, so hash throughput is warm-cache: it measures SHA-256
+and the read path, not the disk.
+
+Stages:
+    discover  list_assets over the corpus
+    hash      build_index (SHA-256 of every file)         (distinct files)
+    rescan    scan_assets against a saved index, nothing changed (stat only)   (distinct files)
+    rotate    rotate_batch, quarter turn, no cache      (sampled)
+    encode    image chain to a PNG and a 320w WebP      (sampled)
+    classify  filename classifier over every filename
+    patch     parse storage.ts, append a photo to every promotion, render
+
+Sampled stages run on --sample photos and report the time per photo
+multiplied out to the scale, flagged "extrapolated"; a full 10k run of
+them would take hours without saying anything the sample does not.
+
+Every run is appended to attached_assets/benchmark_runs.ndjson and
+compared with the previous run of the same stage and scale.
+
+Usage:
+    python scripts/benchmark.py [--scales 100,1000,10000] [--stages hash,patch] [--sample 8] [--distinct 1000] [--jobs N]
+    python scripts/benchmark.py --compare     # latest run against the one before, no timing
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import time
+import numpy as np
+from PIL import Image
+from asset_store import ASSETS_DIR, build_index, list_assets, scan_assets
+from filename_classifier import FilenameClassifier
+from image_chain import make_chain, run_chain, run_chains_shared
+from rotation_engine import add_jobs_argument, make_task, rotate_batch
+from storage_ts import StorageFile, promotion_definition, ts_string
+
+BENCH_DIR = os.path.join(ASSETS_DIR, ".bench")
+RUNS_FILE = os.path.join(ASSETS_DIR, "benchmark_runs.ndjson")
+STAGES = ("discover", "hash", "rescan", "rotate", "encode", "classify", "patch")
+SAMPLED_STAGES = ("rotate", "encode")
+# Stages that read distinct files, so the page cache cannot serve one template for all of them
+DISTINCT_STAGES = ("hash", "rescan")
+DEFAULT_SCALES = (100, 1000, 10000)
+DEFAULT_SAMPLE = 8
+# About 5 GB of copies; 10k distinct photos would need 50 GB
+DEFAULT_DISTINCT = 1000
+# Phone photo and background-removed cut-out sizes seen in attached_assets
+JPEG_SIZE = (4032, 3024)
+PNG_SIZE = (1600, 2200)
+TEMPLATES = 4
+# Slower by more than this fraction (and this many seconds) than the previous run is a regression
+REGRESSION_THRESHOLD = 0.15
+NOISE_FLOOR = 0.05
+# Stages faster than this are repeated (up to MAX_REPEATS) and the best time kept
+MIN_STAGE_SECONDS = 1.0
+MAX_REPEATS = 5
+
+FLAVORS = ("Chocolate", "Cajeta", "Vainilla", "Fresa")
+SIDES = ("frontal", "trasera", "lateral")
+WORDS = ("funki", "punky", "extremo", "angry", "birds", "ninja", "tortugas", "mania", "dance",
+         "bob", "esponja", "chavo", "aliens", "cartoon", "network", "hora", "aventura", "minions")
+
+
+def _photo_texture(rng, size, channels):
+    """Smooth colour fields plus sensor noise, so JPEG and PNG sizes come out realistic"""
+    width, height = size
+    coarse = rng.integers(0, 256, size=(height // 256 + 2, width // 256 + 2, channels), dtype=np.uint8)
+    base = np.asarray(Image.fromarray(coarse.squeeze()).resize(size, Image.BICUBIC), dtype=np.int16)
+    base = base.reshape(height, width, channels)
+    noise = rng.normal(0, 6, size=(height, width, 1)).astype(np.int16)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+def render_templates(directory, count=TEMPLATES, seed=0):
+    """Write `count` template photos (alternating JPEG and RGBA PNG) and return their paths"""
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = []
+    for index in range(count):
+        if index % 2 == 0:
+            path = os.path.join(directory, f"template_{index}.jpg")
+            if not os.path.exists(path):
+                Image.fromarray(_photo_texture(rng, JPEG_SIZE, 3)).save(path, 'JPEG', quality=92)
+        else:
+            path = os.path.join(directory, f"template_{index}.png")
+            if not os.path.exists(path):
+                rgb = _photo_texture(rng, PNG_SIZE, 3)
+                # Wrapper-shaped opaque area on a transparent background
+                height, width = rgb.shape[:2]
+                y, x = np.ogrid[:height, :width]
+                inside = ((x - width / 2) / (width * 0.42)) ** 2 + ((y - height / 2) / (height * 0.45)) ** 4 <= 1
+                alpha = np.where(inside, 255, 0).astype(np.uint8)
+                Image.fromarray(np.dstack([rgb, alpha]), 'RGBA').save(path, 'PNG')
+        paths.append(path)
+    return paths
+
+
+def synthetic_promotions(count, seed=0):
+    """`count` promotion records with distinct names and slugs"""
+    rng = np.random.default_rng(seed)
+    promotions = []
+    for index in range(count):
+        words = [WORDS[i] for i in rng.choice(len(WORDS), size=3, replace=False)]
+        year = int(rng.integers(1995, 2025))
+        name = f"{' '.join(word.capitalize() for word in words)} {index} {year}"
+        promotions.append({
+            "name": name,
+            "slug": f"{'-'.join(words)}-{index}-{year}",
+            "description": f"Promoción sintética {index} con figuras y stickers coleccionables.",
+            "category": "figuras",
+            "startYear": year,
+            "endYear": year,
+        })
+    return promotions
+
+
+def write_storage(path, promotions):
+    """A storage.ts with one brand and the given promotions, in the seed layout"""
+    parts = [
+        'import { type Brand, type Promotion } from "@shared/schema";\n',
+        'import { randomUUID } from "crypto";\n\n',
+        'export class MemStorage {\n',
+        '  private seedData() {\n',
+        '    const vuala: Brand = {\n',
+        '      id: randomUUID(),\n',
+        '      name: "Vualá",\n',
+        '      slug: "vuala",\n',
+        '      createdAt: new Date(),\n',
+        '    };\n',
+        '    this.brands.set(vuala.id, vuala);\n',
+    ]
+    parts += [promotion_definition('vuala', promotion) for promotion in promotions]
+    parts.append('  }\n}\n')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(''.join(parts))
+
+
+def _write_distinct(template, target, index):
+    """Copy a template with a unique trailer after the image data, so every file hashes differently"""
+    shutil.copyfile(template, target)
+    with open(target, 'ab') as f:
+        f.write(index.to_bytes(8, 'little'))
+
+
+def prepare_corpus(scale, templates, distinct=DEFAULT_DISTINCT):
+    """Corpus directory with `scale` hard-linked photos and a matching storage.ts (reused when complete)
+
+    The first min(scale, distinct) photos are also written as distinct
+    files under distinct/ for the hash and rescan stages.
+    """
+    directory = os.path.join(BENCH_DIR, f"corpus_{scale}")
+    photos_dir = os.path.join(directory, "photos")
+    distinct_dir = os.path.join(directory, "distinct")
+    storage_path = os.path.join(directory, "storage.ts")
+    promotions = synthetic_promotions(scale)
+    if (os.path.exists(storage_path) and os.path.isdir(photos_dir) and len(os.listdir(photos_dir)) == scale
+            and os.path.isdir(distinct_dir) and len(os.listdir(distinct_dir)) == min(scale, distinct)):
+        return directory, promotions
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(photos_dir)
+    os.makedirs(distinct_dir)
+    for index, promotion in enumerate(promotions):
+        template = templates[index % len(templates)]
+        name = f"{FLAVORS[index % len(FLAVORS)]} {promotion['name']} {SIDES[index % len(SIDES)]}" \
+               f"_{1755000000000 + index}{os.path.splitext(template)[1]}"
+        target = os.path.join(photos_dir, name)
+        try:
+            os.link(template, target)
+        except OSError:
+            shutil.copyfile(template, target)
+        if index < distinct:
+            _write_distinct(template, os.path.join(distinct_dir, name), index)
+    write_storage(storage_path, promotions)
+    return directory, promotions
+
+
+def _sample(corpus, size):
+    """The first `size` photos in creation order, which alternates JPEG and PNG templates"""
+    photos = os.listdir(os.path.join(corpus, "photos"))
+    return sorted(photos, key=lambda name: os.path.splitext(name)[0].rsplit('_', 1)[1])[:size]
+
+
+def bench_discover(corpus, promotions, args):
+    return len(list_assets(os.path.join(corpus, "photos")))
+
+
+def bench_hash(corpus, promotions, args):
+    return len(build_index(os.path.join(corpus, "distinct"), args.jobs))
+
+
+# Index each corpus is rescanned against, built outside the timed runs
+_scan_indexes = {}
+
+
+def setup_rescan(corpus, promotions, args):
+    directory = os.path.join(corpus, "distinct")
+    if directory not in _scan_indexes:
+        _scan_indexes[directory] = (build_index(directory, args.jobs), time.time_ns())
+
+
+def bench_rescan(corpus, promotions, args):
+    directory = os.path.join(corpus, "distinct")
+    previous, scanned_at_ns = _scan_indexes[directory]
+    files, changes = scan_assets(directory, previous, scanned_at_ns, args.jobs)
+    if changes["added"] or changes["modified"]:
+        raise RuntimeError(f"rescan of an unchanged corpus hashed {len(changes['added'] + changes['modified'])} files")
+    return len(files)
+
+
+def bench_rotate(corpus, promotions, args):
+    photos = _sample(corpus, args.sample)
+    output_dir = os.path.join(corpus, "rotated")
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [
+        make_task(os.path.join(corpus, "photos", name), os.path.join(output_dir, name), 90)
+        for name in photos
+    ]
+    failed = [result for result in rotate_batch(tasks, args.jobs) if not result["success"]]
+    if failed:
+        raise RuntimeError(failed[0]["error"])
+    return len(tasks)
+
+
+def bench_encode(corpus, promotions, args):
+    photos = _sample(corpus, args.sample)
+    output_dir = os.path.join(corpus, "encoded")
+    os.makedirs(output_dir, exist_ok=True)
+    chains = []
+    for name in photos:
+        stem = os.path.splitext(name)[0]
+        chains.append(make_chain(os.path.join(corpus, "photos", name), [{"op": "orient"}], [
+            {"path": os.path.join(output_dir, stem + ".png"), "format": "PNG"},
+            {"path": os.path.join(output_dir, stem + "-320w.webp"), "format": "WEBP", "width": 320,
+             "options": {"quality": 80}},
+        ]))
+    results = map(run_chain, chains) if args.jobs <= 1 else run_chains_shared(chains, args.jobs)
+    failed = [result for result in results if not result["success"]]
+    if failed:
+        raise RuntimeError(failed[0]["error"])
+    return len(chains)
+
+
+def bench_classify(corpus, promotions, args):
+    # Building the automaton is part of the cost of a run
+    classifier = FilenameClassifier(promotions)
+    names = os.listdir(os.path.join(corpus, "photos"))
+    unknown = sum(1 for name in names if classifier.classify(name)["match"] is None)
+    if unknown:
+        raise RuntimeError(f"{unknown} synthetic filenames were not classified")
+    return len(names)
+
+
+def bench_patch(corpus, promotions, args):
+    storage = StorageFile.load(os.path.join(corpus, "storage.ts"))
+    for promotion in storage.promotions():
+        storage.append_items(promotion, 'wrapperPhotosUrls', [ts_string(f"/attached_assets/rotated/{promotion.slug}.png")])
+    storage.save(os.path.join(corpus, "storage.patched.ts"))
+    return len(storage.promotions())
+
+
+STAGE_BENCHMARKS = {
+    "discover": bench_discover,
+    "hash": bench_hash,
+    "rescan": bench_rescan,
+    "rotate": bench_rotate,
+    "encode": bench_encode,
+    "classify": bench_classify,
+    "patch": bench_patch,
+}
+STAGE_SETUP = {
+    "rescan": setup_rescan,
+}
+
+
+def time_stage(stage, scale, corpus, promotions, args):
+    """Time one stage (best of a few runs when it is fast) and return its result record"""
+    if stage in STAGE_SETUP:
+        STAGE_SETUP[stage](corpus, promotions, args)
+    timings = []
+    while len(timings) < MAX_REPEATS and sum(timings) < MIN_STAGE_SECONDS:
+        start = time.perf_counter()
+        items = STAGE_BENCHMARKS[stage](corpus, promotions, args)
+        timings.append(time.perf_counter() - start)
+    elapsed = min(timings)
+    per_item = elapsed / items if items else 0.0
+    extrapolated = stage in SAMPLED_STAGES + DISTINCT_STAGES and items < scale
+    return {
+        "stage": stage,
+        "scale": scale,
+        "items": items,
+        "seconds": round(per_item * scale if extrapolated else elapsed, 4),
+        "per_item": round(per_item, 6),
+        "extrapolated": extrapolated,
+        "repeats": len(timings),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_runs(runs_file=RUNS_FILE):
+    if not os.path.exists(runs_file):
+        return []
+    with open(runs_file, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_run(run, runs_file=RUNS_FILE):
+    with open(runs_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(run, ensure_ascii=False) + '\n')
+
+
+def compare_runs(run, previous_runs):
+    """(stage, scale, seconds, previous seconds, ratio) against the latest earlier run of each stage and scale"""
+    previous = {}
+    for earlier in previous_runs:
+        for result in earlier["results"]:
+            previous[(result["stage"], result["scale"])] = result["seconds"]
+    rows = []
+    for result in run["results"]:
+        before = previous.get((result["stage"], result["scale"]))
+        ratio = result["seconds"] / before if before else None
+        rows.append((result["stage"], result["scale"], result["seconds"], before, ratio))
+    return rows
+
+
+def print_comparison(rows, threshold=REGRESSION_THRESHOLD):
+    regressions = 0
+    for stage, scale, seconds, before, ratio in rows:
+        if ratio is None:
+            print(f"  {stage:<9} {scale:>6}  {seconds:9.3f}s  (no previous run)")
+            continue
+        slower = ratio > 1 + threshold and seconds - before > NOISE_FLOOR
+        marker = "⚠️ " if slower else "✓ "
+        regressions += slower
+        print(f"  {marker}{stage:<9} {scale:>6}  {seconds:9.3f}s  was {before:9.3f}s  ({(ratio - 1) * 100:+.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the pipeline stages on a synthetic wrapper corpus")
+    parser.add_argument("--scales", default=','.join(map(str, DEFAULT_SCALES)),
+                        help=f"comma-separated corpus sizes (default: {','.join(map(str, DEFAULT_SCALES))})")
+    parser.add_argument("--stages", default=','.join(STAGES), help=f"comma-separated subset of {', '.join(STAGES)}")
+    parser.add_argument("--sample", type=int, default=DEFAULT_SAMPLE,
+                        help=f"photos actually processed by the rotate and encode stages (default: {DEFAULT_SAMPLE})")
+    parser.add_argument("--distinct", type=int, default=DEFAULT_DISTINCT,
+                        help=f"distinct files read by the hash and rescan stages (default: {DEFAULT_DISTINCT})")
+    parser.add_argument("--compare", action="store_true", help="compare the last two recorded runs and exit")
+    parser.add_argument("--no-record", action="store_true", help=f"do not append this run to {RUNS_FILE}")
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    if args.compare:
+        runs = load_runs()
+        if len(runs) < 2:
+            print(f"Need two runs in {RUNS_FILE} to compare, found {len(runs)}")
+            return
+        print(f"📊 Run {runs[-1]['timestamp']} ({runs[-1]['commit']}) vs earlier runs")
+        print_comparison(compare_runs(runs[-1], runs[:-1]))
+        return
+
+    scales = [int(scale) for scale in args.scales.split(',')]
+    stages = [stage for stage in args.stages.split(',') if stage]
+    unknown = [stage for stage in stages if stage not in STAGE_BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    print("Rendering template photos...")
+    templates = render_templates(os.path.join(BENCH_DIR, "templates"))
+    for path in templates:
+        with Image.open(path) as img:
+            print(f"  {os.path.basename(path)}: {img.size[0]}x{img.size[1]} {img.mode}, "
+                  f"{os.path.getsize(path) / 1e6:.1f} MB")
+
+    run = {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "jobs": args.jobs,
+        "sample": args.sample,
+        "distinct": args.distinct,
+        "results": [],
+    }
+    for scale in scales:
+        corpus, promotions = prepare_corpus(scale, templates, args.distinct)
+        print(f"\n▶ {scale} photos ({corpus})")
+        for stage in stages:
+            result = time_stage(stage, scale, corpus, promotions, args)
+            run["results"].append(result)
+            note = f" (extrapolated from {result['items']})" if result["extrapolated"] else ""
+            print(f"  {stage:<9} {result['seconds']:9.3f}s  {result['per_item'] * 1000:8.3f} ms/item{note}")
+
+    previous = load_runs()
+    if previous:
+        print("\n📊 Against earlier runs:")
+        regressions = print_comparison(compare_runs(run, previous))
+        if regressions:
+            print(f"⚠️  {regressions} stages slower by more than {REGRESSION_THRESHOLD:.0%}")
+    if not args.no_record:
+        append_run(run)
+        print(f"\n📋 Results appended to: {RUNS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Deep Zoom (DZI) tile pyramids for full-resolution wrapper photos.
+
+The Trasera photos are 24 MP JPEGs of about 4 MB whose fine print is the
+reason to look at them, and the only way to show it today is to ship the
+whole file. This script cuts each one into a Deep Zoom pyramid of 256 px
+WebP tiles, so a zoom viewer (e.g. OpenSeadragon) only fetches the tiles
+in view at the current zoom:
+
+    attached_assets/tiles/<stem>.dzi                    descriptor (XML)
+    attached_assets/tiles/<stem>_files/<level>/<col>_<row>.webp
+
+Level N is the full image and every level below halves it, down to 1x1
+at level 0; tiles overlap their neighbours by one pixel.
+
+The source is decoded once and never copied whole. It is read in bands
+of TILE_SIZE rows: each band is cropped (and turned upright per its EXIF
+orientation), cut into the tiles of the top level, then box-reduced 2x
+and pushed down to the next level, which buffers rows only until it has
+a full tile row. Every level below the top therefore lives in a buffer
+of a few hundred rows, and the output is pixel-identical to reducing
+the whole frame level by level.
+
+The viewer descriptors of every tiled image are also collected in
+vuala_wrappers_tiles.json, keyed by the source URL, in the inline tile
+source layout OpenSeadragon accepts:
+
+    {"/attached_assets/x.JPG": {"dzi": "/attached_assets/tiles/x.dzi", "width": 6000, "height": 4000,
+                                "levels": 14, "tileSource": {"Image": {"Url": ".../x_files/", ...}}}}
+
+Usage:
+    python scripts/deep_zoom.py [images ...] [--side Trasera] [--tile-size 256] [--force] [--jobs N]
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+from PIL import Image
+from asset_store import ASSETS_DIR
+from rotation_engine import add_jobs_argument
+from wrapper_catalog import WrapperCatalog
+
+TILES_DIR = os.path.join(ASSETS_DIR, "tiles")
+MANIFEST_FILE = os.path.join(ASSETS_DIR, "vuala_wrappers_tiles.json")
+TILE_SIZE = 256
+TILE_OVERLAP = 1
+TILE_FORMAT = "webp"
+TILE_SAVE_OPTIONS = {"format": "WEBP", "quality": 80, "method": 4}
+DEFAULT_SIDE = "Trasera"
+DZI_NAMESPACE = "http://schemas.microsoft.com/deepzoom/2008"
+
+# EXIF orientation -> transpose that turns the image upright (as ImageOps.exif_transpose)
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+def level_count(width, height):
+    """Number of pyramid levels, from 1x1 up to the full size"""
+    return math.ceil(math.log2(max(width, height))) + 1
+
+
+def descriptor_path(source_path, output_dir=TILES_DIR):
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(output_dir, f"{stem}.dzi")
+
+
+def tiles_dir(dzi_path):
+    return os.path.splitext(dzi_path)[0] + "_files"
+
+
+def dzi_xml(width, height, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, tile_format=TILE_FORMAT):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<Image xmlns="{DZI_NAMESPACE}" Format="{tile_format}" Overlap="{overlap}" TileSize="{tile_size}">\n'
+        f'  <Size Width="{width}" Height="{height}"/>\n'
+        '</Image>\n'
+    )
+
+
+def upright_size(size, orientation):
+    width, height = size
+    return (height, width) if orientation in (5, 6, 7, 8) else (width, height)
+
+
+def source_box(box, size, orientation):
+    """Box of the stored (unrotated) image that holds an upright box"""
+    left, top, right, bottom = box
+    width, height = upright_size(size, orientation)
+    if orientation in (2, 3):
+        left, right = width - right, width - left
+    if orientation in (3, 4):
+        top, bottom = height - bottom, height - top
+    if orientation in (5, 6, 7, 8):
+        left, top, right, bottom = top, left, bottom, right
+        # Rows and columns swapped; flip whichever axis the rotation reverses
+        if orientation in (6, 7):
+            top, bottom = width - bottom, width - top
+        if orientation in (7, 8):
+            left, right = height - right, height - left
+    return left, top, right, bottom
+
+
+def upright_band(img, orientation, top, bottom):
+    """Rows top..bottom of the upright image, cropped from the stored one"""
+    width, _ = upright_size(img.size, orientation)
+    band = img.crop(source_box((0, top, width, bottom), img.size, orientation))
+    transpose = ORIENTATION_TRANSPOSE.get(orientation)
+    band = band.transpose(transpose) if transpose is not None else band
+    if band.mode not in ('RGB', 'RGBA'):
+        band = band.convert('RGBA' if band.has_transparency_data else 'RGB')
+    return band
+
+
+class PyramidLevel:
+    """Rows of one pyramid level, buffered until whole tile rows can be cut
+
+    push() takes the next rows of the level; complete tile rows are
+    written and the rows no later tile needs are dropped. Rows are passed
+    to the level below in pairs, reduced 2x.
+    """
+
+    def __init__(self, level, width, height, output_dir, tile_size, overlap, below=None):
+        self.level = level
+        self.width = width
+        self.height = height
+        self.output_dir = os.path.join(output_dir, str(level))
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.below = below
+        self.buffer = None
+        self.buffer_top = 0
+        self.received = 0
+        self.next_row = 0
+        self.pending = None
+        self.tiles = 0
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def push(self, band):
+        self.received += band.height
+        self.buffer = band if self.buffer is None else _stack(self.buffer, band)
+        self._write_ready()
+        if self.below is not None:
+            self.pending = band if self.pending is None else _stack(self.pending, band)
+            even = self.pending.height - self.pending.height % 2
+            if self.received == self.height:
+                even = self.pending.height
+            if even:
+                self.below.push(self.pending.crop((0, 0, self.width, even)).reduce(2))
+                self.pending = self.pending.crop((0, even, self.width, self.pending.height)) \
+                    if even < self.pending.height else None
+
+    def _write_ready(self):
+        rows = math.ceil(self.height / self.tile_size)
+        while self.next_row < rows:
+            top = max(0, self.next_row * self.tile_size - self.overlap)
+            bottom = min(self.height, (self.next_row + 1) * self.tile_size + self.overlap)
+            if self.buffer_top + self.buffer.height < bottom:
+                return
+            for column in range(math.ceil(self.width / self.tile_size)):
+                left = max(0, column * self.tile_size - self.overlap)
+                right = min(self.width, (column + 1) * self.tile_size + self.overlap)
+                tile = self.buffer.crop((left, top - self.buffer_top, right, bottom - self.buffer_top))
+                tile.save(os.path.join(self.output_dir, f"{column}_{self.next_row}.{TILE_FORMAT}"),
+                          **TILE_SAVE_OPTIONS)
+                self.tiles += 1
+            self.next_row += 1
+            # Keep only the rows the next tile row overlaps
+            keep_from = self.next_row * self.tile_size - self.overlap
+            if self.next_row < rows and keep_from > self.buffer_top:
+                self.buffer = self.buffer.crop((0, keep_from - self.buffer_top, self.width, self.buffer.height))
+                self.buffer_top = keep_from
+
+
+def _stack(upper, lower):
+    """Two images of the same width, one above the other"""
+    stacked = Image.new(upper.mode, (upper.width, upper.height + lower.height))
+    stacked.paste(upper, (0, 0))
+    stacked.paste(lower.convert(upper.mode) if lower.mode != upper.mode else lower, (0, upper.height))
+    return stacked
+
+
+def build_levels(width, height, output_dir, tile_size, overlap):
+    """PyramidLevel chain from level 0 up; returns the top (full size) level"""
+    level = None
+    for number in range(level_count(width, height)):
+        scale = 2 ** (level_count(width, height) - 1 - number)
+        level = PyramidLevel(number, math.ceil(width / scale), math.ceil(height / scale),
+                             output_dir, tile_size, overlap, below=level)
+    return level
+
+
+def _is_fresh(source_path, dzi_path):
+    return os.path.exists(dzi_path) and os.path.getmtime(dzi_path) >= os.path.getmtime(source_path)
+
+
+def make_pyramid(source_path, output_dir=TILES_DIR, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, force=False):
+    """Tile one image into a Deep Zoom pyramid and return a result dict"""
+    dzi_path = descriptor_path(source_path, output_dir)
+    result = {
+        "source_path": source_path,
+        "dzi_path": dzi_path,
+        "width": None,
+        "height": None,
+        "levels": None,
+        "tiles": 0,
+        "cached": False,
+        "success": False,
+        "error": None,
+    }
+    try:
+        with Image.open(source_path) as img:
+            orientation = img.getexif().get(0x0112, 1)
+            width, height = upright_size(img.size, orientation)
+            result["width"], result["height"] = width, height
+            result["levels"] = level_count(width, height)
+            if not force and _is_fresh(source_path, dzi_path):
+                result["cached"] = True
+                result["success"] = True
+                return result
+
+            # Tiles go to a scratch directory that replaces the old pyramid at the end
+            files_dir = tiles_dir(dzi_path)
+            temp_dir = files_dir + ".tmp"
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            top = build_levels(width, height, temp_dir, tile_size, overlap)
+            img.load()
+            for band_top in range(0, height, tile_size):
+                top.push(upright_band(img, orientation, band_top, min(height, band_top + tile_size)))
+
+        level = top
+        while level is not None:
+            result["tiles"] += level.tiles
+            level = level.below
+        shutil.rmtree(files_dir, ignore_errors=True)
+        os.replace(temp_dir, files_dir)
+        with open(dzi_path + ".tmp", 'w', encoding='utf-8') as f:
+            f.write(dzi_xml(width, height, tile_size, overlap))
+        os.replace(dzi_path + ".tmp", dzi_path)
+        result["success"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def _make_pyramid(args):
+    return make_pyramid(*args)
+
+
+def generate_pyramids(source_paths, output_dir=TILES_DIR, tile_size=TILE_SIZE, overlap=TILE_OVERLAP,
+                      jobs=None, force=False):
+    """Tile many images in a process pool, yielding results in order"""
+    work = [(path, output_dir, tile_size, overlap, force) for path in source_paths]
+    if (jobs is not None and jobs <= 1) or len(work) <= 1:
+        yield from map(_make_pyramid, work)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(_make_pyramid, work)
+
+
+def manifest_entry(result, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    """Viewer descriptor of one pyramid"""
+    site_path = '/' + result["dzi_path"].replace(os.sep, '/')
+    return {
+        "dzi": quote(site_path),
+        "width": result["width"],
+        "height": result["height"],
+        "levels": result["levels"],
+        "tileSource": {
+            "Image": {
+                "xmlns": DZI_NAMESPACE,
+                "Url": quote(os.path.splitext(site_path)[0] + "_files/"),
+                "Format": TILE_FORMAT,
+                "Overlap": str(overlap),
+                "TileSize": str(tile_size),
+                "Size": {"Width": str(result["width"]), "Height": str(result["height"])},
+            }
+        },
+    }
+
+
+def load_manifest(manifest_file=MANIFEST_FILE):
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, manifest_file=MANIFEST_FILE):
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+
+def side_photo_urls(side=DEFAULT_SIDE):
+    """{url: content key} of the catalogued photos of one side that exist; copies of a photo share a key
+
+    Each photo is keyed by the URL the site shows, the rotated copy when
+    there is one.
+    """
+    urls = {}
+    with WrapperCatalog.open() as catalog:
+        for entry in catalog.find(side=side):
+            url = entry["rotated_path"] or entry["path"]
+            if os.path.exists(url.lstrip('/')):
+                urls[url] = entry["sha256"] if url == entry["path"] and entry["sha256"] else url
+    return urls
+
+
+def update_manifest(urls, jobs=None, force=False, tile_size=TILE_SIZE, manifest_file=MANIFEST_FILE):
+    """Tile site URLs and merge their descriptors into the tiles manifest
+
+    urls maps each URL to a content key (e.g. its hash): URLs with the
+    same key are tiled once and share the pyramid. Yields each result (with
+    its "urls") as it completes; the manifest is saved once the batch ends.
+    """
+    groups = {}
+    for url, key in urls.items():
+        groups.setdefault(key, []).append(url)
+    sources = [group[0] for group in groups.values()]
+    manifest = load_manifest(manifest_file)
+    try:
+        results = generate_pyramids([url.lstrip('/') for url in sources], tile_size=tile_size, jobs=jobs, force=force)
+        for group, result in zip(groups.values(), results):
+            result["urls"] = group
+            if result["success"]:
+                entry = manifest_entry(result, tile_size)
+                for url in group:
+                    manifest[url] = entry
+            yield result
+    finally:
+        save_manifest(manifest, manifest_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cut full-resolution wrapper photos into Deep Zoom tile pyramids")
+    parser.add_argument("images", nargs="*", help="site URLs or paths to tile (default: every catalogued photo of --side)")
+    parser.add_argument("--side", default=DEFAULT_SIDE, help=f"wrapper side to tile by default (default: {DEFAULT_SIDE})")
+    parser.add_argument("--tile-size", type=int, default=TILE_SIZE, help=f"tile edge in pixels (default: {TILE_SIZE})")
+    parser.add_argument("--force", action="store_true", help="re-tile images whose pyramid is up to date")
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    if args.images:
+        urls = {'/' + image.lstrip('/'): image.lstrip('/') for image in args.images}
+    else:
+        urls = side_photo_urls(args.side)
+    print(f"Tiling {len(set(urls.values()))} images ({len(urls)} URLs)...")
+
+    tiled = cached = tiles = 0
+    for result in update_manifest(urls, args.jobs, args.force, args.tile_size):
+        name = os.path.basename(result["source_path"])
+        if not result["success"]:
+            print(f"✗ Error tiling {name}: {result['error']}")
+        elif result["cached"]:
+            cached += 1
+        else:
+            tiled += 1
+            tiles += result["tiles"]
+            print(f"✓ {name}: {result['width']}x{result['height']}, {result['levels']} levels, {result['tiles']} tiles")
+
+    print(f"\n📊 {tiled} images tiled ({tiles} tiles), {cached} up to date")
+    print(f"📋 Tile descriptors saved to: {MANIFEST_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Responsive derivatives for wrapper photos.
+
+The wrapper card on the site is only 80x96 px, but wrapperPhotosUrls points
+at full-size rotated PNGs of several megabytes. This stage runs after
+rotation and writes each wrapper photo at a few widths (96, 320 and 1024 by
+default) as WebP plus an optimized PNG fallback, then records them in a
+srcset manifest next to vuala_wrappers_organized.json:
+
+    {
+      "/attached_assets/rotated/x_rotated.png": {
+        "width": 3024, "height": 4032,
+        "src": "/attached_assets/derivatives/x_rotated-320w.png",
+        "srcset": {"webp": "...-96w.webp 96w, ...", "png": "..."},
+        "variants": {"webp": [{"url": ..., "width": 96, "height": 128}, ...]}
+      }
+    }
+
+Derivative URLs are percent-encoded because srcset splits candidates on
+whitespace and the original filenames contain spaces.
+
+Usage:
+    python scripts/derivatives.py [images ...] [--widths 96 320 1024] [--formats webp png] [--force]
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+from PIL import Image, ImageOps, features
+from rotation_engine import add_jobs_argument
+from wrapper_catalog import WRAPPERS_FILE, WrapperCatalog
+
+MANIFEST_FILE = "attached_assets/vuala_wrappers_srcset.json"
+DERIVATIVES_DIR = "attached_assets/derivatives"
+DEFAULT_WIDTHS = (96, 320, 1024)
+DEFAULT_FORMATS = ("webp", "png")
+# Width used for the plain src attribute: enough for the card on 2x screens
+SRC_WIDTH = 320
+
+FORMAT_EXTENSIONS = {"webp": ".webp", "avif": ".avif", "png": ".png"}
+SAVE_OPTIONS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 6},
+    "avif": {"format": "AVIF", "quality": 60},
+    "png": {"format": "PNG", "optimize": True},
+}
+FEATURE_NAMES = {"webp": "webp", "avif": "avif", "png": None}
+
+
+def available_formats():
+    """Derivative formats the installed Pillow can encode"""
+    return [name for name, feature in FEATURE_NAMES.items() if feature is None or features.check(feature)]
+
+
+def url_to_path(url):
+    """Map a site URL (/attached_assets/...) to a path relative to the repo root"""
+    return url.lstrip('/')
+
+
+def path_to_url(path):
+    """Percent-encoded site URL for a file under attached_assets"""
+    return quote('/' + str(path).replace(os.sep, '/'))
+
+
+def derivative_path(source_path, width, image_format, output_dir=DERIVATIVES_DIR):
+    """Output path of one derivative"""
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(output_dir, f"{stem}-{width}w{FORMAT_EXTENSIONS[image_format]}")
+
+
+def target_sizes(size, widths):
+    """(width, height) of each derivative, never upscaling the source"""
+    source_width, source_height = size
+    sizes = []
+    for width in sorted(set(widths)):
+        width = min(width, source_width)
+        height = max(1, round(source_height * width / source_width))
+        if (width, height) not in sizes:
+            sizes.append((width, height))
+    return sizes
+
+
+def displayed_size(img):
+    """Image size once the EXIF orientation is applied, without decoding the pixels"""
+    width, height = img.size
+    if img.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+        return height, width
+    return width, height
+
+
+def _is_fresh(source_path, output_paths):
+    """Whether every output exists and is newer than the source"""
+    source_mtime = os.path.getmtime(source_path)
+    return all(os.path.exists(path) and os.path.getmtime(path) >= source_mtime for path in output_paths)
+
+
+def make_derivatives(source_path, widths=DEFAULT_WIDTHS, formats=DEFAULT_FORMATS,
+                     output_dir=DERIVATIVES_DIR, force=False):
+    """Write every width/format derivative of one image and return a result dict
+
+    The source is decoded once. Widths are rendered from largest to
+    smallest, each resized from the previous one, so the small sizes never
+    resample the full-resolution image again.
+    """
+    result = {
+        "source_path": str(source_path),
+        "width": None,
+        "height": None,
+        "variants": [],
+        "cached": False,
+        "success": False,
+        "error": None,
+    }
+    try:
+        with Image.open(source_path) as img:
+            size = displayed_size(img)
+            sizes = target_sizes(size, widths)
+            result["width"], result["height"] = size
+            result["variants"] = [
+                {
+                    "format": image_format,
+                    "width": width,
+                    "height": height,
+                    "path": derivative_path(source_path, width, image_format, output_dir),
+                }
+                for width, height in sizes
+                for image_format in formats
+            ]
+
+            if not force and _is_fresh(source_path, [variant["path"] for variant in result["variants"]]):
+                result["cached"] = True
+                result["success"] = True
+                return result
+
+            # JPEG sources can decode straight at a reduced scale
+            largest = max(sizes)
+            img.draft('RGB', (largest[0], largest[0]))
+            current = ImageOps.exif_transpose(img)
+            if current.mode not in ('RGB', 'RGBA'):
+                current = current.convert('RGBA' if current.has_transparency_data else 'RGB')
+
+            os.makedirs(output_dir, exist_ok=True)
+            for width, height in reversed(sizes):
+                if current.size != (width, height):
+                    current = current.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+                for variant in result["variants"]:
+                    if variant["width"] == width:
+                        temp_path = variant["path"] + ".tmp"
+                        current.save(temp_path, **SAVE_OPTIONS[variant["format"]])
+                        os.replace(temp_path, variant["path"])
+
+        for variant in result["variants"]:
+            variant["bytes"] = os.path.getsize(variant["path"])
+        result["success"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def _make_derivatives(args):
+    return make_derivatives(*args)
+
+
+def generate_derivatives(source_paths, widths=DEFAULT_WIDTHS, formats=DEFAULT_FORMATS,
+                         jobs=None, force=False, output_dir=DERIVATIVES_DIR):
+    """Render derivatives for many images in a process pool, yielding results in order"""
+    work = [(path, tuple(widths), tuple(formats), output_dir, force) for path in source_paths]
+    if (jobs is not None and jobs <= 1) or len(work) <= 1:
+        yield from map(_make_derivatives, work)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(_make_derivatives, work)
+
+
+def manifest_entry(result):
+    """srcset manifest entry for one successful result"""
+    by_format = {}
+    for variant in result["variants"]:
+        by_format.setdefault(variant["format"], []).append({
+            "url": path_to_url(variant["path"]),
+            "width": variant["width"],
+            "height": variant["height"],
+        })
+
+    # The fallback src uses the most widely supported format present
+    fallback = by_format.get("png") or next(iter(by_format.values()))
+    src = next((variant for variant in fallback if variant["width"] >= SRC_WIDTH), fallback[-1])
+    return {
+        "width": result["width"],
+        "height": result["height"],
+        "src": src["url"],
+        "srcset": {
+            image_format: ", ".join(f"{variant['url']} {variant['width']}w" for variant in variants)
+            for image_format, variants in by_format.items()
+        },
+        "variants": by_format,
+    }
+
+
+def load_manifest(manifest_file=MANIFEST_FILE):
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, manifest_file=MANIFEST_FILE):
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+
+def wrapper_photo_urls(wrappers_file=WRAPPERS_FILE):
+    """URLs the site shows for wrapper photos, preferring the rotated copies"""
+    with WrapperCatalog.open(wrappers_file=wrappers_file) as catalog:
+        return list(dict.fromkeys(url for urls in catalog.photo_urls().values() for url in urls))
+
+
+def update_manifest(urls, widths=DEFAULT_WIDTHS, formats=DEFAULT_FORMATS, jobs=None, force=False,
+                    manifest_file=MANIFEST_FILE):
+    """Render derivatives for site URLs and merge them into the srcset manifest
+
+    Yields each result (with its "url") as it completes; the manifest is
+    saved once the batch ends.
+    """
+    manifest = load_manifest(manifest_file)
+    try:
+        results = generate_derivatives([url_to_path(url) for url in urls], widths, formats, jobs, force)
+        for url, result in zip(urls, results):
+            result["url"] = url
+            if result["success"]:
+                manifest[url] = manifest_entry(result)
+            yield result
+    finally:
+        save_manifest(manifest, manifest_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate responsive derivatives for wrapper photos")
+    parser.add_argument("images", nargs="*",
+                        help=f"site URLs or paths to process (default: every photo in {WRAPPERS_FILE})")
+    parser.add_argument("--widths", type=int, nargs="+", default=list(DEFAULT_WIDTHS),
+                        help=f"derivative widths in pixels (default: {' '.join(map(str, DEFAULT_WIDTHS))})")
+    parser.add_argument("--formats", nargs="+", choices=available_formats(), default=list(DEFAULT_FORMATS),
+                        help=f"derivative formats (default: {' '.join(DEFAULT_FORMATS)})")
+    parser.add_argument("--force", action="store_true", help="render derivatives that are already up to date")
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    urls = ['/' + image.lstrip('/') for image in args.images] or wrapper_photo_urls()
+    print(f"Generating derivatives for {len(urls)} wrapper photos...")
+
+    source_bytes = derivative_bytes = 0
+    for result in update_manifest(urls, args.widths, args.formats, args.jobs, args.force):
+        name = os.path.basename(result["source_path"])
+        if not result["success"]:
+            print(f"✗ Error processing {name}: {result['error']}")
+        elif result["cached"]:
+            print(f"↺ Up to date: {name}")
+        else:
+            source_bytes += os.path.getsize(result["source_path"])
+            derivative_bytes += sum(variant["bytes"] for variant in result["variants"])
+            print(f"✓ {name}: {len(result['variants'])} derivatives")
+
+    print(f"\n📋 srcset manifest saved to: {MANIFEST_FILE}")
+    if source_bytes:
+        print(f"📊 {source_bytes / 1e6:.1f} MB of sources -> {derivative_bytes / 1e6:.1f} MB of derivatives (all sizes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the remove.bg API.
+
+Accepts the same multipart POST as https://api.remove.bg/v1.0/removebg and
+answers with a PNG, so the client's throughput path can be benchmarked
+and tested offline. It can simulate latency, rate limiting (429 with
+Retry-After) and random server errors.
+
+Usage:
+    python scripts/fake_removebg_server.py --port 8765 --latency 0.2 --rate 5
+"""
+
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 1x1 transparent PNG returned when the upload cannot be echoed back
+EMPTY_PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082'
+)
+
+
+class FakeRemoveBgHandler(BaseHTTPRequestHandler):
+    """Request handler mimicking remove.bg's success and error responses"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+    def _send(self, status, body, content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        # Drain the upload in chunks like the real API would
+        remaining = length
+        received = bytearray()
+        while remaining > 0:
+            chunk = self.rfile.read(min(65536, remaining))
+            if not chunk:
+                break
+            received += chunk
+            remaining -= len(chunk)
+
+        if not self.headers.get('X-Api-Key'):
+            self._send(403, b'{"errors":[{"title":"Missing API Key"}]}')
+            return
+        if not server.take_token():
+            self._send(429, b'{"errors":[{"title":"Rate limit exceeded"}]}',
+                       headers={'Retry-After': f"{server.retry_after:g}"})
+            return
+        if random.random() < server.error_rate:
+            self._send(503, b'{"errors":[{"title":"Service unavailable"}]}')
+            return
+
+        time.sleep(server.latency)
+        self._send(200, _extract_png(received) or EMPTY_PNG, content_type='image/png')
+
+
+def _extract_png(body):
+    """Echo an uploaded PNG back, which is what a cut-out of an already transparent image looks like"""
+    start = body.find(b'\x89PNG\r\n\x1a\n')
+    if start == -1:
+        return None
+    end = body.find(b'IEND', start)
+    return bytes(body[start:end + 8]) if end != -1 else None
+
+
+class FakeRemoveBgServer(ThreadingHTTPServer):
+    """Threaded HTTP server with a shared token bucket for simulated rate limits"""
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, rate=None, error_rate=0.0, retry_after=0.1):
+        super().__init__(address, FakeRemoveBgHandler)
+        self.latency = latency
+        self.rate = rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.tokens = rate or 0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take_token(self):
+        """Return False when the simulated rate limit is exceeded"""
+        if not self.rate:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def start_server(port=0, **options):
+    """Start the fake server on a background thread, returning (server, url)"""
+    server = FakeRemoveBgServer(('127.0.0.1', port), **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1.0/removebg"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the remove.bg API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--rate", type=float, default=None, help="requests per second before answering 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    server, url = start_server(args.port, latency=args.latency, rate=args.rate, error_rate=args.error_rate)
+    print(f"Fake remove.bg API listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
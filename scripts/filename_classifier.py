@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Filename classifier for wrapper photos.
+
+process_new_wrappers used to lowercase each filename and try a short
+dict of substrings in insertion order, so "dance mania" and "dancemania"
+or "bob esponja 2012" and "2024" could collide, and a promotion missing
+from the dict meant the file was dropped. Here the phrases come from the
+whole promotion catalog (the seed dataset, or storage.ts before it is
+exported): every name and slug, with and without its year and with the
+spaces squeezed out ("dancemania"), plus the flavor and side words.
+
+They are compiled once into an Aho-Corasick automaton over words, so a
+filename is classified in one pass over its words whatever the size of
+the catalog. Among the promotion matches the longest wins, then the
+more specific phrase (a full name beats a derived variant), then the
+one whose years include a year written in the filename. Names that match
+nothing (typos such as "el hcavo", run-together words such as
+"frontalreyes de las olas") fall back to fuzzy matching through a
+trigram index, which only scores the promotions sharing trigrams with
+the leftover words.
+
+Usage:
+    python scripts/filename_classifier.py "attached_assets/*_1755196507*.png"
+"""
+
+import argparse
+import glob
+import heapq
+import os
+import re
+import unicodedata
+from collections import Counter
+from difflib import SequenceMatcher
+from functools import lru_cache
+from seed_data import SeedDataset
+from storage_ts import StorageFile
+
+UNKNOWN = "Unknown"
+FLAVORS = {"chocolate": "Chocolate", "cajeta": "Cajeta", "vainilla": "Vainilla", "pina": "Piña"}
+SIDES = {"trasera": "Trasera", "lateral": "Lateral", "frontal": "Frontal"}
+DEFAULT_SIDE = "Frontal"
+# Earlier entries win when a filename mentions several
+FLAVOR_ORDER = list(FLAVORS.values())
+SIDE_ORDER = ["Trasera", "Lateral", "Frontal"]
+# Short names used in filenames that no catalog name or slug contains
+ALIASES = {
+    "avengers": "avengers-collection",
+    "bob esponja 2024": "bob-esponja-25-anos-2024",
+    "bob esponja 25 anos": "bob-esponja-25-anos-2024",
+}
+# Phrase specificity, most specific first
+PRIORITY_NAME, PRIORITY_ALIAS, PRIORITY_VARIANT, PRIORITY_COMPACT = range(4)
+# Words that say nothing about the promotion (upload and export noise)
+NOISE_WORDS = {"version", "img", "removebg", "preview", "rotated", "processed", "temp", "y", "con"}
+YEAR_RE = re.compile(r'(?:19|20)\d\d')
+FUZZY_CUTOFF = 0.75
+FUZZY_CANDIDATES = 5
+
+
+def fold_accents(text):
+    """Lowercase text with the accents dropped ("Piña" -> "pina")"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def normalize_words(text):
+    """Lowercase ASCII words of a name or filename: accents dropped, punctuation as spaces"""
+    return re.findall(r'[a-z0-9]+', fold_accents(text))
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+class PhraseMatcher:
+    """Aho-Corasick automaton over any sequence of symbols
+
+    The filename classifier feeds it lists of words; a plain string is
+    matched character by character.
+    """
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        self.built = False
+
+    def add(self, words, value):
+        state = 0
+        for word in words:
+            next_state = self.goto[state].get(word)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][word] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            state = next_state
+        self.outputs[state].append((len(words), value))
+        self.built = False
+
+    def build(self):
+        """Compute the failure links breadth first, merging the outputs they lead to"""
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for word, next_state in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(word, 0)
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.fail[next_state]]
+                queue.append(next_state)
+        self.built = True
+
+    def matches(self, words):
+        """(start, end, value) for every phrase occurring in a sequence"""
+        if not self.built:
+            self.build()
+        state = 0
+        for position, word in enumerate(words):
+            while state and word not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(word, 0)
+            for length, value in self.outputs[state]:
+                yield position + 1 - length, position + 1, value
+
+
+def load_catalog():
+    """Seeded promotions as dicts with key (variable name), name, slug, startYear and endYear"""
+    fields = ("name", "slug", "startYear", "endYear")
+    if SeedDataset.exists():
+        records = SeedDataset.load().tables['promotions'].values()
+        return [dict({key: record.get(key) for key in fields}, key=record['key']) for record in records]
+    storage = StorageFile.load()
+    seeded = {call["var"] for call in storage.set_calls if call["map"] == "promotions"}
+    return [
+        dict({key: block.get(key) for key in fields}, key=block.var_name)
+        for block in storage.promotions() if block.var_name in seeded
+    ]
+
+
+class FilenameClassifier:
+    """Promotion, year, flavor and side of wrapper photo filenames"""
+
+    def __init__(self, promotions, aliases=ALIASES):
+        # The catalog repeats a few slugs ("reyes-de-las-olas" is both the 2007
+        # and the 2011 promotion), so candidates are record indexes, not slugs
+        self.promotions = [promotion for promotion in promotions if promotion.get("slug") and promotion.get("name")]
+        self.matcher = PhraseMatcher()
+        self.phrases = {}
+        for word, flavor in FLAVORS.items():
+            self.matcher.add([word], ("flavor", flavor))
+        for word, side in SIDES.items():
+            self.matcher.add([word], ("side", side))
+        for index, promotion in enumerate(self.promotions):
+            for words, priority in self._variants(promotion):
+                self._add_promotion(words, index, priority)
+        for phrase, slug in aliases.items():
+            for index, promotion in enumerate(self.promotions):
+                if promotion["slug"] == slug:
+                    self._add_promotion(normalize_words(phrase), index, PRIORITY_ALIAS)
+        # A phrase shared by several promotions is added once for each; the
+        # year in the filename or the catalog order decides between them
+        for phrase, indexes in self.phrases.items():
+            for index, priority in indexes.items():
+                self.matcher.add(phrase.split(), ("promotion", (index, priority, len(phrase))))
+        self.matcher.build()
+
+        # Trigram postings of the catalog phrases for the fuzzy fallback
+        self.trigram_index = {}
+        self.trigram_counts = {}
+        for phrase in self.phrases:
+            trigrams = _trigrams(phrase)
+            self.trigram_counts[phrase] = len(trigrams)
+            for trigram in trigrams:
+                self.trigram_index.setdefault(trigram, []).append(phrase)
+
+    @classmethod
+    def from_catalog(cls):
+        return cls(load_catalog())
+
+    @staticmethod
+    def _variants(promotion):
+        """Phrases a filename may use for a promotion, with their priority"""
+        name = normalize_words(promotion["name"])
+        slug = normalize_words(promotion["slug"])
+        variants = [(name, PRIORITY_NAME), (slug, PRIORITY_VARIANT)]
+        for words in (name, slug):
+            bare = [word for word in words if not YEAR_RE.fullmatch(word)]
+            if bare and bare != words:
+                variants.append((bare, PRIORITY_VARIANT))
+        for words, _ in list(variants):
+            if len(words) > 1:
+                variants.append(([''.join(words)], PRIORITY_COMPACT))
+        return variants
+
+    def _add_promotion(self, words, index, priority):
+        if words:
+            indexes = self.phrases.setdefault(' '.join(words), {})
+            indexes[index] = min(priority, indexes.get(index, priority))
+
+    def _years(self, index):
+        promotion = self.promotions[index]
+        start = promotion.get("startYear")
+        end = promotion.get("endYear") or start
+        return range(start, end + 1) if isinstance(start, int) and isinstance(end, int) else range(0)
+
+    def _pick(self, candidates, years):
+        """Best (index, ...) candidate: longest, most specific, year-compatible, first in the catalog"""
+        def rank(candidate):
+            index, priority, length = candidate
+            matches_year = any(year in self._years(index) for year in years)
+            return (-length, priority, not matches_year, index)
+        return min(candidates, key=rank)[0]
+
+    def _fuzzy(self, words, years):
+        """(index, score) of the closest catalog phrase to the leftover words, or (None, 0)"""
+        text = ' '.join(words)
+        if len(text) < 3:
+            return None, 0.0
+        trigrams = _trigrams(text)
+        shared = Counter()
+        for trigram in trigrams:
+            shared.update(self.trigram_index.get(trigram, ()))
+        # Dice coefficient of the trigram sets preselects the candidates to compare exactly
+        candidates = heapq.nlargest(FUZZY_CANDIDATES, shared, key=lambda phrase: (
+            2 * shared[phrase] / (len(trigrams) + self.trigram_counts[phrase])))
+        best = (None, 0.0)
+        for phrase in candidates:
+            score = SequenceMatcher(None, text, phrase).ratio()
+            if score >= FUZZY_CUTOFF and score > best[1]:
+                indexes = self.phrases[phrase]
+                best = (self._pick([(index, priority, 0) for index, priority in indexes.items()], years), score)
+        return best
+
+    def classify(self, filename):
+        """Classify one filename (the extension and timestamps are ignored)
+
+        Returns promotion (catalog name), slug, key (its variable name), year,
+        flavor and side, plus "match": "exact", "fuzzy" or None and the fuzzy
+        "score".
+        """
+        words = normalize_words(os.path.splitext(os.path.basename(filename))[0])
+        years = [int(word) for word in words if YEAR_RE.fullmatch(word)]
+        flavors, sides, candidates = set(), set(), []
+        used = [False] * len(words)
+        for start, end, (kind, value) in self.matcher.matches(words):
+            if kind == "flavor":
+                flavors.add(value)
+            elif kind == "side":
+                sides.add(value)
+            else:
+                candidates.append(value)
+            if kind != "promotion":
+                used[start] = True
+
+        index, match, score = None, None, None
+        if candidates:
+            index, match = self._pick(candidates, years), "exact"
+        else:
+            leftover = [
+                word for word, taken in zip(words, used)
+                if not taken and not word.isdigit() and word not in NOISE_WORDS
+            ]
+            index, score = self._fuzzy(leftover, years)
+            match = "fuzzy" if index is not None else None
+
+        promotion = self.promotions[index] if index is not None else {}
+        year = UNKNOWN
+        if index is not None:
+            in_range = [year for year in years if year in self._years(index)]
+            start_year = promotion.get("startYear")
+            year = str(in_range[0] if in_range else start_year if start_year is not None else UNKNOWN)
+        elif years:
+            year = str(years[0])
+        return {
+            "promotion": promotion.get("name", UNKNOWN),
+            "slug": promotion.get("slug"),
+            "key": promotion.get("key"),
+            "year": year,
+            "flavor": next((flavor for flavor in FLAVOR_ORDER if flavor in flavors), UNKNOWN),
+            "side": next((side for side in SIDE_ORDER if side in sides), DEFAULT_SIDE),
+            "match": match,
+            "score": score,
+        }
+
+
+@lru_cache(maxsize=None)
+def default_classifier():
+    """Classifier over the current catalog, built on first use"""
+    return FilenameClassifier.from_catalog()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify wrapper photo filenames against the promotion catalog")
+    parser.add_argument("patterns", nargs="+", help="filenames or glob patterns")
+    args = parser.parse_args()
+
+    classifier = default_classifier()
+    print(f"📋 {len(classifier.promotions)} promotions, {len(classifier.phrases)} phrases")
+    for pattern in args.patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            info = classifier.classify(path)
+            if info["match"] == "exact":
+                status = "✓"
+            elif info["match"] == "fuzzy":
+                status = f"≈ {info['score']:.2f}"
+            else:
+                status = "✗"
+            print(f"{status} {os.path.basename(path)} -> {info['promotion']} ({info['year']}), "
+                  f"{info['flavor']} {info['side']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 from PIL import Image
+from orientation import detect_directory, corrections
 
 # List of images that need to be rotated 180 degrees (upside down)
 upside_down_images = [
@@ -10,8 +12,15 @@ upside_down_images = [
     "../attached_assets/rotated/Askistix 2004 chocolate frontal_1755148526400_rotated.png"
 ]
 
-def fix_upside_down_images():
-    for image_path in upside_down_images:
+def detect_upside_down_images(directory="../attached_assets/rotated"):
+    """Find upside-down images with the orientation detector instead of a hand-written list"""
+    return [
+        result["path"] for result in corrections(detect_directory(directory))
+        if result["angle"] == 180
+    ]
+
+def fix_upside_down_images(image_paths=upside_down_images):
+    for image_path in image_paths:
         if os.path.exists(image_path):
             try:
                 print(f"Rotating {image_path} 180 degrees...")
@@ -22,8 +31,11 @@ def fix_upside_down_images():
                 # Rotate 180 degrees to fix upside down orientation
                 rotated_img = img.rotate(180, expand=True)
                 
-                # Save the corrected image
-                rotated_img.save(image_path, format='PNG', optimize=True)
+                # Save the corrected image next to the original, then swap it in
+                temp_path = image_path + ".tmp"
+                rotated_img.save(temp_path, format='PNG', optimize=True)
+                img.close()
+                os.replace(temp_path, image_path)
                 print(f"✓ Fixed {image_path}")
                 
             except Exception as e:
@@ -32,5 +44,14 @@ def fix_upside_down_images():
             print(f"✗ File not found: {image_path}")
 
 if __name__ == "__main__":
-    fix_upside_down_images()
+    if "--detect" in sys.argv:
+        # The heuristic is not reliable enough to rotate on its own (see orientation.py --check),
+        # so detected images are only listed unless --apply is given as well
+        detected = detect_upside_down_images()
+        for image_path in detected:
+            print(f"↻ Detected upside down: {image_path}")
+        if "--apply" in sys.argv:
+            fix_upside_down_images(detected)
+    else:
+        fix_upside_down_images()
     print("Done fixing upside down images!")
\ No newline at end of file
@@ -5,25 +5,20 @@ y procesar las nuevas imágenes subidas.
 """
 
 import os
-from PIL import Image
-import sys
+from instrumentation import profiled
+from rotation_cache import RotationCache
+from rotation_engine import make_task, parse_args, rotate_batch
 
-def rotate_image(input_path, output_path, degrees):
-    """Rota una imagen el número especificado de grados."""
-    try:
-        with Image.open(input_path) as img:
-            # Rotar la imagen
-            rotated = img.rotate(degrees, expand=True)
-            
-            # Guardar la imagen rotada
-            rotated.save(output_path)
-            print(f"✓ Rotada {os.path.basename(input_path)} -> {os.path.basename(output_path)}")
-            return True
-    except Exception as e:
-        print(f"✗ Error rotando {input_path}: {e}")
-        return False
+def report(result):
+    """Imprime el resultado de una rotación."""
+    if result["cached"]:
+        print(f"↺ Ya rotada {os.path.basename(result['output_path'])}")
+    elif result["success"]:
+        print(f"✓ Rotada {os.path.basename(result['input_path'])} -> {os.path.basename(result['output_path'])}")
+    else:
+        print(f"✗ Error rotando {result['input_path']}: {result['error']}")
 
-def main():
+def main(jobs=None, cache=None):
     base_dir = "attached_assets"
     rotated_dir = os.path.join(base_dir, "rotated")
     
@@ -65,29 +60,41 @@ def main():
     print("🔄 Corrigiendo imágenes existentes que están de cabeza...")
     
     # Corregir imágenes existentes (180 grados)
+    tasks = []
     for img_name in existing_images_to_fix:
         input_path = os.path.join(base_dir, img_name)
         if os.path.exists(input_path):
-            # Sobrescribir las imágenes originales rotadas existentes
+            # Sobrescribir las imágenes originales rotadas existentes. Se generan
+            # desde el original (-90 + 180 = 90 grados) en lugar de rotar la copia
+            # en su lugar, así correr el script dos veces no las vuelve a voltear.
             original_rotated = os.path.join(rotated_dir, img_name.replace('.png', '_rotated.png'))
             if os.path.exists(original_rotated):
-                rotate_image(original_rotated, original_rotated, 180)
+                tasks.append(make_task(input_path, original_rotated, 90, 'PNG'))
         else:
             print(f"⚠ No encontrada: {img_name}")
     
+    for result in rotate_batch(tasks, jobs, cache):
+        report(result)
+    
     print("\n🔄 Procesando nuevas imágenes...")
     
     # Procesar nuevas imágenes (90 grados a la derecha)
+    tasks = []
     for img_name in new_images:
         input_path = os.path.join(base_dir, img_name) 
         output_path = os.path.join(rotated_dir, img_name.replace('.png', '_rotated.png'))
         
         if os.path.exists(input_path):
-            rotate_image(input_path, output_path, -90)  # -90 para rotar a la derecha
+            tasks.append(make_task(input_path, output_path, -90))  # -90 para rotar a la derecha
         else:
             print(f"⚠ No encontrada: {img_name}")
     
+    for result in rotate_batch(tasks, jobs, cache):
+        report(result)
+    
     print(f"\n✅ Proceso completado. Imágenes rotadas guardadas en: {rotated_dir}/")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args("Corrige la rotación de las imágenes de Vualá")
+    with profiled(args, "fix_vuala_rotations"):
+        main(args.jobs, None if args.force else RotationCache.load())
\ No newline at end of file
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Shared-memory transport for decoded frames between worker processes.
+
+A decoded 24 MP RGBA wrapper photo is 96 MB. Returning it from a process
+pool worker pickles and copies it twice (into the pipe and out again), so
+once decoding, transforming and encoding run in different workers the
+copies cost more than the work. Here a frame is written once into a
+multiprocessing.shared_memory segment and only a small descriptor is
+pickled:
+
+    {"name": "psm_1a2b3c", "shape": [4000, 6000, 4], "dtype": "uint8", "mode": "RGBA"}
+
+Any process can then attach to the segment and read the pixels as a
+NumPy view (or a Pillow image over the same buffer) without copying.
+
+The process that creates a frame hands ownership to whoever receives the
+descriptor; that side calls release_frame once every reader is done.
+Creating and reading processes do not leave the segment registered with
+their resource tracker, which would otherwise warn about a "leak" (and
+unlink it) when a pool worker exits.
+"""
+
+import sys
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from PIL import Image
+
+# Pillow modes that map one-to-one onto a uint8 array
+FRAME_CHANNELS = {'L': 1, 'RGB': 3, 'RGBA': 4}
+
+
+def _untracked(name=None, size=0):
+    """Create or attach to a segment without registering it with this process's resource tracker"""
+    create = name is None
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    # Registering and unregistering right after would race with other pool
+    # processes sharing the same tracker, so the registration is skipped
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name, create=create, size=size)
+    finally:
+        resource_tracker.register = register
+
+
+def share_array(array, mode=None):
+    """Copy an array into a new shared memory segment and return its descriptor"""
+    array = np.ascontiguousarray(array)
+    segment = _untracked(size=max(1, array.nbytes))
+    try:
+        np.ndarray(array.shape, array.dtype, buffer=segment.buf)[...] = array
+        return {"name": segment.name, "shape": list(array.shape), "dtype": array.dtype.str, "mode": mode}
+    finally:
+        # Only this process's mapping is closed; the segment lives on until released
+        segment.close()
+
+
+def share_image(img):
+    """Write a Pillow image into shared memory, converting it to L, RGB or RGBA if needed"""
+    if img.mode not in FRAME_CHANNELS:
+        img = img.convert('RGBA' if img.has_transparency_data else 'RGB')
+    return share_array(np.asarray(img), img.mode)
+
+
+def share_bytes(data):
+    """Put an encoded buffer (e.g. a PNG) into shared memory"""
+    return share_array(np.frombuffer(data, dtype=np.uint8))
+
+
+@contextmanager
+def open_array(descriptor):
+    """Attach to a shared frame and yield a NumPy view of it
+
+    The view is only valid inside the with block; copy anything that has
+    to outlive it.
+    """
+    segment = _untracked(descriptor["name"])
+    try:
+        yield np.ndarray(tuple(descriptor["shape"]), np.dtype(descriptor["dtype"]), buffer=segment.buf)
+    finally:
+        segment.close()
+
+
+@contextmanager
+def open_image(descriptor):
+    """Attach to a shared frame and yield a Pillow image backed by the same memory"""
+    with open_array(descriptor) as array:
+        height, width = descriptor["shape"][:2]
+        mode = descriptor["mode"]
+        img = Image.frombuffer(mode, (width, height), array, 'raw', mode, 0, 1)
+        try:
+            yield img
+        finally:
+            img.close()
+            del img
+
+
+def read_bytes(descriptor):
+    """Copy a buffer stored with share_bytes out of shared memory"""
+    with open_array(descriptor) as array:
+        return array.tobytes()
+
+
+def release_frame(descriptor):
+    """Free a shared frame once no process needs it any more"""
+    # A tracked attach, which unlink() unregisters again; the only tracker
+    # messages ever sent for a segment come from here
+    try:
+        segment = shared_memory.SharedMemory(name=descriptor["name"])
+    except FileNotFoundError:
+        return
+    segment.close()
+    segment.unlink()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+In-memory transform chains for wrapper images.
+
+process_wrapper_images used to go through the disk between stages: it
+rotated into <name>_temp.ext, re-opened that file for background removal
+and only then wrote the PNG, paying a decode and an encode per stage. A
+chain decodes the source once, applies every transform to the same Image
+object and encodes only at the end, optionally into several outputs:
+
+    chain = make_chain(path, [
+        {"op": "orient", "detect": True},
+        {"op": "remove_background"},
+        {"op": "trim", "padding": 4},
+    ], [
+        {"path": "out.png", "format": "PNG"},
+        {"path": "out-320w.webp", "format": "WEBP", "width": 320, "options": {"quality": 80}},
+    ])
+    result = run_chain(chain)
+
+Operations:
+    orient             apply the EXIF orientation; with "detect", fall back to
+                       the pixel heuristic when there is no tag
+    rotate             counterclockwise by "degrees"
+    flatten            paste transparent images onto white
+    alpha              convert to RGBA
+    trim               crop to the bounding box of the non-transparent pixels
+    remove_background  offline border flood fill ("threshold", "feather")
+    resize             to "width" pixels wide, never upscaling
+
+An output without a "path" is encoded into memory and returned as bytes
+in result["outputs"][i]["data"], e.g. to upload it without a temp file.
+An output with "if_transformed" is only encoded when some step changed
+the decoded image (result["transformed"]); otherwise the source file
+already is that output and it is left out of result["outputs"].
+
+run_chains_shared runs many chains in a process pool with the decode and
+transforms in one task and every encode in its own task. The transformed
+frame moves between them through shared memory (frame_transport.py), so
+only small descriptors are pickled and the outputs of one image encode in
+parallel.
+
+Every result carries the decode, step and encode spans measured in the
+worker in result["trace"] (see instrumentation.py).
+"""
+
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+from background_removal import DEFAULT_FEATHER, DEFAULT_THRESHOLD, remove_background_image
+from frame_transport import open_image, read_bytes, release_frame, share_bytes, share_image
+from instrumentation import measure
+from orientation import DEFAULT_MIN_CONFIDENCE, orientation_from_image
+
+
+def make_chain(input_path, steps, outputs):
+    """Describe one decode -> transforms -> encodes job"""
+    return {
+        "input_path": str(input_path),
+        "steps": [dict(step) for step in steps],
+        "outputs": [dict(output) for output in outputs],
+    }
+
+
+def _orient(img, step, result):
+    orientation = img.getexif().get(0x0112, 1)
+    if orientation != 1:
+        result["orientation"] = {"angle": None, "source": "exif", "confidence": 1.0}
+        return ImageOps.exif_transpose(img)
+    if not step.get("detect"):
+        return img
+    angle, confidence = orientation_from_image(img)
+    result["orientation"] = {"angle": angle, "source": "heuristic", "confidence": confidence}
+    if angle != 0 and confidence >= step.get("min_confidence", DEFAULT_MIN_CONFIDENCE):
+        return img.rotate(angle, expand=True)
+    return img
+
+
+def _flatten(img):
+    if img.mode not in ('RGBA', 'LA', 'PA') and 'transparency' not in img.info:
+        return img
+    img = img.convert('RGBA')
+    background = Image.new('RGB', img.size, (255, 255, 255))
+    background.paste(img, mask=img.getchannel('A'))
+    return background
+
+
+def _trim(img, padding=0):
+    if 'A' not in img.getbands():
+        return img
+    box = img.getchannel('A').getbbox()
+    if box is None or box == (0, 0) + img.size:
+        return img
+    left, top, right, bottom = box
+    return img.crop((max(0, left - padding), max(0, top - padding),
+                     min(img.width, right + padding), min(img.height, bottom + padding)))
+
+
+def _resize(img, width):
+    if width >= img.width:
+        return img
+    height = max(1, round(img.height * width / img.width))
+    return img.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+
+
+def apply_step(img, step, result):
+    """Apply one chain step to a decoded image and return the new image"""
+    op = step["op"]
+    if op == "orient":
+        return _orient(img, step, result)
+    if op == "rotate":
+        return img.rotate(step["degrees"], expand=True) if step["degrees"] % 360 else img
+    if op == "flatten":
+        return _flatten(img)
+    if op == "alpha":
+        return img if img.mode == 'RGBA' else img.convert('RGBA')
+    if op == "trim":
+        return _trim(img, step.get("padding", 0))
+    if op == "remove_background":
+        return remove_background_image(img, step.get("threshold", DEFAULT_THRESHOLD),
+                                       step.get("feather", DEFAULT_FEATHER))
+    if op == "resize":
+        return _resize(img, step["width"])
+    raise ValueError(f"Unknown chain operation {op!r}")
+
+
+def _encode(img, output, trace=None):
+    image_format = output.get("format") or Image.registered_extensions()[os.path.splitext(output["path"])[1].lower()]
+    with measure("encode", trace=trace, format=image_format, width=output.get("width")):
+        if "width" in output:
+            img = _resize(img, output["width"])
+        if image_format.upper() in ('JPEG', 'JPG') and img.mode not in ('RGB', 'L'):
+            img = _flatten(img).convert('RGB')
+        if output.get("path"):
+            temp_path = output["path"] + ".tmp"
+            img.save(temp_path, image_format, **output.get("options", {}))
+            os.replace(temp_path, output["path"])
+            return {"path": output["path"], "format": image_format, "size": img.size, "data": None}
+        buffer = io.BytesIO()
+        img.save(buffer, image_format, **output.get("options", {}))
+        return {"path": None, "format": image_format, "size": img.size, "data": buffer.getvalue()}
+
+
+def _decode(chain, result):
+    name = os.path.basename(chain["input_path"])
+    with measure("decode", trace=result["trace"], file=name):
+        img = Image.open(chain["input_path"])
+        # load() also closes the file of single-frame images
+        img.load()
+    decoded = img
+    for step in chain["steps"]:
+        with measure(step["op"], trace=result["trace"], file=name):
+            img = apply_step(img, step, result)
+    result["transformed"] = img is not decoded
+    return img
+
+
+def _wanted_outputs(chain, result):
+    """The chain's outputs, minus the "if_transformed" ones when no step changed the image"""
+    return [output for output in chain["outputs"] if result["transformed"] or not output.get("if_transformed")]
+
+
+def run_chain(chain):
+    """Decode the input once, apply every step and write every output
+
+    Never prints, so it can run inside worker processes; the caller
+    reports the returned result.
+    """
+    result = {
+        "input_path": chain["input_path"],
+        "orientation": None,
+        "transformed": False,
+        "outputs": [],
+        "success": False,
+        "error": None,
+        "trace": [],
+    }
+    try:
+        img = _decode(chain, result)
+        result["outputs"] = [_encode(img, output, result["trace"]) for output in _wanted_outputs(chain, result)]
+        result["success"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def transform_frame(chain):
+    """Decode and transform one chain's input, leaving the frame in shared memory
+
+    The result carries the frame descriptor in result["frame"]; whoever
+    receives it must release_frame it.
+    """
+    result = {
+        "input_path": chain["input_path"],
+        "orientation": None,
+        "transformed": False,
+        "outputs": [],
+        "frame": None,
+        "success": False,
+        "error": None,
+        "trace": [],
+    }
+    try:
+        img = _decode(chain, result)
+        with measure("share frame", trace=result["trace"]):
+            result["frame"] = share_image(img)
+        result["success"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def encode_frame(args):
+    """Encode one output from a shared frame; in-memory outputs come back in shared memory too"""
+    frame, output = args
+    trace = []
+    try:
+        with open_image(frame) as img:
+            encoded = _encode(img, output, trace)
+    except Exception as e:
+        return {"path": output.get("path"), "error": str(e), "trace": trace}
+    if encoded["data"] is not None:
+        encoded["data"] = share_bytes(encoded.pop("data"))
+        encoded["shared"] = True
+    encoded["error"] = None
+    encoded["trace"] = trace
+    return encoded
+
+
+def _collect_outputs(executor, result, outputs):
+    frame = result.pop("frame")
+    try:
+        futures = [executor.submit(encode_frame, (frame, output)) for output in outputs]
+        encoded = [future.result() for future in futures]
+    finally:
+        release_frame(frame)
+    for output in encoded:
+        if output.pop("shared", False):
+            descriptor = output["data"]
+            output["data"] = read_bytes(descriptor)
+            release_frame(descriptor)
+    for output in encoded:
+        result["trace"].extend(output.pop("trace"))
+    errors = [output["error"] for output in encoded if output["error"]]
+    result["outputs"] = encoded
+    if errors:
+        result["success"] = False
+        result["error"] = "; ".join(errors)
+
+
+def run_chains_shared(chains, jobs=None):
+    """Run chains across a process pool, yielding results (like run_chain's) in order
+
+    At most `jobs` frames are decoded ahead of the encoder, which bounds
+    the shared memory in use to a few frames.
+    """
+    chains = list(chains)
+    window = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=window) as executor:
+        pending = deque()
+        next_chain = 0
+        try:
+            for chain in chains:
+                while next_chain < len(chains) and len(pending) < window:
+                    pending.append(executor.submit(transform_frame, chains[next_chain]))
+                    next_chain += 1
+                result = pending.popleft().result()
+                if result["success"]:
+                    _collect_outputs(executor, result, _wanted_outputs(chain, result))
+                else:
+                    result.pop("frame")
+                yield result
+        finally:
+            # Frames decoded ahead of a consumer that stopped early are still in shared memory
+            for future in pending:
+                if future.cancel() or future.exception() is not None:
+                    continue
+                frame = future.result()["frame"]
+                if frame is not None:
+                    release_frame(frame)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Lightweight timing and memory instrumentation for the batch scripts.
+
+A span measures one stage or one image: wall time, CPU time of the
+process, bytes read and written (from /proc/self/io, so it counts
+decodes, encodes and JSON writes alike) and the peak RSS so far.
+
+    with tracer.span("rotate", "stage", items=12):
+        ...
+
+Work that runs in pool workers cannot reach the parent's tracer, so the
+worker functions (rotate_task, run_chain, ...) measure themselves with
+measure() and return the events in result["trace"]; the parent passes
+them to tracer.add(). Worker events keep their own pid, so the trace
+shows one row per worker process.
+
+Scripts take --trace PATH and --profile through add_profile_arguments()
+and wrap their run in profiled(args, label). At the end the tracer
+writes a Chrome trace-event file (open it in chrome://tracing or
+https://ui.perfetto.dev) and prints a per-span summary table. --profile
+also runs cProfile and tracemalloc around the whole run and prints the
+top functions and allocation sites. Without either flag nothing is
+recorded.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+TRACE_DIR = os.path.join("attached_assets", ".trace")
+PROFILE_TOP = 25
+TRACEMALLOC_TOP = 10
+
+
+def io_counters():
+    """(bytes read, bytes written) by this process so far, or (None, None) off Linux"""
+    try:
+        with open('/proc/self/io', 'rb') as f:
+            fields = dict(line.split(b':', 1) for line in f.read().splitlines() if b':' in line)
+        return int(fields[b'rchar']), int(fields[b'wchar'])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux KiB
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+@contextmanager
+def measure(name, category="image", trace=None, **args):
+    """Measure the with block and yield the event dict, filled in on exit
+
+    Always records, so worker functions can attach the events to their
+    result (appended to the `trace` list when one is given); it costs a
+    few system calls.
+    """
+    event = {"name": name, "cat": category, "pid": os.getpid(), "tid": threading.get_native_id(),
+             "args": dict(args)}
+    read_before, written_before = io_counters()
+    cpu_before = time.process_time_ns()
+    event["ts"] = time.time_ns() // 1000
+    start = time.perf_counter_ns()
+    try:
+        yield event
+    finally:
+        event["dur"] = (time.perf_counter_ns() - start) // 1000
+        event["cpu"] = (time.process_time_ns() - cpu_before) // 1000
+        read_after, written_after = io_counters()
+        event["read"] = read_after - read_before if read_before is not None else None
+        event["written"] = written_after - written_before if written_before is not None else None
+        event["peak_rss_kb"] = peak_rss_kb()
+        if trace is not None:
+            trace.append(event)
+
+
+class Tracer:
+    """Collects span events for one run"""
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+
+    @contextmanager
+    def span(self, name, category="stage", **args):
+        """Measure the with block when tracing is enabled"""
+        if not self.enabled:
+            yield None
+            return
+        with measure(name, category, **args) as event:
+            try:
+                yield event
+            finally:
+                self.events.append(event)
+
+    def add(self, events):
+        """Record events measured elsewhere (e.g. returned by a pool worker)"""
+        if self.enabled and events:
+            self.events.extend(events)
+
+    def chrome_trace(self):
+        """Trace-event JSON: one complete ("X") event per span, measurements in args"""
+        trace_events = []
+        for pid in sorted({event["pid"] for event in self.events}):
+            label = "main" if pid == os.getpid() else f"worker {pid}"
+            trace_events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": label}})
+        for event in self.events:
+            trace_events.append({
+                "name": event["name"], "cat": event["cat"], "ph": "X",
+                "ts": event["ts"], "dur": event["dur"], "pid": event["pid"], "tid": event["tid"],
+                "args": dict(event["args"], cpu_ms=event["cpu"] / 1000, read_bytes=event["read"],
+                             written_bytes=event["written"], peak_rss_kb=event["peak_rss_kb"]),
+            })
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def export(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary(self):
+        """Rows of totals per (category, name), slowest first"""
+        rows = {}
+        for event in self.events:
+            row = rows.setdefault((event["cat"], event["name"]), {
+                "category": event["cat"], "name": event["name"], "count": 0, "wall_ms": 0.0,
+                "cpu_ms": 0.0, "read_bytes": 0, "written_bytes": 0, "peak_rss_kb": 0,
+            })
+            row["count"] += 1
+            row["wall_ms"] += event["dur"] / 1000
+            row["cpu_ms"] += event["cpu"] / 1000
+            row["read_bytes"] += event["read"] or 0
+            row["written_bytes"] += event["written"] or 0
+            row["peak_rss_kb"] = max(row["peak_rss_kb"], event["peak_rss_kb"])
+        return sorted(rows.values(), key=lambda row: row["wall_ms"], reverse=True)
+
+    def print_summary(self):
+        print(f"\n📊 {'span':<32} {'n':>5} {'wall s':>9} {'cpu s':>9} {'read MB':>9} {'write MB':>9} {'peak RSS MB':>12}")
+        for row in self.summary():
+            label = f"{row['category']}:{row['name']}"[:32]
+            print(f"   {label:<32} {row['count']:>5} {row['wall_ms'] / 1000:>9.3f} {row['cpu_ms'] / 1000:>9.3f} "
+                  f"{row['read_bytes'] / 1e6:>9.1f} {row['written_bytes'] / 1e6:>9.1f} "
+                  f"{row['peak_rss_kb'] / 1024:>12.1f}")
+
+
+# The tracer of the current run; scripts enable it through profiled()
+tracer = Tracer()
+
+
+def add_profile_arguments(parser):
+    """Add the shared --trace and --profile flags to an argparse parser"""
+    parser.add_argument('--trace', metavar='PATH', nargs='?', const='',
+                        help=f"record per-stage and per-image spans and write a Chrome trace "
+                             f"(default path: {TRACE_DIR}/<script>-<time>.json)")
+    parser.add_argument('--profile', action='store_true',
+                        help="also run cProfile and tracemalloc and print the top functions and allocations")
+    return parser
+
+
+def _print_profile(profile):
+    stream = io.StringIO()
+    pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(PROFILE_TOP)
+    print(f"\n📋 cProfile, top {PROFILE_TOP} by cumulative time (this process only):")
+    print(stream.getvalue())
+
+
+def _print_allocations(snapshot, traced):
+    print(f"📋 tracemalloc, top {TRACEMALLOC_TOP} allocation sites (Python objects only, not Pillow buffers):")
+    for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+        print(f"   {stat.size / 1e6:8.1f} MB  {stat.count:>8} blocks  {stat.traceback}")
+    current, peak = traced
+    print(f"   current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB")
+
+
+@contextmanager
+def profiled(args, label):
+    """Trace (and with --profile, profile) the with block according to the parsed flags"""
+    trace_path = getattr(args, 'trace', None)
+    profile_run = getattr(args, 'profile', False)
+    if trace_path is None and not profile_run:
+        yield
+        return
+
+    tracer.enabled = True
+    profile = cProfile.Profile() if profile_run else None
+    if profile_run:
+        tracemalloc.start()
+        profile.enable()
+    try:
+        with tracer.span(label, "run"):
+            yield
+    finally:
+        if profile_run:
+            profile.disable()
+            snapshot = tracemalloc.take_snapshot()
+            traced = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        tracer.enabled = False
+        path = trace_path or os.path.join(TRACE_DIR, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        tracer.export(path)
+        tracer.print_summary()
+        if profile_run:
+            _print_profile(profile)
+            _print_allocations(snapshot, traced)
+        print(f"📋 Chrome trace saved to: {path}")
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Lossless 90/180/270 degree rotation for JPEG wrapper photos.
+
+Instead of decoding the whole JPEG, rotating it in Pillow and encoding it
+again, this module either:
+1. Runs jpegtran (when installed), which rotates the DCT blocks directly, or
+2. Rewrites the EXIF orientation tag so viewers and browsers display the
+   image rotated, touching only a few header bytes.
+
+Both paths leave the compressed image data untouched, so there is no
+quality loss. Callers fall back to Pillow for PNG/RGBA sources or when
+neither path applies.
+"""
+
+import os
+import shutil
+import struct
+import subprocess
+
+JPEG_SOI = b'\xff\xd8'
+EXIF_HEADER = b'Exif\x00\x00'
+ORIENTATION_TAG = 0x0112
+
+# EXIF orientation -> (mirrored, clockwise quarter turns), where the image is
+# displayed by mirroring it horizontally first and then rotating it
+ORIENTATION_TRANSFORMS = {
+    1: (False, 0),
+    6: (False, 1),
+    3: (False, 2),
+    8: (False, 3),
+    2: (True, 0),
+    7: (True, 1),
+    4: (True, 2),
+    5: (True, 3),
+}
+TRANSFORM_ORIENTATIONS = {transform: value for value, transform in ORIENTATION_TRANSFORMS.items()}
+
+
+def is_jpeg(path):
+    """Check the file signature rather than trusting the extension"""
+    with open(path, 'rb') as f:
+        return f.read(3) == b'\xff\xd8\xff'
+
+
+def is_jpeg_output(path):
+    """Whether an output path will be written as JPEG"""
+    return os.path.splitext(str(path))[1].lower() in ('.jpg', '.jpeg')
+
+
+def clockwise_turns(degrees):
+    """Convert Pillow's counterclockwise degrees to clockwise quarter turns"""
+    if degrees % 90 != 0:
+        raise ValueError(f"Lossless rotation only supports multiples of 90 degrees, got {degrees}")
+    return (-degrees // 90) % 4
+
+
+def compose_orientation(orientation, degrees):
+    """EXIF orientation after rotating an image displayed with `orientation` by `degrees`"""
+    mirrored, turns = ORIENTATION_TRANSFORMS.get(orientation, (False, 0))
+    return TRANSFORM_ORIENTATIONS[(mirrored, (turns + clockwise_turns(degrees)) % 4)]
+
+
+def _segments(data):
+    """Yield (marker, start, length) for every JPEG header segment before the scan data"""
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise ValueError("Malformed JPEG segment")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            pos += 1
+            continue
+        if marker == 0xDA or marker == 0xD9:
+            # Start of scan / end of image: only compressed data follows
+            return
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        yield marker, pos, length
+        pos += 2 + length
+
+
+def _find_orientation(data):
+    """Locate the EXIF orientation value in a JPEG header
+
+    Returns (exif_found, offset, endian, value). offset points at the two
+    bytes holding the orientation value, or is None when the EXIF block has
+    no orientation tag.
+    """
+    for marker, start, length in _segments(data):
+        if marker != 0xE1 or data[start + 4:start + 10] != EXIF_HEADER:
+            continue
+        tiff = start + 10
+        endian = '<' if data[tiff:tiff + 2] == b'II' else '>'
+        ifd_offset = struct.unpack(endian + 'I', data[tiff + 4:tiff + 8])[0]
+        ifd = tiff + ifd_offset
+        count = struct.unpack(endian + 'H', data[ifd:ifd + 2])[0]
+        for index in range(count):
+            entry = ifd + 2 + index * 12
+            tag = struct.unpack(endian + 'H', data[entry:entry + 2])[0]
+            if tag == ORIENTATION_TAG:
+                value = struct.unpack(endian + 'H', data[entry + 8:entry + 10])[0]
+                return True, entry + 8, endian, value
+        return True, None, endian, 1
+    return False, None, '>', 1
+
+
+def _exif_segment(orientation):
+    """Minimal APP1 EXIF segment holding only an orientation tag"""
+    tiff = b'MM\x00\x2a' + struct.pack('>I', 8)
+    ifd = struct.pack('>H', 1) + struct.pack('>HHIHH', ORIENTATION_TAG, 3, 1, orientation, 0) + struct.pack('>I', 0)
+    payload = EXIF_HEADER + tiff + ifd
+    return b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+
+
+def read_orientation(path):
+    """Read the EXIF orientation of a JPEG without decoding it (1 when absent)"""
+    with open(path, 'rb') as f:
+        data = f.read(65536 * 2)
+    if not data.startswith(JPEG_SOI):
+        return 1
+    return _find_orientation(data)[3]
+
+
+def rotate_by_exif(input_path, output_path, degrees):
+    """Rotate a JPEG by rewriting its EXIF orientation tag
+
+    Returns False when the file has an EXIF block without an orientation
+    tag, since adding one would mean rebuilding the IFD.
+    """
+    with open(input_path, 'rb') as f:
+        data = bytearray(f.read())
+    if not data.startswith(JPEG_SOI):
+        return False
+
+    exif_found, offset, endian, orientation = _find_orientation(data)
+    new_orientation = compose_orientation(orientation, degrees)
+
+    if offset is not None:
+        data[offset:offset + 2] = struct.pack(endian + 'H', new_orientation)
+    elif not exif_found:
+        # Insert a fresh EXIF block after SOI and a JFIF APP0 segment if present
+        insert_at = 2
+        for marker, start, length in _segments(data):
+            if marker == 0xE0:
+                insert_at = start + 2 + length
+            break
+        data[insert_at:insert_at] = _exif_segment(new_orientation)
+    else:
+        return False
+
+    temp_path = str(output_path) + ".tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, output_path)
+    return True
+
+
+def rotate_with_jpegtran(input_path, output_path, degrees):
+    """Rotate the DCT blocks with jpegtran, returning False if it is unavailable or not exact"""
+    jpegtran = shutil.which('jpegtran')
+    if jpegtran is None or read_orientation(input_path) != 1:
+        # jpegtran keeps the orientation tag, which would rotate the result twice
+        return False
+
+    turns = clockwise_turns(degrees)
+    if turns == 0:
+        if str(input_path) != str(output_path):
+            temp_path = str(output_path) + ".tmp"
+            shutil.copy2(input_path, temp_path)
+            os.replace(temp_path, output_path)
+        return True
+
+    temp_path = str(output_path) + ".tmp"
+    completed = subprocess.run(
+        [jpegtran, '-copy', 'all', '-perfect', '-rotate', str(turns * 90), '-outfile', temp_path, str(input_path)],
+        capture_output=True
+    )
+    if completed.returncode != 0:
+        # -perfect fails when the size is not a multiple of the MCU; never trim edges
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+    os.replace(temp_path, output_path)
+    return True
+
+
+def rotate_jpeg_lossless(input_path, output_path, degrees):
+    """Rotate a JPEG without re-encoding it
+
+    degrees follows Pillow's convention (counterclockwise). Returns the
+    method used ("jpegtran" or "exif"), or None when the caller should fall
+    back to Pillow.
+    """
+    if degrees % 90 != 0 or not is_jpeg(input_path) or not is_jpeg_output(output_path):
+        return None
+    if rotate_with_jpegtran(input_path, output_path, degrees):
+        return "jpegtran"
+    if rotate_by_exif(input_path, output_path, degrees):
+        return "exif"
+    return None
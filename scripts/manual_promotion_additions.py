@@ -3,21 +3,15 @@
 Manually add missing promotions and wrapper photo updates for batch 2
 """
 
-import re
-
-def read_storage_file():
-    """Read the current storage.ts file"""
-    with open('server/storage.ts', 'r', encoding='utf-8') as f:
-        return f.read()
-
-def write_storage_file(content):
-    """Write the updated storage.ts file"""
-    with open('server/storage.ts', 'w', encoding='utf-8') as f:
-        f.write(content)
+from perceptual_hash import NearDuplicateGuard
+from seed_data import require_storage_ts
+from storage_ts import StorageFile, ts_string
 
 def add_missing_promotions_and_updates():
     """Add missing promotions and wrapper photo updates"""
-    content = read_storage_file()
+    require_storage_ts("manual_promotion_additions.py")
+    storage = StorageFile.load()
+    guard = NearDuplicateGuard()
     
     # Missing promotions to add
     missing_promotions = {
@@ -105,13 +99,17 @@ def add_missing_promotions_and_updates():
     }
     
     # Find insertion point after vuala brand definition
-    vuala_brand_end = content.find('this.brands.set(vuala.id, vuala);')
-    if vuala_brand_end != -1:
-        insertion_point = content.find('\n', vuala_brand_end) + 1
-        
+    vuala_brand = storage.set_call('brands', 'vuala')
+    added_count = 0
+    if vuala_brand is not None:
         # Add all missing promotions
         for promo_name, promo_data in missing_promotions.items():
-            content = content[:insertion_point] + promo_data['definition'] + content[insertion_point:]
+            existing = storage.find_conflict(promo_data['definition'])
+            if existing is not None:
+                print(f"↺ Promotion already exists: {promo_name} ({existing.var_name})")
+                continue
+            storage.insert_after_line(vuala_brand['end'], promo_data['definition'])
+            added_count += 1
             print(f"✓ Added missing promotion: {promo_name}")
     
     # Wrapper photo updates for existing promotions
@@ -163,65 +161,25 @@ def add_missing_promotions_and_updates():
         new_photos = update["new_photos"]
         
         # Find the promotion definition by name
-        pattern = rf'(const\s+\w+:\s*Promotion\s*=\s*\{{[^}}]*name:\s*["\']({re.escape(promotion_name)})["\'][^}}]*wrapperPhotosUrls:\s*)(\[[^\]]*\]|null)([^}}]*\}};)'
-        match = re.search(pattern, content, re.DOTALL)
+        promotion = storage.find(name=promotion_name)
         
-        if match:
-            before_array = match.group(1)
-            existing_array = match.group(3)
-            after_array = match.group(4)
-            
-            if existing_array == 'null':
-                # Replace null with new array
-                new_array_str = '[\n        "' + '",\n        "'.join(new_photos) + '"\n      ]'
+        if promotion:
+            added = guard.append_photos(storage, promotion, [ts_string(photo) for photo in new_photos])
+            if added:
+                updated_count += 1
+                print(f"✓ Updated wrapper photos for '{promotion_name}' with {len(added)} new photos")
             else:
-                # Parse existing array and add new photos
-                import json
-                try:
-                    # Clean the existing array string for parsing
-                    clean_array = existing_array.strip()
-                    if clean_array.startswith('[') and clean_array.endswith(']'):
-                        # Extract photo URLs from the array
-                        existing_photos = []
-                        for line in clean_array.split('\n'):
-                            line = line.strip()
-                            if line.startswith('"') and line.endswith('"') or line.endswith('",'):
-                                photo_url = line.strip(' ",')
-                                if photo_url.startswith('"'):
-                                    photo_url = photo_url[1:]
-                                if photo_url:
-                                    existing_photos.append(photo_url)
-                        
-                        # Combine with new photos
-                        all_photos = existing_photos + new_photos
-                        # Remove duplicates while preserving order
-                        seen = set()
-                        unique_photos = []
-                        for photo in all_photos:
-                            if photo not in seen:
-                                seen.add(photo)
-                                unique_photos.append(photo)
-                        
-                        new_array_str = '[\n        "' + '",\n        "'.join(unique_photos) + '"\n      ]'
-                    else:
-                        new_array_str = '[\n        "' + '",\n        "'.join(new_photos) + '"\n      ]'
-                except:
-                    new_array_str = '[\n        "' + '",\n        "'.join(new_photos) + '"\n      ]'
-            
-            # Replace the entire match with updated version
-            new_match = before_array + new_array_str + after_array
-            content = content.replace(match.group(0), new_match)
-            updated_count += 1
-            print(f"✓ Updated wrapper photos for '{promotion_name}' with {len(new_photos)} new photos")
+                print(f"↺ '{promotion_name}' already has all {len(new_photos)} photos")
         else:
             print(f"⚠️  Could not find promotion '{promotion_name}' for update")
     
     # Write updated content
-    write_storage_file(content)
+    storage.save()
+    guard.save()
     
     print(f"\n✅ Manual additions complete!")
-    print(f"📊 Added {len(missing_promotions)} missing promotions")
+    print(f"📊 Added {added_count} missing promotions")
     print(f"📊 Updated {updated_count} existing promotions with wrapper photos")
 
 if __name__ == "__main__":
-    add_missing_promotions_and_updates()
\ No newline at end of file
+    add_missing_promotions_and_updates()
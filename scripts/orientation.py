@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Automatic orientation detection for wrapper photos.
+
+Reads the EXIF orientation tag first. Without one, it falls back to a cheap
+pixel heuristic on a downsampled thumbnail:
+1. Text lines and printed bands produce a row profile of edge energy that
+   alternates much more than the column profile. If the columns alternate
+   more, the photo is lying on its side.
+2. Wrapper titles and logos sit at the top, so the upright side is the one
+   with more edge energy.
+
+The detected angle is the counterclockwise rotation to pass to Pillow's
+rotate() to make the image upright (0, 90, 180 or 270).
+
+The heuristic is report-only: nothing is rotated unless --apply is given.
+--check compares it with the hand-labelled rotations in
+scripts/pipelines/batch_*.json and prints the lowest threshold at which no
+confident correction contradicts a label.
+
+Usage:
+    python scripts/orientation.py attached_assets/rotated [--apply] [--min-confidence 0.25]
+    python scripts/orientation.py --check
+"""
+
+import argparse
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from asset_store import ASSETS_DIR
+from jpeg_lossless import ORIENTATION_TRANSFORMS, read_orientation, is_jpeg
+from rotation_engine import add_jobs_argument, make_task, rotate_batch
+
+THUMBNAIL_SIZE = 256
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+# Checked against the labelled pipeline specs (--check): the most confident
+# wrong correction there is 0.224 (IMG_4257 at 180, Tattomania at 270), and
+# none of the three labelled 90 degree turns is detected at any threshold,
+# so this only keeps the report quiet; it is not safe to auto-apply.
+DEFAULT_MIN_CONFIDENCE = 0.25
+LABELLED_SPECS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipelines', 'batch_*.json')
+# Summed RGB distance from the border colour that counts as foreground
+FOREGROUND_THRESHOLD = 0.25
+
+
+def _profile_variation(profile):
+    """Coefficient of variation of a projection profile"""
+    mean = profile.mean()
+    return float(profile.std() / mean) if mean > 0 else 0.0
+
+
+def _load_thumbnail(image_path):
+    """Decode a reduced-resolution grayscale copy of the image and its foreground mask"""
+    with Image.open(image_path) as img:
+        # JPEG can decode at 1/2, 1/4 or 1/8 scale directly
+        img.draft('RGB', (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        return _thumbnail_arrays(img)
+
+
+def _thumbnail_arrays(img):
+    """Grayscale and foreground arrays of a thumbnail-sized image
+
+    Returns (gray, foreground) where gray holds floats in [0, 1] and
+    foreground marks pixels that belong to the wrapper rather than the
+    background.
+    """
+    rgba = np.asarray(img.convert('RGBA'), dtype=np.float32) / 255.0
+
+    alpha = rgba[..., 3]
+    rgb = rgba[..., :3] * alpha[..., None] + (1.0 - alpha[..., None])
+    gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+    if alpha.min() < 0.5:
+        foreground = alpha >= 0.5
+    else:
+        # Opaque photo: anything far from the median border colour is foreground
+        border = np.concatenate([rgb[0], rgb[-1], rgb[:, 0], rgb[:, -1]])
+        distance = np.abs(rgb - np.median(border, axis=0)).sum(axis=2)
+        foreground = distance > FOREGROUND_THRESHOLD
+    return gray, foreground
+
+
+def _foreground_aspect_score(foreground):
+    """Positive when the wrapper's bounding box is wider than it is tall"""
+    rows = np.flatnonzero(foreground.any(axis=1))
+    columns = np.flatnonzero(foreground.any(axis=0))
+    if len(rows) == 0 or len(columns) == 0:
+        return 0.0
+    height = rows[-1] - rows[0] + 1
+    width = columns[-1] - columns[0] + 1
+    return float(np.tanh(2 * np.log(width / height)))
+
+
+def orientation_from_pixels(gray, foreground=None):
+    """Estimate the upright angle of a grayscale array
+
+    Wrappers are landscape and printed with horizontal text, so the axis is
+    decided by the foreground bounding box together with the row/column
+    profiles of edge energy. Returns (angle, confidence) where confidence
+    is in [0, 1].
+    """
+    gx = np.abs(np.diff(gray, axis=1))[:-1, :]
+    gy = np.abs(np.diff(gray, axis=0))[:, :-1]
+    energy = gx + gy
+
+    row_variation = _profile_variation(energy.sum(axis=1))
+    column_variation = _profile_variation(energy.sum(axis=0))
+    total_variation = row_variation + column_variation
+    profile_score = (row_variation - column_variation) / total_variation if total_variation else 0.0
+    aspect_score = _foreground_aspect_score(foreground) if foreground is not None else 0.0
+    axis_score = (2 * aspect_score + profile_score) / 3
+
+    height, width = energy.shape
+    if axis_score >= 0:
+        # Upright or upside down: compare the top and bottom halves
+        first, second = energy[:height // 2].sum(), energy[height - height // 2:].sum()
+        angle_if_first, angle_if_second = 0, 180
+    else:
+        # Lying on its side: the heavier half is where the top of the wrapper ended up
+        first, second = energy[:, :width // 2].sum(), energy[:, width - width // 2:].sum()
+        angle_if_first, angle_if_second = 270, 90
+
+    balance = first + second
+    asymmetry = float((first - second) / balance) if balance > 0 else 0.0
+    angle = angle_if_first if asymmetry >= 0 else angle_if_second
+    # The axis is far more reliable than the up/down guess, so 180 degree
+    # flips need a clear imbalance before they reach the default threshold
+    confidence = min(1.0, abs(axis_score)) * min(1.0, 4 * abs(asymmetry))
+    if angle == 0:
+        confidence = min(1.0, abs(axis_score))
+    return angle, round(float(confidence), 3)
+
+
+def orientation_from_image(img):
+    """Estimate the upright angle of an already decoded image
+
+    Used by in-memory pipelines that hold the full-resolution frame, so the
+    file is not decoded a second time just to build a thumbnail.
+    """
+    scale = THUMBNAIL_SIZE / max(img.size)
+    if scale < 1:
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        img = img.resize(size, Image.BICUBIC, reducing_gap=2.0)
+    return orientation_from_pixels(*_thumbnail_arrays(img))
+
+
+def exif_angle(image_path):
+    """Upright angle implied by the EXIF orientation tag, or None if there is none"""
+    if not is_jpeg(image_path):
+        with Image.open(image_path) as img:
+            orientation = img.getexif().get(0x0112, 1)
+    else:
+        orientation = read_orientation(image_path)
+    if orientation == 1 or orientation not in ORIENTATION_TRANSFORMS:
+        return None
+    mirrored, clockwise_turns = ORIENTATION_TRANSFORMS[orientation]
+    return {"angle": (-90 * clockwise_turns) % 360, "mirrored": mirrored}
+
+
+def detect_orientation(image_path):
+    """Detect how far an image must be rotated (counterclockwise) to be upright"""
+    image_path = str(image_path)
+    try:
+        from_exif = exif_angle(image_path)
+        if from_exif is not None:
+            return {
+                "path": image_path,
+                "angle": from_exif["angle"],
+                "mirrored": from_exif["mirrored"],
+                "source": "exif",
+                "confidence": 1.0,
+                "error": None,
+            }
+        angle, confidence = orientation_from_pixels(*_load_thumbnail(image_path))
+        return {
+            "path": image_path,
+            "angle": angle,
+            "mirrored": False,
+            "source": "heuristic",
+            "confidence": confidence,
+            "error": None,
+        }
+    except Exception as e:
+        return {
+            "path": image_path,
+            "angle": 0,
+            "mirrored": False,
+            "source": None,
+            "confidence": 0.0,
+            "error": str(e),
+        }
+
+
+def upright_angle(image_path, min_confidence=DEFAULT_MIN_CONFIDENCE):
+    """Rotation needed once the EXIF orientation has been applied
+
+    EXIF-tagged images already display upright (decode them with
+    ImageOps.exif_transpose), so only confident heuristic results ask for
+    a rotation.
+    """
+    result = detect_orientation(image_path)
+    if result["source"] != "heuristic" or result["confidence"] < min_confidence:
+        return 0
+    return result["angle"]
+
+
+def list_images(directory):
+    """Image files directly inside a directory, sorted by name"""
+    return [
+        os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+
+
+def detect_directory(directory, jobs=None):
+    """Detect the orientation of every image in a directory using a process pool"""
+    paths = list_images(directory)
+    if jobs is not None and jobs <= 1:
+        return [detect_orientation(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(detect_orientation, paths, chunksize=4))
+
+
+def corrections(results, min_confidence=DEFAULT_MIN_CONFIDENCE):
+    """Heuristic results that need a rotation and are confident enough to apply
+
+    Images oriented through EXIF already display upright in browsers and are
+    straightened with ImageOps.exif_transpose by the pipeline, so rotating
+    them again here would turn them twice.
+    """
+    return [
+        result for result in results
+        if result["error"] is None and result["source"] == "heuristic"
+        and result["angle"] != 0 and result["confidence"] >= min_confidence
+    ]
+
+
+def labelled_rotations(pattern=LABELLED_SPECS):
+    """Hand-labelled (path, rotation) pairs from the pipeline specs"""
+    labels = []
+    for spec_file in sorted(glob.glob(pattern)):
+        with open(spec_file, 'r', encoding='utf-8') as f:
+            spec = json.load(f)
+        input_dir = spec.get("input_dir", ASSETS_DIR)
+        labels.extend(
+            (os.path.join(input_dir, item["file"]), item["rotation"])
+            for item in spec.get("items", []) if "rotation" in item
+        )
+    return labels
+
+
+def check_labels(labels, jobs=None):
+    """Detect the orientation of labelled images, recording the expected angle on each result"""
+    paths = [path for path, _ in labels]
+    if (jobs is not None and jobs <= 1) or len(paths) <= 1:
+        results = [detect_orientation(path) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(detect_orientation, paths, chunksize=4))
+    for result, (_, expected) in zip(results, labels):
+        result["expected"] = expected
+    return results
+
+
+def safe_threshold(checked):
+    """Lowest confidence at which corrections() proposes no rotation that contradicts a label"""
+    wrong = [
+        result["confidence"] for result in corrections(checked, 0.0)
+        if result["angle"] != result["expected"]
+    ]
+    return round(max(wrong) + 0.001, 3) if wrong else 0.0
+
+
+def report_check(jobs=None, min_confidence=DEFAULT_MIN_CONFIDENCE):
+    """Print how the detector compares with the labelled rotations"""
+    checked = check_labels(labelled_rotations(), jobs)
+    for result in checked:
+        name = os.path.basename(result["path"])
+        if result["error"]:
+            print(f"✗ Error checking {name}: {result['error']}")
+        elif result["angle"] != result["expected"]:
+            print(f"⚠️ {name}: labelled {result['expected']}°, detected {result['angle']}° "
+                  f"({result['source']}, confidence {result['confidence']})")
+
+    agree = sum(1 for result in checked if result["angle"] == result["expected"])
+    rotations = [result for result in checked if result["expected"] != 0]
+    found = [result for result in corrections(checked, min_confidence) if result["angle"] == result["expected"]]
+    print(f"\n📊 {agree}/{len(checked)} labelled images agree; "
+          f"{len(found)}/{len(rotations)} labelled rotations found with confidence >= {min_confidence}")
+    print(f"📊 No correction contradicts a label with confidence >= {safe_threshold(checked)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect and fix the orientation of wrapper photos")
+    parser.add_argument("directory", nargs="?", help="directory of images to check")
+    parser.add_argument("--apply", action="store_true", help="rotate detected images in place")
+    parser.add_argument("--check", action="store_true",
+                        help="compare the detector with the rotations labelled in scripts/pipelines/batch_*.json")
+    parser.add_argument("--min-confidence", type=float, default=DEFAULT_MIN_CONFIDENCE,
+                        help=f"minimum confidence needed to rotate an image (default: {DEFAULT_MIN_CONFIDENCE})")
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    if args.check:
+        report_check(args.jobs, args.min_confidence)
+        return
+    if args.directory is None:
+        parser.error("a directory is required unless --check is given")
+
+    results = detect_directory(args.directory, args.jobs)
+    for result in results:
+        name = os.path.basename(result["path"])
+        if result["error"]:
+            print(f"✗ Error checking {name}: {result['error']}")
+        elif result["angle"] == 0:
+            print(f"✓ Upright: {name} ({result['source']}, confidence {result['confidence']})")
+        else:
+            print(f"↻ Needs {result['angle']}°: {name} ({result['source']}, confidence {result['confidence']})")
+
+    report_file = os.path.join(args.directory, "orientation_report.json")
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\n📋 Report saved to: {report_file}")
+
+    to_fix = corrections(results, args.min_confidence)
+    print(f"📊 {len(to_fix)}/{len(results)} images need rotation with confidence >= {args.min_confidence}")
+
+    if args.apply and to_fix:
+        tasks = [make_task(result["path"], result["path"], result["angle"]) for result in to_fix]
+        for result in rotate_batch(tasks, args.jobs):
+            name = os.path.basename(result["input_path"])
+            if result["success"]:
+                print(f"✓ Rotated {name} by {result['degrees']}°")
+            else:
+                print(f"✗ Error rotating {name}: {result['error']}")
+
+
+if __name__ == "__main__":
+    main()
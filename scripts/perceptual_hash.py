@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Perceptual-hash near-duplicate detection for wrapper photos.
+
+asset_store.py only catches byte-identical copies. The same wrapper is
+also uploaded re-encoded (.JPG next to its _rotated.png, the
+*-removebg-preview cut-outs, IMG_7043 four times), and the batch scripts
+kept adding such copies to wrapperPhotosUrls. This module hashes every
+asset with a 64-bit pHash (DCT of a 32x32 thumbnail) and dHash (gradient
+sign of a 9x8 thumbnail), computed for the whole corpus at once with
+NumPy. Each image is hashed at all four quarter turns so a rotated copy
+still matches, under a stricter radius: a quarter turn is a second try at
+matching, and at 6 bits it already merges different wrappers ("Cajeta
+angry birds Go" and "Vive el futbol con huevos 2010 frontal chocolate").
+
+Near duplicates are found with a multi-index hash join: a 64-bit hash is
+split into chunks, and by the pigeonhole principle two hashes within the
+radius nearly agree (up to radius // chunks bits) on at least one chunk.
+Candidate pairs come from bucket tables of chunk keys, so the whole join
+is vectorized and never compares every pair.
+
+Hashes are cached in attached_assets/perceptual_hashes.json by path,
+size and mtime; clusters are written to attached_assets/near_duplicates.json.
+
+Usage:
+    python scripts/perceptual_hash.py [--radius 6] [--rotated-radius 4] [--hash phash|dhash] [--jobs N]
+    python scripts/perceptual_hash.py --benchmark 50000   # synthetic hashes, timing only
+"""
+
+import argparse
+import json
+import os
+import time
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from asset_store import ASSETS_DIR, list_assets
+from rotation_engine import add_jobs_argument
+from storage_ts import asset_file
+
+HASH_FILE = os.path.join(ASSETS_DIR, "perceptual_hashes.json")
+CLUSTERS_FILE = os.path.join(ASSETS_DIR, "near_duplicates.json")
+HASH_KINDS = ("phash", "dhash")
+THUMBNAIL_SIZE = 32
+HASH_BITS = 64
+# Bits that may differ between two encodings of the same photo
+DEFAULT_RADIUS = 6
+# ... and between a photo and a rotated copy, compared at every quarter turn
+ROTATED_RADIUS = 4
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def _gray_thumbnail(path):
+    """32x32 grayscale thumbnail with transparency composited onto white"""
+    try:
+        with Image.open(path) as img:
+            img.draft('RGB', (THUMBNAIL_SIZE * 4, THUMBNAIL_SIZE * 4))
+            img = img.convert('RGBA')
+            background = Image.new('RGBA', img.size, (255, 255, 255, 255))
+            gray = Image.alpha_composite(background, img).convert('L')
+            return np.asarray(gray.resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _dct_matrix(size):
+    """Orthonormal DCT-II matrix"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+def _box_matrix(out_size, in_size):
+    """Area-averaging resampling matrix from in_size to out_size samples"""
+    edges = np.linspace(0, in_size, out_size + 1)
+    positions = np.arange(in_size)
+    overlap = np.clip(np.minimum(edges[1:, None], positions + 1) - np.maximum(edges[:-1, None], positions), 0, None)
+    return overlap / overlap.sum(axis=1, keepdims=True)
+
+
+def _pack_bits(bits):
+    """(N, 64) booleans -> N uint64 hashes, first bit most significant"""
+    return np.packbits(bits.reshape(len(bits), HASH_BITS), axis=1).view('>u8').ravel().astype(np.uint64)
+
+
+def phash_arrays(grays):
+    """pHash of a stack of 32x32 thumbnails: sign of the low 8x8 DCT terms against their median"""
+    dct = _dct_matrix(THUMBNAIL_SIZE)
+    coefficients = np.einsum('ij,njk,lk->nil', dct, grays.astype(np.float64), dct)[:, :8, :8]
+    low = coefficients.reshape(len(grays), HASH_BITS)
+    # The DC term only measures brightness, so it is left out of the median
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    return _pack_bits(low > median)
+
+
+def dhash_arrays(grays):
+    """dHash of a stack of 32x32 thumbnails: horizontal gradient signs on a 9x8 grid"""
+    small = np.einsum('ij,njk,lk->nil', _box_matrix(8, THUMBNAIL_SIZE), grays.astype(np.float64),
+                      _box_matrix(9, THUMBNAIL_SIZE))
+    return _pack_bits(small[:, :, 1:] > small[:, :, :-1])
+
+
+def hash_thumbnails(grays):
+    """{kind: (N, 4) uint64} hashes of each thumbnail at 0, 90, 180 and 270 degrees"""
+    grays = np.asarray(grays)
+    turns = [np.rot90(grays, k, axes=(1, 2)) for k in range(4)]
+    return {
+        "phash": np.stack([phash_arrays(turn) for turn in turns], axis=1),
+        "dhash": np.stack([dhash_arrays(turn) for turn in turns], axis=1),
+    }
+
+
+def popcount(values):
+    """Set bits of every uint64 in an array"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values).astype(np.int64)
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def _chunk_plan(radius, count):
+    """Pick the chunking for a multi-index join: [(low bit, width, flip masks)]
+
+    Splitting the hash into m chunks, two hashes within `radius` differ by
+    at most radius // m bits in at least one chunk, so probing each chunk
+    key with every flip pattern of that many bits finds every match. Few
+    wide chunks mean many probes but small buckets; the plan with the
+    lowest estimated probes + candidates wins. Chunks are at most 16 bits
+    wide so their buckets fit a direct lookup table.
+    """
+    best = None
+    # Small radii still need the minimum of four chunks (exact keys)
+    for chunks in range(HASH_BITS // 16, max(radius + 2, HASH_BITS // 16 + 1)):
+        bounds = np.linspace(0, HASH_BITS, chunks + 1).astype(int)
+        flips = radius // chunks
+        plan = []
+        cost = 0.0
+        for low, high in zip(bounds[:-1], bounds[1:]):
+            width = int(high - low)
+            masks = [0] + [
+                sum(1 << bit for bit in bits)
+                for flipped in range(1, flips + 1)
+                for bits in combinations(range(width), flipped)
+            ]
+            plan.append((int(low), width, masks))
+            cost += len(masks) * (1 + count / 2 ** width)
+        if best is None or cost < best[0]:
+            best = (cost, plan)
+    return best[1]
+
+
+def hamming_join(queries, hashes, radius):
+    """Every (query index, hash index, distance) pair within radius
+
+    Multi-index join: chunks of the hash act as exact lookup keys (probed
+    with a few bit flips, see _chunk_plan). That yields a superset of the
+    matches, which is filtered on the full Hamming distance.
+    """
+    queries = np.asarray(queries, dtype=np.uint64)
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    candidates = []
+    for low, width, masks in _chunk_plan(radius, len(hashes)):
+        mask = np.uint64((1 << width) - 1)
+        keys = ((hashes >> np.uint64(low)) & mask).astype(np.int64)
+        order = np.argsort(keys, kind='stable')
+        bucket_sizes = np.bincount(keys, minlength=1 << width)
+        bucket_starts = np.cumsum(bucket_sizes) - bucket_sizes
+        query_keys = ((queries >> np.uint64(low)) & mask).astype(np.int64)
+        for flip in masks:
+            probes = query_keys ^ flip
+            starts, counts = bucket_starts[probes], bucket_sizes[probes]
+            total = int(counts.sum())
+            if not total:
+                continue
+            query_index = np.repeat(np.arange(len(queries)), counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            hash_index = order[np.repeat(starts, counts) + offsets]
+            # Filtering before deduplicating keeps the sort down to real matches
+            keep = popcount(queries[query_index] ^ hashes[hash_index]) <= radius
+            candidates.append(query_index[keep] * len(hashes) + hash_index[keep])
+
+    pairs = np.unique(np.concatenate(candidates)) if candidates else np.empty(0, dtype=np.int64)
+    query_index, hash_index = np.divmod(pairs, len(hashes)) if len(hashes) else (pairs, pairs)
+    return query_index, hash_index, popcount(queries[query_index] ^ hashes[hash_index])
+
+
+def near_duplicate_pairs(hashes, radius=DEFAULT_RADIUS, rotated_radius=ROTATED_RADIUS):
+    """(i, j, distance) with i < j for images within radius, or rotated_radius at another quarter turn
+
+    hashes is (N, 4): every rotation of every image is looked up against
+    the unrotated hashes, and each pair keeps its smallest distance.
+    """
+    count = len(hashes)
+    queries = np.asarray(hashes, dtype=np.uint64).T.ravel()
+    query_index, hash_index, distances = hamming_join(queries, hashes[:, 0], radius)
+    first = query_index % count
+    keep = (first != hash_index) & ((query_index < count) | (distances <= min(radius, rotated_radius)))
+    first, second, distances = first[keep], hash_index[keep], distances[keep]
+    low, high = np.minimum(first, second), np.maximum(first, second)
+    order = np.lexsort((distances, high, low))
+    low, high, distances = low[order], high[order], distances[order]
+    unique = np.ones(len(low), dtype=bool)
+    unique[1:] = (low[1:] != low[:-1]) | (high[1:] != high[:-1])
+    return low[unique], high[unique], distances[unique]
+
+
+def cluster_pairs(count, first, second):
+    """Connected components (lists of indexes, size >= 2) of the near-duplicate graph"""
+    parent = list(range(count))
+
+    def root(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    for a, b in zip(first.tolist(), second.tolist()):
+        ra, rb = root(a), root(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    groups = {}
+    for index in sorted({index for pair in zip(first.tolist(), second.tolist()) for index in pair}):
+        groups.setdefault(root(index), []).append(index)
+    return list(groups.values())
+
+
+def _stat_entry(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class HashCache:
+    """Perceptual hashes per file, recomputed only when its size or mtime changes"""
+
+    def __init__(self, cache_file=HASH_FILE, files=None):
+        self.cache_file = cache_file
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, cache_file=HASH_FILE):
+        if os.path.exists(cache_file):
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                return cls(cache_file, json.load(f)["files"])
+        return cls(cache_file)
+
+    def save(self):
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump({"files": self.files}, f, indent=1, ensure_ascii=False)
+
+    def hashes(self, paths, jobs=None):
+        """{path: {kind: [4 hex hashes]}} for every readable path"""
+        stats = {path: _stat_entry(path) for path in paths if os.path.exists(path)}
+        stale = [
+            path for path, stat in stats.items()
+            if {key: self.files.get(path, {}).get(key) for key in stat} != stat
+        ]
+        if stale:
+            if (jobs is not None and jobs <= 1) or len(stale) <= 1:
+                thumbnails = list(map(_gray_thumbnail, stale))
+            else:
+                with ProcessPoolExecutor(max_workers=jobs) as executor:
+                    thumbnails = list(executor.map(_gray_thumbnail, stale, chunksize=8))
+            decoded = [(path, gray) for path, (gray, error) in zip(stale, thumbnails) if error is None]
+            if decoded:
+                computed = hash_thumbnails([gray for _, gray in decoded])
+                for index, (path, _) in enumerate(decoded):
+                    self.files[path] = dict(stats[path], **{
+                        kind: [f"{int(value):016x}" for value in computed[kind][index]] for kind in HASH_KINDS
+                    })
+        return {path: self.files[path] for path in stats if path in self.files}
+
+
+def hash_matrix(entries, kind="phash"):
+    """(N, 4) uint64 array from cache entries"""
+    return np.array([[int(value, 16) for value in entry[kind]] for entry in entries], dtype=np.uint64).reshape(-1, 4)
+
+
+def url_to_path(url):
+    return url.lstrip('/')
+
+
+class NearDuplicateGuard:
+    """Rejects photos that look like one a promotion already has"""
+
+    def __init__(self, radius=DEFAULT_RADIUS, kind="phash", cache=None, jobs=None, rotated_radius=ROTATED_RADIUS):
+        self.radius = radius
+        self.rotated_radius = rotated_radius
+        self.kind = kind
+        self.cache = cache if cache is not None else HashCache.load()
+        self.jobs = jobs
+
+    def filter(self, existing_urls, new_urls):
+        """Split new_urls into (accepted, rejected)
+
+        URLs may be site URLs (/attached_assets/...) or file paths;
+        rejected holds (url, duplicate_of, distance). New photos are also
+        compared with each other, so the first of two copies is kept.
+        URLs already present are accepted (appending skips them anyway),
+        as are files that cannot be read. Rotated copies only count within
+        the stricter min(radius, rotated_radius), like find_clusters.
+        """
+        known = self.cache.hashes([url_to_path(url) for url in list(existing_urls) + list(new_urls)], self.jobs)
+        kept = [url for url in existing_urls if url_to_path(url) in known]
+        existing = set(existing_urls)
+        accepted, rejected = [], []
+        for url in new_urls:
+            entry = known.get(url_to_path(url))
+            if url in existing or entry is None or not kept:
+                accepted.append(url)
+                if entry is not None and url not in existing:
+                    kept.append(url)
+                continue
+            hashes = hash_matrix([known[url_to_path(other)] for other in kept], self.kind)[:, 0]
+            turn, match, distances = hamming_join(hash_matrix([entry], self.kind)[0], hashes, self.radius)
+            close = (turn == 0) | (distances <= min(self.radius, self.rotated_radius))
+            match, distances = match[close], distances[close]
+            if len(match):
+                best = int(np.argmin(distances))
+                rejected.append((url, kept[match[best]], int(distances[best])))
+            else:
+                accepted.append(url)
+                kept.append(url)
+        return accepted, rejected
+
+    def append_photos(self, storage, block, sources, import_paths=None, key='wrapperPhotosUrls', indent=''):
+        """StorageFile.append_items for photo elements, minus near duplicates
+
+        Elements may be string URLs or @assets import identifiers
+        (resolved through import_paths); ones that do not resolve to a
+        local file are passed through unchecked.
+        """
+        if import_paths is None:
+            import_paths = storage.import_paths()
+        files = {source: asset_file(source, import_paths) for source in storage.array_items(block, key) + list(sources)}
+        existing = [files[source] for source in storage.array_items(block, key) if files[source]]
+        accepted, rejected = self.filter(existing, [files[source] for source in sources if files[source]])
+        rejected_files = {path for path, _, _ in rejected}
+        self.report(rejected, indent)
+        return storage.append_items(block, key, [source for source in sources if files[source] not in rejected_files])
+
+    @staticmethod
+    def report(rejected, indent=''):
+        for url, duplicate_of, distance in rejected:
+            print(f"{indent}⚠️  Skipping {url}: near-duplicate of {duplicate_of} (distance {distance})")
+
+    def save(self):
+        self.cache.save()
+
+
+def find_clusters(paths, radius=DEFAULT_RADIUS, kind="phash", jobs=None, cache=None, rotated_radius=ROTATED_RADIUS):
+    """Near-duplicate clusters among image files, as lists of (path, distance to the first)"""
+    cache = cache if cache is not None else HashCache.load()
+    known = cache.hashes(paths, jobs)
+    names = [path for path in paths if path in known]
+    hashes = hash_matrix([known[path] for path in names], kind)
+    first, second, _ = near_duplicate_pairs(hashes, radius, rotated_radius)
+    clusters = []
+    for members in cluster_pairs(len(names), first, second):
+        head = hashes[members[0]][0]
+        distances = popcount(hashes[members] ^ head).reshape(-1, 4).min(axis=1)
+        clusters.append([(names[index], int(distance)) for index, distance in zip(members, distances)])
+    return clusters
+
+
+def synthetic_hashes(count, family_size=4, noise_bits=3, seed=0):
+    """Random hash families (each a photo plus re-encoded copies) for benchmarks"""
+    rng = np.random.default_rng(seed)
+    families = rng.integers(0, 2 ** 63, size=(count + family_size - 1) // family_size, dtype=np.uint64) * np.uint64(2) + \
+        rng.integers(0, 2, size=(count + family_size - 1) // family_size, dtype=np.uint64)
+    hashes = np.repeat(families, family_size)[:count]
+    flips = rng.integers(0, HASH_BITS, size=(count, noise_bits))
+    noise = np.zeros(count, dtype=np.uint64)
+    for column in flips.T:
+        noise ^= np.left_shift(np.uint64(1), column.astype(np.uint64))
+    hashes ^= noise
+    # Only the unrotated hash is exercised; rotations are independent random hashes
+    rotations = rng.integers(0, 2 ** 63, size=(count, 3), dtype=np.uint64)
+    return np.column_stack([hashes, rotations])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate wrapper photos with perceptual hashes")
+    parser.add_argument("--radius", type=int, default=DEFAULT_RADIUS,
+                        help=f"maximum Hamming distance between near duplicates (default: {DEFAULT_RADIUS})")
+    parser.add_argument("--rotated-radius", type=int, default=ROTATED_RADIUS,
+                        help=f"maximum distance when the match is at another quarter turn (default: {ROTATED_RADIUS})")
+    parser.add_argument("--hash", dest="kind", choices=HASH_KINDS, default="phash", help="hash to compare (default: phash)")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="time clustering N synthetic hashes and exit")
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        hashes = synthetic_hashes(args.benchmark)
+        start = time.perf_counter()
+        first, second, _ = near_duplicate_pairs(hashes, args.radius, args.rotated_radius)
+        clusters = cluster_pairs(len(hashes), first, second)
+        print(f"📊 {args.benchmark} hashes: {len(first)} pairs in {len(clusters)} clusters "
+              f"in {time.perf_counter() - start:.3f}s")
+        return
+
+    paths = [
+        os.path.join(ASSETS_DIR, name) for name in list_assets()
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+    print(f"Hashing {len(paths)} images...")
+    cache = HashCache.load()
+    clusters = find_clusters(paths, args.radius, args.kind, args.jobs, cache, args.rotated_radius)
+    cache.save()
+
+    for cluster in clusters:
+        print(f"\n{len(cluster)} near duplicates:")
+        for path, distance in cluster:
+            print(f"  {distance:2d}  {path}")
+    with open(CLUSTERS_FILE, 'w', encoding='utf-8') as f:
+        json.dump({"radius": args.radius, "rotated_radius": args.rotated_radius, "hash": args.kind, "clusters": [
+            [{"path": path, "distance": distance} for path, distance in cluster] for cluster in clusters
+        ]}, f, indent=2, ensure_ascii=False)
+    print(f"\n📋 {len(clusters)} clusters ({sum(map(len, clusters))} images) saved to: {CLUSTERS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
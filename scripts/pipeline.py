@@ -0,0 +1,711 @@
+#!/usr/bin/env python3
+"""
+Resumable wrapper pipeline driven by a declarative batch spec.
+
+Every batch used to need a pair of scripts: process_batch_N_wrappers.py
+rotated the photos and wrote a JSON of updates, then
+apply_batch_N_updates.py patched storage.ts from it. A batch is now a JSON
+spec in scripts/pipelines/ and this runner executes its stages as a DAG:
+
+    discover -> dedup -> orient -> rotate -> bg_remove -> trim -> optimize -> derive -> placeholder -> patch -> atlas
+
+Each completed (item, stage) pair is appended to a checkpoint journal in
+attached_assets/.pipeline/<name>.ndjson with a fingerprint of its inputs
+(the stage options, the item spec and the outputs of the stages it reads).
+A re-run, or a run resumed after an interruption, skips every stage whose
+fingerprint still matches and whose output files exist, so only new,
+changed or failed items are processed again.
+
+Spec:
+
+    {
+      "name": "batch_2",
+      "stages": ["discover", "dedup", "orient", "rotate", "derive", "patch"],
+      "items": [
+        {"file": "x_1755219298610.png", "promotion": "El Chavo Mini 2015", "flavor": "vainilla", "rotation": 0}
+      ],
+      "rotate": {"mode": "RGBA"},
+      "patch": {"match": "name", "new_promotions": {"El Chavo Sorpresa": {...}}}
+    }
+
+Items without a "rotation" fail the orient stage with the angle that
+orientation.upright_angle proposes; the detector disagrees with the
+labelled specs (see orientation.py --check), so a detected angle is only
+used with --accept-detected.
+Instead of "items", a spec can give a "glob" (relative to input_dir) and a
+"promotion" and "rotation" shared by every match. An item can override the rotate
+options with its own "rotate" object.
+
+Usage:
+    python scripts/pipeline.py scripts/pipelines/batch_2.json [--jobs N] [--force] [--accept-detected]
+    python scripts/pipeline.py scripts/pipelines/batch_2.json --status
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from graphlib import TopologicalSorter
+from alpha_trim import DEFAULT_PADDING, DEFAULT_THRESHOLD as TRIM_THRESHOLD, record_trims, trim_files, trimmed_path
+from asset_store import ASSETS_DIR, hash_file, update_index
+from background_removal import DEFAULT_FEATHER, DEFAULT_THRESHOLD, remove_background_file
+from derivatives import DEFAULT_FORMATS, DEFAULT_WIDTHS, update_manifest
+from instrumentation import add_profile_arguments, profiled, tracer
+from orientation import DEFAULT_MIN_CONFIDENCE, upright_angle
+from perceptual_hash import NearDuplicateGuard
+from placeholders import attach_placeholders, update_placeholders
+from png_optimizer import optimize_pngs
+from removebg_client import RemoveBgClient
+from rotation_cache import RotationCache
+from rotation_engine import add_jobs_argument, default_jobs, make_task, rotate_batch
+from seed_data import SeedDataset
+from sprite_atlas import ATLAS_KINDS, ATLAS_WIDTH, update_atlases
+from storage_ts import StorageFile, promotion_definition, promotion_variable, ts_string
+from wrapper_catalog import WrapperCatalog
+
+PIPELINES_DIR = "scripts/pipelines"
+STATE_DIR = os.path.join(ASSETS_DIR, ".pipeline")
+ROTATED_DIR = os.path.join(ASSETS_DIR, "rotated")
+PROCESSED_DIR = os.path.join(ASSETS_DIR, "processed")
+
+# Checkpoint id used by stages that run once for the whole batch
+BATCH_ITEM = "*"
+
+# requires: stages whose outputs the stage reads (they must be enabled)
+# after: stages that run first when enabled, and whose outputs it then reads
+# scope: "item" stages checkpoint per item, "batch" stages once per run
+# Discovery is never checkpointed: it re-stats every file so that changed
+# sources invalidate the checkpoints downstream. Neither is atlas, which
+# covers every promotion rather than the batch and is incremental itself.
+STAGES = {
+    "discover": {"requires": (), "after": (), "scope": "item", "checkpoint": False},
+    "dedup": {"requires": ("discover",), "after": (), "scope": "item"},
+    "orient": {"requires": ("discover",), "after": ("dedup",), "scope": "item"},
+    "rotate": {"requires": ("discover", "orient"), "after": ("dedup",), "scope": "item"},
+    "bg_remove": {"requires": ("rotate",), "after": (), "scope": "item"},
+    "trim": {"requires": ("bg_remove",), "after": (), "scope": "item"},
+    "optimize": {"requires": ("rotate",), "after": ("bg_remove", "trim"), "scope": "item"},
+    "derive": {"requires": ("rotate",), "after": ("bg_remove", "trim", "optimize"), "scope": "item"},
+    "placeholder": {"requires": ("rotate",), "after": ("bg_remove", "trim", "optimize", "derive"), "scope": "item"},
+    "patch": {"requires": ("rotate",), "after": ("bg_remove", "trim", "derive", "placeholder"), "scope": "batch"},
+    "atlas": {"requires": (), "after": ("derive", "patch"), "scope": "batch", "checkpoint": False},
+}
+DEFAULT_STAGES = ("discover", "dedup", "orient", "rotate", "optimize", "derive", "placeholder", "patch", "atlas")
+BG_ENGINES = ("local", "api")
+
+
+def stage_order(names):
+    """Topologically sorted stages, checking that every required stage is enabled"""
+    enabled = set(names)
+    graph = {}
+    for name in names:
+        if name not in STAGES:
+            raise ValueError(f"Unknown stage {name!r} (expected one of {', '.join(STAGES)})")
+        missing = [stage for stage in STAGES[name]["requires"] if stage not in enabled]
+        if missing:
+            raise ValueError(f"Stage {name!r} requires {', '.join(missing)}")
+        graph[name] = [stage for stage in STAGES[name]["requires"] + STAGES[name]["after"] if stage in enabled]
+    return list(TopologicalSorter(graph).static_order())
+
+
+def load_spec(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    spec.setdefault("name", os.path.splitext(os.path.basename(path))[0])
+    return spec
+
+
+def asset_url(path):
+    """Site URL of a file under attached_assets, as storage.ts stores it"""
+    return '/' + path.replace(os.sep, '/')
+
+
+def fingerprint(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _files_exist(output):
+    return all(os.path.exists(path) for path in output.get("files", ()))
+
+
+class CheckpointJournal:
+    """Append-only log of completed (item, stage) pairs; the last entry for a pair wins"""
+
+    def __init__(self, path, entries=None):
+        self.path = path
+        self.entries = entries or {}
+        self._file = None
+
+    @classmethod
+    def load(cls, path):
+        entries = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by an interrupted run
+                        continue
+                    entries[(entry["item"], entry["stage"])] = entry
+        return cls(path, entries)
+
+    def get(self, item_id, stage):
+        return self.entries.get((item_id, stage))
+
+    def open(self):
+        """Compact the journal to its latest entries, then keep it open for appends"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(temp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def record(self, item_id, stage, key, output):
+        entry = {"item": item_id, "stage": stage, "fingerprint": key, "output": output}
+        self.entries[(item_id, stage)] = entry
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        # Flushed per entry so an interruption loses at most the item in flight
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Pipeline:
+    """One batch spec with its items, stage outputs and checkpoint journal"""
+
+    def __init__(self, spec, jobs=None, force=False, state_dir=STATE_DIR, accept_detected=False):
+        self.spec = spec
+        self.name = spec["name"]
+        self.jobs = jobs or default_jobs()
+        self.force = force
+        self.accept_detected = accept_detected
+        self.input_dir = spec.get("input_dir", ASSETS_DIR)
+        self.stages = stage_order(spec.get("stages", DEFAULT_STAGES))
+        self.journal = CheckpointJournal.load(os.path.join(state_dir, f"{self.name}.ndjson"))
+        self.items = [
+            {"id": item["file"], "spec": item, "outputs": {}, "skipped": None}
+            for item in self.item_specs()
+        ]
+        # Batch stages that failed in this run: {stage: error}
+        self.errors = {}
+
+    def item_specs(self):
+        if "items" in self.spec:
+            return self.spec["items"]
+        files = sorted(glob.glob(os.path.join(self.input_dir, self.spec["glob"])))
+        shared = {key: self.spec[key] for key in ("promotion", "rotation") if key in self.spec}
+        return [{"file": os.path.relpath(path, self.input_dir), "promotion": None, **shared} for path in files]
+
+    def options(self, stage):
+        return self.spec.get(stage, {})
+
+    def active_items(self):
+        return [item for item in self.items if item["skipped"] is None]
+
+    def image_output(self, item):
+        """The latest image produced for an item (trimmed, else background removed, else rotated)"""
+        for stage in ("trim", "bg_remove", "rotate"):
+            if stage in item["outputs"]:
+                return item["outputs"][stage]
+        return None
+
+    def _inputs(self, stage, item):
+        definition = STAGES[stage]
+        return {
+            name: item["outputs"][name]
+            for name in definition["requires"] + definition["after"]
+            if name in self.stages and name in item["outputs"]
+        }
+
+    def item_key(self, stage, item):
+        data = {"options": self.options(stage), "item": item["spec"], "inputs": self._inputs(stage, item)}
+        if stage == "orient" and item["spec"].get("rotation") is None:
+            # A detected angle is only an output once it has been accepted
+            data["accept_detected"] = self.accept_detected
+        return fingerprint(data)
+
+    def batch_key(self, stage):
+        return fingerprint({
+            "options": self.options(stage),
+            "items": [[item["spec"], self._inputs(stage, item)] for item in self.active_items()],
+        })
+
+    # Execution
+
+    def run(self):
+        self.journal.open()
+        try:
+            for stage in self.stages:
+                with tracer.span(stage, "stage", items=len(self.active_items())):
+                    if STAGES[stage]["scope"] == "batch":
+                        self._run_batch_stage(stage)
+                    else:
+                        self._run_item_stage(stage)
+        finally:
+            self.journal.close()
+        return self.summary()
+
+    def _checkpoint(self, stage, item_id, key):
+        entry = None if self.force else self.journal.get(item_id, stage)
+        if entry is not None and entry["fingerprint"] == key and _files_exist(entry["output"]):
+            return entry["output"]
+        return None
+
+    def _run_item_stage(self, stage):
+        checkpoint = STAGES[stage].get("checkpoint", True)
+        pending = []
+        resumed = 0
+        for item in self.active_items():
+            key = self.item_key(stage, item)
+            output = self._checkpoint(stage, item["id"], key) if checkpoint else None
+            if output is None:
+                pending.append((item, key))
+            else:
+                item["outputs"][stage] = output
+                resumed += 1
+
+        print(f"\n▶ {stage}: {len(pending)} to run, {resumed} resumed from checkpoints")
+        runner = STAGE_RUNNERS[stage]
+        for (item, key), (output, error) in zip(pending, runner(self, [item for item, _ in pending])):
+            if error is not None:
+                item["skipped"] = f"{stage} failed: {error}"
+                print(f"  ✗ {item['id']}: {error}")
+                continue
+            item["outputs"][stage] = output
+            if checkpoint:
+                self.journal.record(item["id"], stage, key, output)
+
+        finish = STAGE_FINISHERS.get(stage)
+        if finish:
+            finish(self)
+
+    def _run_batch_stage(self, stage):
+        checkpoint = STAGES[stage].get("checkpoint", True)
+        key = self.batch_key(stage)
+        output = self._checkpoint(stage, BATCH_ITEM, key) if checkpoint else None
+        if output is not None:
+            print(f"\n▶ {stage}: ↺ up to date")
+            return
+        print(f"\n▶ {stage}: {len(self.active_items())} items")
+        output, error = STAGE_RUNNERS[stage](self, self.active_items())
+        if error is not None:
+            # Not checkpointed, so the next run tries the stage again
+            self.errors[stage] = error
+            print(f"  ✗ {error}")
+            return
+        if checkpoint:
+            self.journal.record(BATCH_ITEM, stage, key, output)
+
+    def summary(self):
+        skipped = [item for item in self.items if item["skipped"] is not None]
+        return {
+            "name": self.name,
+            "total": len(self.items),
+            "completed": len(self.items) - len(skipped),
+            "skipped": {item["id"]: item["skipped"] for item in skipped},
+            "errors": dict(self.errors),
+        }
+
+    def status(self):
+        """Checkpointed items per stage, without checking fingerprints"""
+        counts = {}
+        for stage in self.stages:
+            if not STAGES[stage].get("checkpoint", True):
+                continue
+            if STAGES[stage]["scope"] == "batch":
+                counts[stage] = 1 if self.journal.get(BATCH_ITEM, stage) else 0
+            else:
+                counts[stage] = sum(1 for item in self.items if self.journal.get(item["id"], stage))
+        return counts
+
+
+# Stage runners: item stages yield (output, error) for each pending item in
+# order; batch stages return a single (output, error).
+
+def run_discover(pipeline, items):
+    for item in items:
+        path = os.path.join(pipeline.input_dir, item["spec"]["file"])
+        if not os.path.exists(path):
+            yield None, "file not found"
+            continue
+        stat = os.stat(path)
+        # Size and mtime make every later fingerprint change when the file does
+        yield {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "files": [path]}, None
+
+
+def _hash(path):
+    try:
+        return hash_file(path)[0], None
+    except OSError as e:
+        return None, str(e)
+
+
+def run_dedup(pipeline, items):
+    paths = [item["outputs"]["discover"]["path"] for item in items]
+    with ThreadPoolExecutor(max_workers=pipeline.jobs) as executor:
+        for sha256, error in executor.map(_hash, paths):
+            yield ({"sha256": sha256} if error is None else None), error
+
+
+def finish_dedup(pipeline):
+    """Skip every later item with the same content as an earlier one"""
+    seen = {}
+    for item in pipeline.active_items():
+        sha256 = item["outputs"]["dedup"]["sha256"]
+        if sha256 in seen:
+            item["skipped"] = f"duplicate of {seen[sha256]}"
+            print(f"  ⚠️  {item['id']} is a duplicate of {seen[sha256]}")
+        else:
+            seen[sha256] = item["id"]
+
+
+def run_orient(pipeline, items):
+    min_confidence = pipeline.options("orient").get("min_confidence", DEFAULT_MIN_CONFIDENCE)
+    detect = [item for item in items if item["spec"].get("rotation") is None]
+    paths = [item["outputs"]["discover"]["path"] for item in detect]
+    if len(paths) > 1 and pipeline.jobs > 1:
+        with ProcessPoolExecutor(max_workers=pipeline.jobs) as executor:
+            angles = list(executor.map(upright_angle, paths, [min_confidence] * len(paths)))
+    else:
+        angles = [upright_angle(path, min_confidence) for path in paths]
+    detected = dict(zip((item["id"] for item in detect), angles))
+
+    for item in items:
+        if item["id"] not in detected:
+            yield {"angle": item["spec"]["rotation"] % 360, "source": "spec"}, None
+        elif pipeline.accept_detected:
+            yield {"angle": detected[item["id"]], "source": "detected"}, None
+        else:
+            yield None, (f"no \"rotation\" in the spec (detection proposes {detected[item['id']]}°); "
+                         f"add it to the item or run with --accept-detected")
+
+
+def run_rotate(pipeline, items):
+    os.makedirs(ROTATED_DIR, exist_ok=True)
+    tasks = []
+    for item in items:
+        options = {**pipeline.options("rotate"), **item["spec"].get("rotate", {})}
+        stem = os.path.splitext(os.path.basename(item["spec"]["file"]))[0]
+        tasks.append(make_task(item["outputs"]["discover"]["path"], os.path.join(ROTATED_DIR, f"{stem}_rotated.png"),
+                               item["outputs"]["orient"]["angle"], 'PNG', mode=options.get("mode"),
+                               flatten=options.get("flatten", False), copy_if_unrotated=True))
+
+    cache = None if pipeline.force else RotationCache.load()
+    for item, result in zip(items, rotate_batch(tasks, pipeline.jobs, cache)):
+        if not result["success"]:
+            yield None, result["error"]
+            continue
+        if result["cached"]:
+            print(f"  ↺ Up to date {item['id']}")
+        elif result["copied"]:
+            print(f"  ✓ Copied {item['id']} (no rotation needed)")
+        else:
+            print(f"  ✓ Rotated {item['id']} by {result['degrees']}°")
+        path = result["output_path"]
+        yield {"path": path, "url": asset_url(path), "files": [path]}, None
+
+
+def _remove_background(args):
+    input_path, output_path, threshold, feather = args
+    try:
+        remove_background_file(input_path, output_path, threshold, feather)
+        return None
+    except Exception as e:
+        return str(e)
+
+
+def run_bg_remove(pipeline, items):
+    options = pipeline.options("bg_remove")
+    engine = options.get("engine", "local")
+    if engine not in BG_ENGINES:
+        raise ValueError(f"Unknown bg_remove engine {engine!r} (expected one of {', '.join(BG_ENGINES)})")
+    os.makedirs(PROCESSED_DIR, exist_ok=True)
+    jobs = []
+    for item in items:
+        stem = os.path.splitext(os.path.basename(item["spec"]["file"]))[0]
+        jobs.append((item["outputs"]["rotate"]["path"], os.path.join(PROCESSED_DIR, f"{stem}_processed.png")))
+
+    if engine == "api":
+        api_key = os.environ.get(options.get("api_key_env", "REMOVE_BG_API_KEY"))
+        if not api_key:
+            raise ValueError("bg_remove engine 'api' needs a remove.bg key in $" +
+                             options.get("api_key_env", "REMOVE_BG_API_KEY"))
+        concurrency = options.get("concurrency", 4)
+        with RemoveBgClient(api_key, concurrency=concurrency, rate=options.get("rate", 1.0),
+                            burst=concurrency) as client:
+            errors = (result["error"] if not result["success"] else None for result in client.process_batch(jobs))
+            yield from _bg_outputs(jobs, errors)
+        return
+
+    work = [
+        (input_path, output_path, options.get("threshold", DEFAULT_THRESHOLD), options.get("feather", DEFAULT_FEATHER))
+        for input_path, output_path in jobs
+    ]
+    if len(work) > 1 and pipeline.jobs > 1:
+        with ProcessPoolExecutor(max_workers=pipeline.jobs) as executor:
+            yield from _bg_outputs(jobs, executor.map(_remove_background, work))
+    else:
+        yield from _bg_outputs(jobs, map(_remove_background, work))
+
+
+def _bg_outputs(jobs, errors):
+    for (_, output_path), error in zip(jobs, errors):
+        if error is not None:
+            yield None, error
+        else:
+            print(f"  ✓ Background removed: {os.path.basename(output_path)}")
+            yield {"path": output_path, "url": asset_url(output_path), "files": [output_path]}, None
+
+
+def run_trim(pipeline, items):
+    """Crop each background-removed image to its alpha bounding box plus padding"""
+    options = pipeline.options("trim")
+    padding = options.get("padding", DEFAULT_PADDING)
+    jobs = []
+    for item in items:
+        input_path = item["outputs"]["bg_remove"]["path"]
+        jobs.append((input_path, trimmed_path(input_path)))
+    results = list(trim_files(jobs, padding, options.get("threshold", TRIM_THRESHOLD), pipeline.jobs))
+    record_trims(results, padding)
+    for result in results:
+        if not result["success"]:
+            yield None, result["error"]
+            continue
+        path = result["output_path"]
+        if result["trimmed"]:
+            left, top, right, bottom = result["box"]
+            print(f"  ✓ Trimmed {os.path.basename(path)} to {right - left}x{bottom - top}")
+        yield {"path": path, "url": asset_url(path), "box": result["box"], "files": [path]}, None
+
+
+def run_optimize(pipeline, items):
+    """Losslessly recompress each item's image in place"""
+    paths = [pipeline.image_output(item)["path"] for item in items]
+    for result in optimize_pngs(paths, pipeline.jobs, force=pipeline.force):
+        if not result["success"]:
+            yield None, result["error"]
+            continue
+        path = result["path"]
+        if result["written"]:
+            saved = result["original_bytes"] - result["optimized_bytes"]
+            print(f"  ✓ Optimized {os.path.basename(path)} (-{saved / 1024:.1f} KB)")
+        yield {"path": path, "bytes": os.path.getsize(path), "files": [path]}, None
+
+
+def run_derive(pipeline, items):
+    options = pipeline.options("derive")
+    urls = [pipeline.image_output(item)["url"] for item in items]
+    for result in update_manifest(urls, options.get("widths", DEFAULT_WIDTHS), options.get("formats", DEFAULT_FORMATS),
+                                  pipeline.jobs, pipeline.force):
+        if not result["success"]:
+            yield None, result["error"]
+            continue
+        yield {
+            "url": result["url"],
+            "variants": len(result["variants"]),
+            "files": [variant["path"] for variant in result["variants"]],
+        }, None
+
+
+def run_placeholder(pipeline, items):
+    """Record a BlurHash and LQIP of each item's image in the wrapper catalog"""
+    urls = [pipeline.image_output(item)["url"] for item in items]
+    with WrapperCatalog.open() as catalog:
+        catalog.hashes, _ = update_index(jobs=pipeline.jobs)
+        for result in update_placeholders(catalog, urls, pipeline.jobs, pipeline.force):
+            if not result["success"]:
+                yield None, result["error"]
+                continue
+            yield {"url": result["url"], "blurhash": result["blurhash"]}, None
+
+
+def run_patch(pipeline, items):
+    """Append each item's image to its promotion's wrapperPhotosUrls"""
+    options = pipeline.options("patch")
+    photos = {}
+    for item in items:
+        promotion = item["spec"].get("promotion")
+        if promotion:
+            photos.setdefault(promotion, []).append(pipeline.image_output(item)["url"])
+
+    target = options.get("target", "auto")
+    if target == "auto":
+        target = "seed" if SeedDataset.exists() else "storage"
+    patch = patch_seed if target == "seed" else patch_storage
+    try:
+        report = patch(photos, options.get("match", "name"), options.get("new_promotions", {}))
+    except (OSError, ValueError) as e:
+        return None, str(e)
+    if report["missing"]:
+        missing = set(report["missing"])
+        for item in items:
+            if item["spec"].get("promotion") in missing:
+                item["skipped"] = f"patch failed: promotion {item['spec']['promotion']!r} not found"
+        return report, f"{len(missing)} promotions not found: {', '.join(sorted(missing))}"
+    return report, None
+
+
+def patch_storage(photos, match, new_promotions):
+    storage = StorageFile.load()
+    guard = NearDuplicateGuard()
+    report = {"target": "storage", "updated": 0, "created": 0, "missing": []}
+    for promotion_key, urls in photos.items():
+        promotion = storage.find(**{match: promotion_key})
+        if promotion is None and promotion_key in new_promotions:
+            accepted, rejected = guard.filter([], urls)
+            guard.report(rejected, '  ')
+            data = dict(new_promotions[promotion_key], wrapper_photos=accepted)
+            brand_set = storage.set_call('brands', data['brand_variable'])
+            if brand_set is None or storage.find(var=promotion_variable(data['slug'])) is not None:
+                print(f"  ⚠️  Cannot create '{promotion_key}' (unknown brand or variable already declared)")
+                report["missing"].append(promotion_key)
+                continue
+            storage.insert_after_line(brand_set['end'], promotion_definition(data['brand_variable'], data))
+            report["created"] += 1
+            print(f"  ✓ Created new promotion: {promotion_key}")
+            continue
+        if promotion is None:
+            print(f"  ⚠️  Promotion '{promotion_key}' not found in storage")
+            report["missing"].append(promotion_key)
+            continue
+        added = guard.append_photos(storage, promotion, [ts_string(url) for url in urls], indent='  ')
+        if added:
+            report["updated"] += 1
+            print(f"  ✓ {promotion.name}: {len(added)} new photos")
+        else:
+            print(f"  ↺ {promotion.name} already has all {len(urls)} photos")
+    storage.save()
+    guard.save()
+    return report
+
+
+def patch_seed(photos, match, new_promotions):
+    dataset = SeedDataset.load()
+    guard = NearDuplicateGuard()
+    report = {"target": "seed", "updated": 0, "created": 0, "missing": []}
+    for promotion_key, urls in photos.items():
+        promotion = dataset.find('promotions', **{match: promotion_key})
+        existing = (promotion.get('wrapperPhotosUrls') or []) if promotion is not None else []
+        urls, rejected = guard.filter(existing, urls)
+        guard.report(rejected, '  ')
+        if promotion is None and promotion_key in new_promotions:
+            data = new_promotions[promotion_key]
+            if dataset.get('brands', data['brand_variable']) is None:
+                print(f"  ⚠️  Cannot create '{promotion_key}': unknown brand {data['brand_variable']!r}")
+                report["missing"].append(promotion_key)
+                continue
+            record = {key: value for key, value in data.items() if key != 'brand_variable'}
+            dataset.upsert('promotions', dict(record, key=promotion_variable(data['slug']),
+                                              brand=data['brand_variable'], wrapperPhotosUrls=list(urls)))
+            report["created"] += 1
+            print(f"  ✓ Created new promotion: {promotion_key}")
+            continue
+        if promotion is None:
+            print(f"  ⚠️  Promotion '{promotion_key}' not found in the seed dataset")
+            report["missing"].append(promotion_key)
+            continue
+        added = dataset.append_unique('promotions', promotion['key'], 'wrapperPhotosUrls', urls)
+        if added:
+            report["updated"] += 1
+            print(f"  ✓ {promotion['name']}: {len(added)} new photos")
+        else:
+            print(f"  ↺ {promotion['name']} already has all {len(urls)} photos")
+    with WrapperCatalog.open() as catalog:
+        attach_placeholders(dataset, catalog)
+    dataset.save()
+    guard.save()
+    return report
+
+
+def run_atlas(pipeline, items):
+    """Rebuild the promotion-card sprite atlases whose thumbnails changed"""
+    options = pipeline.options("atlas")
+    report = {"written": [], "failed": {}}
+    try:
+        for result in update_atlases(options.get("kinds", ATLAS_KINDS), options.get("width", ATLAS_WIDTH),
+                                     pipeline.jobs, pipeline.force):
+            report["failed"].update(result["failed"])
+            if result["written"]:
+                report["written"].append(result["name"])
+                print(f"  ✓ {result['name']}: {result['sprites']} sprites")
+            else:
+                print(f"  ↺ {result['name']} unchanged")
+    except (OSError, ValueError) as e:
+        return None, str(e)
+    return report, None
+
+
+STAGE_RUNNERS = {
+    "discover": run_discover,
+    "dedup": run_dedup,
+    "orient": run_orient,
+    "rotate": run_rotate,
+    "bg_remove": run_bg_remove,
+    "trim": run_trim,
+    "optimize": run_optimize,
+    "derive": run_derive,
+    "placeholder": run_placeholder,
+    "patch": run_patch,
+    "atlas": run_atlas,
+}
+STAGE_FINISHERS = {
+    "dedup": finish_dedup,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a wrapper batch spec as a resumable pipeline")
+    parser.add_argument("spec", help=f"batch spec (JSON), e.g. {PIPELINES_DIR}/batch_2.json")
+    parser.add_argument("--force", action="store_true",
+                        help="ignore checkpoints and the rotation cache and run every stage again")
+    parser.add_argument("--status", action="store_true", help="show checkpointed items per stage and exit")
+    parser.add_argument("--accept-detected", action="store_true",
+                        help="rotate items without a \"rotation\" by the detected angle instead of failing them")
+    add_jobs_argument(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        pipeline = Pipeline(load_spec(args.spec), args.jobs, args.force, accept_detected=args.accept_detected)
+    except (OSError, ValueError, KeyError) as e:
+        parser.error(f"invalid spec {args.spec}: {e}")
+
+    if args.status:
+        print(f"📋 {pipeline.name}: {len(pipeline.items)} items")
+        for stage, count in pipeline.status().items():
+            total = 1 if STAGES[stage]["scope"] == "batch" else len(pipeline.items)
+            print(f"  {stage:<12} {count}/{total} checkpointed")
+        return
+
+    print(f"🔄 Running pipeline '{pipeline.name}': {' -> '.join(pipeline.stages)}")
+    try:
+        with profiled(args, f"pipeline-{pipeline.name}"):
+            summary = pipeline.run()
+    except KeyboardInterrupt:
+        print(f"\n⚠️  Interrupted; finished items are checkpointed in {pipeline.journal.path}. Run again to resume.")
+        sys.exit(130)
+
+    if summary["errors"]:
+        print(f"\n⚠️  Pipeline '{summary['name']}' finished with errors; run again once they are fixed")
+    else:
+        print(f"\n✅ Pipeline '{summary['name']}' complete")
+    print(f"📊 {summary['completed']}/{summary['total']} items through every stage")
+    for item_id, reason in summary["skipped"].items():
+        print(f"  ⚠️  {item_id}: {reason}")
+    for stage, error in summary["errors"].items():
+        print(f"  ✗ {stage}: {error}")
+    if summary["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Low-quality placeholders for wrapper and promotion images.
+
+The promotion page and WrapperCarousel show an empty box until each
+multi-megabyte PNG has downloaded. This script precomputes two tiny
+stand-ins per image that the UI can paint immediately:
+
+    blurhash  a ~30 character BlurHash string (4x3 components, rendered
+              client-side by any BlurHash decoder)
+    lqip      a data: URI of a ~20 px WebP (a few hundred bytes, keeps alpha)
+
+Both come from a reduced-resolution decode: the 96w derivative when
+derivatives.py has rendered a fresh one, otherwise the source decoded at
+a JPEG draft scale and shrunk with Image.reduce before resampling, so no
+full-size resample is ever done.
+
+Results are kept in the wrapper catalog (placeholders table), keyed by
+URL together with the content hash they were computed from, so a re-run
+only decodes new or changed images. When the NDJSON seed dataset exists,
+every promotion record also gets an "imagePlaceholders" object next to
+its image URLs:
+
+    "imagePlaceholders": {
+      "/attached_assets/rotated/x_rotated.png": {"blurhash": "LKO2?U%2Tw=w...", "lqip": "data:image/webp;base64,...",
+                                                 "width": 3024, "height": 4032}
+    }
+
+Usage:
+    python scripts/placeholders.py [urls ...] [--force] [--jobs N]
+"""
+
+import argparse
+import base64
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image, ImageOps
+from asset_store import ASSETS_DIR, update_index
+from derivatives import DEFAULT_WIDTHS, derivative_path, displayed_size, url_to_path
+from rotation_engine import add_jobs_argument
+from seed_data import SeedDataset, load_site_dataset
+from wrapper_catalog import CATALOG_FILE, WrapperCatalog
+
+# Longest side of the image the BlurHash is computed from; it only keeps
+# the lowest frequencies, so more pixels would not change the hash
+BLURHASH_SIZE = 32
+# Components along the longer and the shorter side
+BLURHASH_COMPONENTS = (4, 3)
+LQIP_SIZE = 20
+LQIP_QUALITY = 40
+# Transparent pixels are composited over the site's dark background before hashing
+BACKGROUND = (0, 0, 0)
+
+# Promotion fields holding image URLs, single or lists
+PROMOTION_IMAGE_FIELDS = ("imageUrl", "wrapperPhotoUrl", "wrapperPhotosUrls", "promotionImagesUrls")
+SEED_FIELD = "imagePlaceholders"
+
+BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+# BlurHash
+
+def _base83(value, length):
+    return ''.join(BASE83[(value // 83 ** (length - i)) % 83] for i in range(1, length + 1))
+
+
+def _srgb_to_linear(values):
+    values = values / 255.0
+    return np.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(value):
+    value = min(max(value, 0.0), 1.0)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def blurhash(rgb, components_x, components_y):
+    """BlurHash of an (height, width, 3) uint8 array
+
+    Every component is one cosine basis projected over the whole image;
+    the projections are two matrix products instead of a loop per pixel.
+    """
+    height, width = rgb.shape[:2]
+    linear = _srgb_to_linear(rgb.astype(np.float64))
+    basis_x = np.cos(np.pi * np.outer(np.arange(components_x), np.arange(width)) / width)
+    basis_y = np.cos(np.pi * np.outer(np.arange(components_y), np.arange(height)) / height)
+    # factors[j, i] = sum over pixels of basis_y[j, y] * basis_x[i, x] * linear[y, x]
+    factors = np.einsum('jy,ix,yxc->jic', basis_y, basis_x, linear) / (width * height)
+    factors[1:, :] *= 2
+    factors[0, 1:] *= 2
+
+    dc = factors[0, 0]
+    ac = factors.reshape(-1, 3)[1:]
+    parts = [_base83((components_x - 1) + (components_y - 1) * 9, 1)]
+    if len(ac):
+        quantised_max = int(max(0, min(82, np.floor(np.abs(ac).max() * 166 - 0.5))))
+        maximum = (quantised_max + 1) / 166
+        parts.append(_base83(quantised_max, 1))
+    else:
+        maximum = 1
+        parts.append(_base83(0, 1))
+    parts.append(_base83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4))
+    quantised = np.clip(np.floor(np.sign(ac) * np.sqrt(np.abs(ac) / maximum) * 9 + 9.5), 0, 18).astype(int)
+    for r, g, b in quantised:
+        parts.append(_base83(r * 19 * 19 + g * 19 + b, 2))
+    return ''.join(parts)
+
+
+def components(size):
+    """(x, y) component counts, giving the longer side more of them"""
+    longer, shorter = BLURHASH_COMPONENTS
+    width, height = size
+    return (longer, shorter) if width >= height else (shorter, longer)
+
+
+# Reduced decode
+
+def small_source(path):
+    """The smallest fresh derivative of an image, or the image itself"""
+    mtime = os.path.getmtime(path)
+    for image_format in ("webp", "png"):
+        candidate = derivative_path(path, min(DEFAULT_WIDTHS), image_format)
+        if os.path.exists(candidate) and os.path.getmtime(candidate) >= mtime:
+            return candidate
+    return path
+
+
+def load_reduced(path, size):
+    """Decode an image as RGBA with its longest side at most size (upright)"""
+    with Image.open(path) as img:
+        # JPEG sources decode straight at a reduced DCT scale
+        img.draft('RGB', (size, size))
+        img = ImageOps.exif_transpose(img)
+        img = img.convert('RGBA')
+    # reducing_gap shrinks by an integer factor with reduce() before the resample
+    img.thumbnail((size, size), Image.LANCZOS, reducing_gap=2.0)
+    return img
+
+
+def lqip(img):
+    """data: URI of a tiny WebP of an RGBA image"""
+    small = img.copy()
+    small.thumbnail((LQIP_SIZE, LQIP_SIZE), Image.LANCZOS)
+    buffer = io.BytesIO()
+    small.save(buffer, 'WEBP', quality=LQIP_QUALITY, method=6)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def make_placeholder(url):
+    """BlurHash and LQIP of one site image; returns a result dict"""
+    result = {
+        "url": url,
+        "width": None,
+        "height": None,
+        "blurhash": None,
+        "lqip": None,
+        "success": False,
+        "error": None,
+    }
+    try:
+        path = url_to_path(url)
+        with Image.open(path) as img:
+            result["width"], result["height"] = displayed_size(img)
+        img = load_reduced(small_source(path), BLURHASH_SIZE)
+
+        background = Image.new('RGBA', img.size, BACKGROUND + (255,))
+        rgb = np.asarray(Image.alpha_composite(background, img).convert('RGB'))
+        result["blurhash"] = blurhash(rgb, *components(img.size))
+        result["lqip"] = lqip(img)
+        result["success"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def generate_placeholders(urls, jobs=None):
+    """Compute placeholders for many images in a process pool, yielding results in order"""
+    if (jobs is not None and jobs <= 1) or len(urls) <= 1:
+        yield from map(make_placeholder, urls)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(make_placeholder, urls)
+
+
+def update_placeholders(catalog, urls, jobs=None, force=False):
+    """Compute the placeholders of new or changed images and record them in the catalog
+
+    Yields a result per URL, with "cached" set for the ones whose content
+    hash still matches the recorded placeholder.
+    """
+    known = catalog.placeholders(urls)
+    hashes = {url: catalog.content_hash(url)[0] for url in urls}
+    pending = []
+    for url in urls:
+        entry = known.get(url)
+        if not force and entry is not None and hashes[url] is not None and entry["sha256"] == hashes[url]:
+            yield dict(entry, url=url, cached=True, success=True, error=None)
+        else:
+            pending.append(url)
+
+    results = []
+    try:
+        for result in generate_placeholders(pending, jobs):
+            result["sha256"] = hashes[result["url"]]
+            result["cached"] = False
+            if result["success"]:
+                results.append(result)
+            yield result
+    finally:
+        catalog.record_placeholders(results)
+
+
+# Site images
+
+def _promotion_urls(record):
+    urls = []
+    for field in PROMOTION_IMAGE_FIELDS:
+        value = record.get(field)
+        urls.extend(value if isinstance(value, list) else [value] if value else [])
+    return urls
+
+
+def _is_local(url):
+    return url.startswith(f"/{ASSETS_DIR}/") and os.path.exists(url_to_path(url))
+
+
+def site_image_urls(catalog):
+    """Every local wrapper photo and promotion image the site shows, without repeats"""
+    urls = [url for photos in catalog.photo_urls().values() for url in photos]
+    for record in load_site_dataset().tables['promotions'].values():
+        urls.extend(_promotion_urls(record))
+    return [url for url in dict.fromkeys(urls) if _is_local(url)]
+
+
+def attach_placeholders(dataset, catalog):
+    """Store the recorded placeholders next to the image URLs of every promotion
+
+    Returns the number of promotion records changed.
+    """
+    changed = 0
+    for record in dataset.tables['promotions'].values():
+        urls = [url for url in _promotion_urls(record) if url.startswith(f"/{ASSETS_DIR}/")]
+        known = catalog.placeholders(urls)
+        placeholders = {
+            url: {field: known[url][field] for field in ("blurhash", "lqip", "width", "height")}
+            for url in dict.fromkeys(urls) if url in known
+        }
+        if (record.get(SEED_FIELD) or {}) != placeholders:
+            record[SEED_FIELD] = placeholders or None
+            changed += 1
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute BlurHash and LQIP placeholders for site images")
+    parser.add_argument("urls", nargs="*", help="site URLs to process (default: every wrapper photo and promotion image)")
+    parser.add_argument("--force", action="store_true", help="recompute placeholders whose source has not changed")
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    with WrapperCatalog.open() as catalog:
+        # A rescan only re-hashes changed files, and keeps the freshness check exact
+        catalog.hashes, _ = update_index(jobs=args.jobs)
+        urls = args.urls or site_image_urls(catalog)
+        print(f"Computing placeholders for {len(urls)} images...")
+
+        computed = cached = failed = 0
+        for result in update_placeholders(catalog, urls, args.jobs, args.force):
+            name = os.path.basename(result["url"])
+            if not result["success"]:
+                failed += 1
+                print(f"✗ Error computing placeholder for {name}: {result['error']}")
+            elif result["cached"]:
+                cached += 1
+            else:
+                computed += 1
+                print(f"✓ {name}: {result['blurhash']} ({len(result['lqip'])} B LQIP)")
+
+        print(f"\n📊 {computed} computed, {cached} unchanged, {failed} failed")
+        print(f"📋 Placeholders recorded in: {CATALOG_FILE}")
+
+        if SeedDataset.exists():
+            dataset = SeedDataset.load()
+            changed = attach_placeholders(dataset, catalog)
+            if changed:
+                dataset.save()
+            print(f"📋 {changed} promotion records updated in the seed dataset")
+        else:
+            print("⚠️  No seed dataset: run scripts/seed_data.py export to ship the placeholders to the site")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Lossless PNG recompression and metadata stripping.
+
+The rotate scripts save PNGs with Pillow's defaults (and a `quality` that
+PNG ignores), so the rotated and processed photos are stored with zlib
+level 6 and whatever chunks the source carried. This stage re-encodes
+each PNG a few ways and keeps the smallest file:
+
+- zlib level 9 with the default, filtered and RLE strategies, plus
+  Pillow's `optimize` (its own level 9 / filter search); on images over
+  a megapixel the trials are ranked on a sample of row bands and only
+  the winner is encoded in full
+- lossless mode reductions: RGBA whose alpha is all opaque to RGB,
+  gray RGB(A) to L(A), and at most 256 distinct colors to a palette
+  (with per-entry alpha), whose bit depth Pillow then lowers to 1/2/4
+  bits when the palette is small enough
+
+EXIF, text chunks and sRGB ICC profiles are dropped; a non-sRGB profile
+is kept, since dropping it would change the colors. Files with a
+non-default gAMA chunk are left alone for the same reason. Every
+candidate is decoded again and compared with the original pixels, and
+the file is only replaced (atomically, keeping its mtime) when it
+shrinks, so derivatives built from it are not considered stale.
+
+Files found optimal are remembered by size and mtime in
+attached_assets/png_optimizer.json and skipped on the next run.
+
+Usage:
+    python scripts/png_optimizer.py [paths or globs ...] [--dry-run] [--force] [--jobs N]
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from asset_store import ASSETS_DIR
+from rotation_cache import RotationCache
+from rotation_engine import add_jobs_argument
+
+STATE_FILE = os.path.join(ASSETS_DIR, "png_optimizer.json")
+DEFAULT_PATTERNS = (
+    os.path.join(ASSETS_DIR, "rotated", "*.png"),
+    os.path.join(ASSETS_DIR, "processed", "*.png"),
+    os.path.join(ASSETS_DIR, "derivatives", "*.png"),
+)
+# Encoder settings tried on every candidate image
+TRIALS = (
+    {"optimize": True},
+    {"compress_level": 9, "compress_type": zlib.Z_DEFAULT_STRATEGY},
+    {"compress_level": 9, "compress_type": zlib.Z_FILTERED},
+    {"compress_level": 9, "compress_type": zlib.Z_RLE},
+)
+# Level 9 deflate runs at a few seconds per megapixel on photos, so images
+# larger than this rank the trials on a few bands of rows and are only
+# encoded in full with the winner
+SAMPLE_PIXELS = 256 * 1024
+SAMPLE_BANDS = 4
+DEFAULT_GAMMA = 1 / 2.2
+
+
+def _is_srgb(icc_profile):
+    """Whether an embedded ICC profile is (a variant of) sRGB, which browsers assume anyway"""
+    try:
+        from PIL import ImageCms
+        profile = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+        return 'srgb' in ImageCms.getProfileDescription(profile).lower()
+    except Exception:
+        return False
+
+
+def _rgba(img):
+    return np.asarray(img.convert('RGBA'))
+
+
+def _image(mode, pixels):
+    height, width = pixels.shape[:2]
+    return Image.frombytes(mode, (width, height), np.ascontiguousarray(pixels).tobytes())
+
+
+def _palette(pixels):
+    """P image with exact colors and per-entry alpha, or None past 256 colors"""
+    packed = pixels.reshape(-1, 4).view(np.uint32).ravel()
+    colors, indexes = np.unique(packed, return_inverse=True)
+    if len(colors) > 256:
+        return None
+    entries = colors.view(np.uint8).reshape(-1, 4)
+    img = _image('P', indexes.astype(np.uint8).reshape(pixels.shape[:2]))
+    img.putpalette(entries[:, :3].tobytes())
+    alpha = entries[:, 3]
+    if (alpha < 255).any():
+        # tRNS only needs the entries up to the last translucent one
+        last = int(np.nonzero(alpha < 255)[0][-1])
+        img.info["transparency"] = alpha[:last + 1].tobytes()
+    return img
+
+
+def reductions(img):
+    """Losslessly reduced versions of an image worth trying, starting with the image itself"""
+    candidates = [img]
+    if img.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        return candidates
+    pixels = _rgba(img)
+    opaque = bool((pixels[..., 3] == 255).all())
+    gray = bool(((pixels[..., 0] == pixels[..., 1]) & (pixels[..., 1] == pixels[..., 2])).all())
+    if gray:
+        candidates.append(_image('L', pixels[..., 0]) if opaque else _image('LA', pixels[..., [0, 3]]))
+    elif opaque and img.mode == 'RGBA':
+        candidates.append(_image('RGB', pixels[..., :3]))
+    # getcolors gives up quickly on photos with more than 256 colors
+    if img.getcolors(256) is not None:
+        palette = _palette(pixels)
+        if palette is not None:
+            candidates.append(palette)
+    return candidates
+
+
+def _encode(img, settings, icc_profile):
+    buffer = io.BytesIO()
+    # Passed even when None: Pillow would otherwise copy the source's profile
+    options = dict(settings, icc_profile=icc_profile)
+    if "transparency" in img.info:
+        options["transparency"] = img.info["transparency"]
+    img.save(buffer, 'PNG', **options)
+    return buffer.getvalue()
+
+
+def _sample(img):
+    """A few evenly spaced bands of rows stacked into one small image of the same mode"""
+    width, height = img.size
+    rows = max(8, SAMPLE_PIXELS // width // SAMPLE_BANDS)
+    step = height // SAMPLE_BANDS
+    sample = Image.new(img.mode, (width, rows * SAMPLE_BANDS))
+    if img.mode == 'P':
+        sample.putpalette(img.getpalette())
+    sample.info = dict(img.info)
+    for band in range(SAMPLE_BANDS):
+        top = band * step + (step - rows) // 2
+        sample.paste(img.crop((0, top, width, top + rows)), (0, band * rows))
+    return sample
+
+
+def _smallest(candidates, icc_profile):
+    """(encoded bytes, mode, settings) of the smallest trial over every candidate"""
+    width, height = candidates[0].size
+    if width * height <= SAMPLE_PIXELS * SAMPLE_BANDS:
+        encodings = (
+            (_encode(candidate, settings, icc_profile), candidate, settings)
+            for candidate in candidates for settings in TRIALS
+        )
+        data, candidate, settings = min(encodings, key=lambda encoding: len(encoding[0]))
+        return data, candidate.mode, settings
+    trials = [
+        (len(_encode(_sample(candidate), settings, icc_profile)), index, settings)
+        for index, candidate in enumerate(candidates) for settings in TRIALS
+    ]
+    _, index, settings = min(trials, key=lambda trial: trial[0])
+    return _encode(candidates[index], settings, icc_profile), candidates[index].mode, settings
+
+
+def optimize_png(path, dry_run=False):
+    """Re-encode one PNG losslessly and keep the smallest result; returns a result dict"""
+    result = {
+        "path": path,
+        "original_bytes": None,
+        "optimized_bytes": None,
+        "mode": None,
+        "reduced_to": None,
+        "settings": None,
+        "written": False,
+        "skipped": None,
+        "success": False,
+        "error": None,
+    }
+    try:
+        stat = os.stat(path)
+        result["original_bytes"] = stat.st_size
+        with Image.open(path) as img:
+            if img.format != 'PNG':
+                result["skipped"] = f"not a PNG ({img.format})"
+                result["success"] = True
+                return result
+            if getattr(img, 'n_frames', 1) > 1:
+                result["skipped"] = "animated PNG"
+                result["success"] = True
+                return result
+            img.load()
+            result["mode"] = img.mode
+            gamma = img.info.get("gamma")
+            if gamma is not None and abs(gamma - DEFAULT_GAMMA) > 0.01 and "srgb" not in img.info:
+                result["skipped"] = f"gAMA {gamma:.3f} would change the colors"
+                result["success"] = True
+                return result
+            icc_profile = img.info.get("icc_profile")
+            if icc_profile and _is_srgb(icc_profile):
+                icc_profile = None
+            original = _rgba(img)
+
+            data, mode, settings = _smallest(reductions(img), icc_profile)
+
+        result["optimized_bytes"] = len(data)
+        result["reduced_to"] = mode if mode != result["mode"] else None
+        result["settings"] = settings
+        if len(data) >= stat.st_size:
+            result["success"] = True
+            return result
+
+        with Image.open(io.BytesIO(data)) as check:
+            if not np.array_equal(_rgba(check), original):
+                raise ValueError(f"{mode} re-encode changed the pixels")
+        if not dry_run:
+            temp_path = path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            # Same pixels: keep the mtime so derivatives built from the file stay fresh
+            os.utime(temp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            os.replace(temp_path, path)
+            result["written"] = True
+        result["success"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def _optimize_png(args):
+    return optimize_png(*args)
+
+
+def _stat_entry(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_state(state_file=STATE_FILE):
+    """{path: {"size", "mtime_ns"}} of the files already optimized"""
+    if os.path.exists(state_file):
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)["files"]
+    return {}
+
+
+def save_state(files, state_file=STATE_FILE):
+    with open(state_file, 'w', encoding='utf-8') as f:
+        json.dump({"files": files}, f, indent=2, ensure_ascii=False)
+
+
+def generate_optimized(paths, jobs=None, dry_run=False):
+    """Optimize many PNGs in a process pool, yielding results in order"""
+    work = [(path, dry_run) for path in paths]
+    if (jobs is not None and jobs <= 1) or len(work) <= 1:
+        yield from map(_optimize_png, work)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(_optimize_png, work)
+
+
+def optimize_pngs(paths, jobs=None, dry_run=False, force=False, state_file=STATE_FILE):
+    """Optimize the PNGs not optimized yet, yielding a result dict per path in order
+
+    Files unchanged since they were last optimized are yielded with
+    "cached" set. Rewritten files are re-recorded in the rotation cache,
+    whose entries would otherwise no longer match their size.
+    """
+    state = {} if force else load_state(state_file)
+    pending = [
+        path for path in paths
+        if not (path in state and os.path.exists(path) and _stat_entry(path) == state[path])
+    ]
+    pending_paths = set(pending)
+
+    written = []
+    results = generate_optimized(pending, jobs, dry_run)
+    try:
+        for path in paths:
+            if path in pending_paths:
+                result = next(results)
+                result["cached"] = False
+                if result["success"] and result["skipped"] is None and not dry_run:
+                    state[path] = _stat_entry(path)
+                    if result["written"]:
+                        written.append(path)
+                yield result
+            else:
+                yield {"path": path, "cached": True, "written": False, "success": True, "error": None}
+    finally:
+        results.close()
+        if not dry_run:
+            save_state(state, state_file)
+            if written:
+                cache = RotationCache.load()
+                cache.refresh(written)
+                cache.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Losslessly recompress PNGs and strip their metadata")
+    parser.add_argument("paths", nargs="*",
+                        help=f"PNG files or glob patterns (default: {' '.join(DEFAULT_PATTERNS)})")
+    parser.add_argument("--dry-run", action="store_true", help="report the savings without rewriting any file")
+    parser.add_argument("--force", action="store_true", help="retry files already optimized")
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    paths = []
+    for pattern in args.paths or DEFAULT_PATTERNS:
+        matches = sorted(glob.glob(pattern)) or ([pattern] if args.paths else [])
+        paths.extend(path for path in matches if path not in paths)
+    print(f"Optimizing {len(paths)} PNGs...")
+
+    before = after = optimized = cached = 0
+    for result in optimize_pngs(paths, args.jobs, args.dry_run, args.force):
+        name = os.path.basename(result["path"])
+        if not result["success"]:
+            print(f"✗ Error optimizing {name}: {result['error']}")
+        elif result["cached"]:
+            cached += 1
+        elif result["skipped"]:
+            print(f"⚠️  Skipped {name}: {result['skipped']}")
+        elif result["optimized_bytes"] >= result["original_bytes"]:
+            print(f"↺ Already optimal: {name}")
+        else:
+            optimized += 1
+            before += result["original_bytes"]
+            after += result["optimized_bytes"]
+            saved = result["original_bytes"] - result["optimized_bytes"]
+            reduced = f", {result['mode']} -> {result['reduced_to']}" if result["reduced_to"] else ""
+            print(f"✓ {name}: {result['original_bytes'] / 1024:.1f} KB -> {result['optimized_bytes'] / 1024:.1f} KB "
+                  f"(-{saved / 1024:.1f} KB, {100 * saved / result['original_bytes']:.1f}%{reduced})")
+
+    if cached:
+        print(f"↺ {cached} PNGs already optimized")
+    verb = "would save" if args.dry_run else "saved"
+    if optimized:
+        print(f"\n📊 {optimized} PNGs {verb} {(before - after) / 1e6:.2f} MB "
+              f"({before / 1e6:.2f} MB -> {after / 1e6:.2f} MB, -{100 * (before - after) / before:.1f}%)")
+    else:
+        print("\n📊 Nothing to shrink")
+    if not args.dry_run:
+        print(f"📋 Optimizer state saved to: {STATE_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,9 @@ Rotate, organize, and prepare JSON updates for integration
 
 import json
 import os
-from PIL import Image
-import shutil
+from instrumentation import profiled
+from rotation_cache import RotationCache
+from rotation_engine import make_task, parse_args, rotate_batch
 
 # Mapping of new images to promotions, flavors, and rotations needed
 NEW_WRAPPER_MAPPING = {
@@ -152,27 +153,7 @@ NEW_WRAPPER_MAPPING = {
     }
 }
 
-def rotate_image(input_path, output_path, rotation_degrees):
-    """Rotate image by specified degrees"""
-    try:
-        with Image.open(input_path) as img:
-            if rotation_degrees != 0:
-                # Convert to RGBA to preserve transparency
-                if img.mode != 'RGBA':
-                    img = img.convert('RGBA')
-                rotated = img.rotate(rotation_degrees, expand=True)
-                rotated.save(output_path, 'PNG')
-                print(f"✓ Rotated {os.path.basename(input_path)} by {rotation_degrees}°")
-            else:
-                # Copy without rotation
-                shutil.copy2(input_path, output_path)
-                print(f"✓ Copied {os.path.basename(input_path)} (no rotation needed)")
-        return True
-    except Exception as e:
-        print(f"✗ Error processing {input_path}: {e}")
-        return False
-
-def process_batch_2_wrappers():
+def process_batch_2_wrappers(jobs=None, cache=None):
     """Process all batch 2 wrapper photos"""
     base_dir = "attached_assets"
     rotated_dir = os.path.join(base_dir, "rotated")
@@ -186,6 +167,8 @@ def process_batch_2_wrappers():
     print("🔄 Processing Batch 2 wrapper photos...")
     print(f"Found {len(NEW_WRAPPER_MAPPING)} new wrapper images to process\n")
     
+    tasks = []
+    mappings = []
     for original_filename, mapping in NEW_WRAPPER_MAPPING.items():
         input_path = os.path.join(base_dir, original_filename)
         
@@ -197,22 +180,36 @@ def process_batch_2_wrappers():
         rotated_filename = f"{os.path.splitext(original_filename)[0]}_rotated.png"
         output_path = os.path.join(rotated_dir, rotated_filename)
         
-        # Rotate image
-        if rotate_image(input_path, output_path, mapping["rotation"]):
-            processed_count += 1
-            
-            # Create update entry
-            update_entry = {
-                "original_file": original_filename,
-                "rotated_file": rotated_filename,
-                "promotion": mapping["promotion"],
-                "flavor": mapping["flavor"],
-                "target_filename": mapping["filename"],
-                "description": f"Wrapper del sabor {mapping['flavor']}"
-            }
-            updates.append(update_entry)
-            
-            print(f"   → {mapping['promotion']} ({mapping['flavor']})")
+        # Convert to RGBA to preserve transparency; copy as-is when no rotation is needed
+        tasks.append(make_task(input_path, output_path, mapping["rotation"], 'PNG',
+                               mode='RGBA', copy_if_unrotated=True))
+        mappings.append((original_filename, rotated_filename, mapping))
+    
+    for result, (original_filename, rotated_filename, mapping) in zip(rotate_batch(tasks, jobs, cache), mappings):
+        if not result["success"]:
+            print(f"✗ Error processing {result['input_path']}: {result['error']}")
+            continue
+        
+        if result["cached"]:
+            print(f"↺ Up to date {original_filename}")
+        elif result["copied"]:
+            print(f"✓ Copied {original_filename} (no rotation needed)")
+        else:
+            print(f"✓ Rotated {original_filename} by {mapping['rotation']}°")
+        processed_count += 1
+        
+        # Create update entry
+        update_entry = {
+            "original_file": original_filename,
+            "rotated_file": rotated_filename,
+            "promotion": mapping["promotion"],
+            "flavor": mapping["flavor"],
+            "target_filename": mapping["filename"],
+            "description": f"Wrapper del sabor {mapping['flavor']}"
+        }
+        updates.append(update_entry)
+        
+        print(f"   → {mapping['promotion']} ({mapping['flavor']})")
     
     # Save processing results
     results_file = os.path.join(base_dir, "batch_2_wrapper_updates.json")
@@ -231,4 +228,6 @@ def process_batch_2_wrappers():
     return updates
 
 if __name__ == "__main__":
-    process_batch_2_wrappers()
\ No newline at end of file
+    args = parse_args("Process batch 2 wrapper photos")
+    with profiled(args, "process_batch_2_wrappers"):
+        process_batch_2_wrappers(args.jobs, None if args.force else RotationCache.load())
\ No newline at end of file
@@ -5,28 +5,12 @@ Rotate images and create organized data structure for database updates.
 """
 
 import json
-from PIL import Image
 import os
+from instrumentation import profiled
+from rotation_cache import RotationCache
+from rotation_engine import make_task, parse_args, rotate_batch
 
-def rotate_image(input_path, output_path, rotation_angle):
-    """Rotate image by specified angle and save to output path"""
-    try:
-        with Image.open(input_path) as img:
-            # Convert to RGB if necessary (for PNG with transparency)
-            if img.mode in ('RGBA', 'LA'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
-            
-            rotated = img.rotate(rotation_angle, expand=True)
-            rotated.save(output_path, 'PNG', quality=95)
-            print(f"Rotated {input_path} by {rotation_angle}° -> {output_path}")
-            return True
-    except Exception as e:
-        print(f"Error rotating {input_path}: {e}")
-        return False
-
-def main():
+def main(jobs=None, cache=None):
     # Third batch images (timestamp 1755219753***)
     batch_3_images = [
         # Teen Titans wrappers
@@ -153,25 +137,34 @@ def main():
         "new_promotions": []
     }
     
+    tasks = []
     for img_data in batch_3_images:
         original_path = f"attached_assets/{img_data['original']}"
         rotated_filename = img_data['original'].replace('.png', '_rotated.png')
         rotated_path = f"attached_assets/rotated/{rotated_filename}"
         
-        # Rotate image if needed
-        if img_data['rotation'] != 0:
-            success = rotate_image(original_path, rotated_path, img_data['rotation'])
-            if success:
-                img_data['rotated_path'] = rotated_path
-        else:
-            # Copy to rotated folder even if no rotation needed for consistency
-            try:
-                with Image.open(original_path) as img:
-                    img.save(rotated_path, 'PNG', quality=95)
-                img_data['rotated_path'] = rotated_path
+        # Rotated images are flattened onto white; the rest are copied to the
+        # rotated folder as-is for consistency
+        tasks.append(make_task(original_path, rotated_path, img_data['rotation'], 'PNG',
+                               flatten=img_data['rotation'] != 0,
+                               copy_if_unrotated=True))
+    
+    for img_data, result in zip(batch_3_images, rotate_batch(tasks, jobs, cache)):
+        original_path = result['input_path']
+        rotated_path = result['output_path']
+        
+        if result['success']:
+            img_data['rotated_path'] = rotated_path
+            if result['cached']:
+                print(f"Up to date {rotated_path}")
+            elif img_data['rotation'] != 0:
+                print(f"Rotated {original_path} by {img_data['rotation']}° -> {rotated_path}")
+            else:
                 print(f"Copied {original_path} -> {rotated_path}")
-            except Exception as e:
-                print(f"Error copying {original_path}: {e}")
+        elif img_data['rotation'] != 0:
+            print(f"Error rotating {original_path}: {result['error']}")
+        else:
+            print(f"Error copying {original_path}: {result['error']}")
         
         processed_data['processed_images'].append(img_data)
         
@@ -202,4 +195,6 @@ def main():
             print(f"  - {wrapper['flavor']}: {wrapper['description']}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args("Process third batch of wrapper images")
+    with profiled(args, "process_batch_3_wrappers"):
+        main(args.jobs, None if args.force else RotationCache.load())
\ No newline at end of file
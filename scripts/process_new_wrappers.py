@@ -1,125 +1,99 @@
 #!/usr/bin/env python3
 """
 Process new Vualá wrapper photos: rotate, classify, and organize them
+
+Without arguments the new uploads are found through the asset scan index:
+attached_assets is stat-ed, only new or changed files are hashed, and the
+photos first seen since the last run that are not in the wrapper catalog
+yet are processed (the first run only records the current uploads).
+Uploads the classifier cannot identify are left alone, and they stay
+pending (like uploads that fail to rotate) for the next run.
+
+Usage:
+    python scripts/process_new_wrappers.py
+    python scripts/process_new_wrappers.py "attached_assets/*_1755196507*.png"
 """
 
-import json
+import argparse
+import glob
 import os
 import re
-from PIL import Image
+from PIL import Image, ImageOps
 from pathlib import Path
+from asset_store import ASSETS_DIR, update_index
+from derivatives import MANIFEST_FILE, update_manifest
+from filename_classifier import default_classifier
+from wrapper_catalog import CATALOG_FILE, WrapperCatalog
 
 def extract_info_from_filename(filename):
-    """Extract promotion name, flavor, and side from filename"""
-    filename_lower = filename.lower()
-    
-    # Extract flavor
-    flavor = "Unknown"
-    if "chocolate" in filename_lower:
-        flavor = "Chocolate"
-    elif "cajeta" in filename_lower:
-        flavor = "Cajeta"
-    elif "vainilla" in filename_lower:
-        flavor = "Vainilla"
-    elif "piña" in filename_lower:
-        flavor = "Piña"
-    
-    # Extract side
-    side = "Frontal"
-    if "trasera" in filename_lower:
-        side = "Trasera"
-    elif "lateral" in filename_lower:
-        side = "Lateral"
-    elif "frontal" in filename_lower:
-        side = "Frontal"
-    
-    # Extract promotion name and year
-    promotion_map = {
-        "askistix": ("Askistix", "2004"),
-        "avengers": ("Avengers", "2012"),
-        "bob esponja 2012": ("Bob Esponja", "2012"),
-        "bob esponja 2024": ("Bob Esponja 25 Años", "2024"),
-        "angry birds go": ("Angry Birds Go", "2014"),
-        "ecolokitos": ("Ecolokitos", "2012"),
-        "funki punky extremo": ("Funki Punky Extremo", "2011"),
-        "tortugas ninja": ("Tortugas Ninja", "2014"),
-        "cartoon network": ("Cartoon Network", "2019"),
-        "conexion alien": ("Conexión Alien", "2004"),
-        "spiderman 3": ("Spiderman 3", "2007"),
-        "reyes de las olas": ("Reyes de las Olas", "2011"),
-        "dance mania": ("Dance Mania", "2008"),
-        "dancemania": ("Dance Mania", "2008")
-    }
-    
-    promotion_name = "Unknown"
-    year = "Unknown"
-    
-    for key, (name, yr) in promotion_map.items():
-        if key in filename_lower:
-            promotion_name = name
-            year = yr
-            break
-    
-    return {
-        "promotion": promotion_name,
-        "year": year,
-        "flavor": flavor,
-        "side": side
-    }
+    """Extract promotion name, year, flavor, and side from filename using the promotion catalog"""
+    return default_classifier().classify(filename)
 
 def rotate_image_if_needed(image_path, output_path):
-    """Rotate image based on orientation and save to output path"""
+    """Apply the EXIF orientation and save to output path
+
+    The pixel heuristic in orientation.py disagrees with the labelled
+    pipeline specs, so uploads are only straightened by their EXIF tag;
+    run `python scripts/orientation.py --check` before relying on it.
+    """
     try:
         with Image.open(image_path) as img:
-            # Get image dimensions
-            width, height = img.size
+            img_rotated = ImageOps.exif_transpose(img)
             
-            # Check if image needs rotation (sideways = width < height)
-            if width < height:
-                # Rotate 90 degrees clockwise for new images
-                img_rotated = img.rotate(-90, expand=True)
-            else:
-                # Keep as is for landscape images
-                img_rotated = img
-            
-            # Save the rotated image
-            img_rotated.save(output_path, quality=95)
+            # Save the rotated image next to the output, then swap it in
+            temp_path = str(output_path) + ".tmp"
+            img_rotated.save(temp_path, Image.registered_extensions()[Path(output_path).suffix.lower()], quality=95)
+            os.replace(temp_path, output_path)
             return True
     except Exception as e:
         print(f"Error processing {image_path}: {e}")
         return False
 
 def main():
-    # Get all files with timestamp _1755196507570 and newer (the 20 new files)
-    attached_assets_dir = Path("attached_assets")
-    new_files = []
+    parser = argparse.ArgumentParser(description="Rotate, classify and catalog new wrapper photos")
+    parser.add_argument("patterns", nargs="*",
+                        help="glob patterns of the photos to process (default: uploads new since the last run)")
+    args = parser.parse_args()
+    attached_assets_dir = Path(ASSETS_DIR)
     
-    # Find files with the newer timestamps
-    for file_path in attached_assets_dir.glob("*_1755196507*.png"):
-        if file_path.is_file():
-            new_files.append(file_path)
+    catalog = WrapperCatalog.open()
+    if args.patterns:
+        new_files = sorted({Path(path) for pattern in args.patterns for path in glob.glob(pattern)
+                            if os.path.isfile(path)})
+    else:
+        # Stat-only rescan: just the files added or changed since the last scan are hashed
+        files, changes = update_index()
+        print(f"🔍 Scanned {len(files)} assets: {len(changes['added'])} added, {len(changes['modified'])} modified")
+        pending = catalog.pending_uploads(files)
+        if pending is None:
+            print("📋 First run: recorded the current uploads as already seen; "
+                  "pass glob patterns to process existing photos")
+            catalog.close()
+            return
+        new_files = [attached_assets_dir / name for name in pending]
     
     print(f"Found {len(new_files)} new wrapper photos to process")
     
-    # Load existing wrapper organization
-    wrapper_json_path = attached_assets_dir / "vuala_wrappers_organized.json"
-    if wrapper_json_path.exists():
-        with open(wrapper_json_path, 'r', encoding='utf-8') as f:
-            wrapper_data = json.load(f)
-    else:
-        wrapper_data = {}
-    
     # Create rotated directory if it doesn't exist
     rotated_dir = attached_assets_dir / "rotated"
     rotated_dir.mkdir(exist_ok=True)
     
     processed_count = 0
+    rotated_urls = []
+    entries = []
+    unidentified = []
+    failed = []
     
     for file_path in new_files:
         print(f"Processing: {file_path.name}")
         
         # Extract information from filename
         info = extract_info_from_filename(file_path.name)
+        if not args.patterns and info["promotion"] == "Unknown":
+            # Discovered uploads include logos and screenshots, so only named wrappers are rotated
+            print(f"  - Could not identify promotion for {file_path.name}")
+            unidentified.append(file_path.name)
+            continue
         
         # Create rotated image
         rotated_filename = file_path.stem + "_rotated.png"
@@ -127,48 +101,58 @@ def main():
         
         if rotate_image_if_needed(file_path, rotated_path):
             print(f"  - Rotated and saved to: {rotated_path}")
+            rotated_urls.append(f"/attached_assets/rotated/{rotated_filename}")
             
             # Add to wrapper organization
             promotion_name = info["promotion"]
             if promotion_name != "Unknown":
-                if promotion_name not in wrapper_data:
-                    wrapper_data[promotion_name] = {
-                        "name": promotion_name,
-                        "year": info["year"],
-                        "flavors": {},
-                        "images": []
-                    }
-                
-                # Add to flavors
                 flavor = info["flavor"]
-                if flavor not in wrapper_data[promotion_name]["flavors"]:
-                    wrapper_data[promotion_name]["flavors"][flavor] = []
                 
-                # Create wrapper entry
-                wrapper_entry = {
+                # Create wrapper entry, written to the catalog in one batch below
+                entries.append({
+                    "promotion": promotion_name,
                     "filename": file_path.name,
                     "side": info["side"],
                     "flavor": flavor,
                     "year": info["year"],
                     "path": f"/attached_assets/{file_path.name}",
                     "rotated_path": f"/attached_assets/rotated/{rotated_filename}"
-                }
-                
-                # Add to both flavors and images arrays
-                wrapper_data[promotion_name]["flavors"][flavor].append(wrapper_entry)
-                wrapper_data[promotion_name]["images"].append(wrapper_entry)
+                })
                 
                 print(f"  - Added to {promotion_name} collection as {flavor} {info['side']}")
+                if info["match"] == "fuzzy":
+                    print(f"    (fuzzy filename match, score {info['score']:.2f})")
                 processed_count += 1
             else:
                 print(f"  - Could not identify promotion for {file_path.name}")
+                unidentified.append(file_path.name)
+        else:
+            failed.append(file_path.name)
     
-    # Save updated wrapper organization
-    with open(wrapper_json_path, 'w', encoding='utf-8') as f:
-        json.dump(wrapper_data, f, ensure_ascii=False, indent=2)
+    # Upsert every entry in one transaction, then refresh the legacy JSON if anything changed
+    with catalog:
+        changed = catalog.upsert_many(entries)
+        if changed:
+            wrapper_json_path = catalog.export_json()
+        if not args.patterns:
+            # Unidentified and failed uploads are retried on the next run
+            catalog.mark_uploads(files, retry=unidentified + failed)
     
     print(f"\nProcessed {processed_count} wrapper photos successfully!")
-    print(f"Updated wrapper organization saved to: {wrapper_json_path}")
+    if unidentified:
+        state = "rotated but not organized" if args.patterns else "skipped"
+        print(f"Could not identify {len(unidentified)} photos ({state}): {', '.join(unidentified)}")
+    if failed:
+        print(f"Could not rotate {len(failed)} photos: {', '.join(failed)}")
+    print(f"Catalog updated ({changed} rows inserted or changed): {CATALOG_FILE}")
+    if changed:
+        print(f"Updated wrapper organization saved to: {wrapper_json_path}")
+    
+    # Small WebP/PNG copies for the site, recorded in the srcset manifest
+    failed = [result for result in update_manifest(rotated_urls) if not result["success"]]
+    for result in failed:
+        print(f"Error creating derivatives for {result['url']}: {result['error']}")
+    print(f"Responsive derivatives for {len(rotated_urls) - len(failed)} photos saved to: {MANIFEST_FILE}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
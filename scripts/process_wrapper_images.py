@@ -1,93 +1,102 @@
 #!/usr/bin/env python3
 """
 Script to process Vualá wrapper images:
-1. Rotate sideways images 90 degrees upward
-2. Remove backgrounds from all wrapper images using remove.bg API
+1. Apply the EXIF orientation (and, with --detect-orientation, rotate
+   photos that the pixel heuristic finds sideways or upside down)
+2. Remove backgrounds from all wrapper images, offline (--bg-engine local)
+   or with the remove.bg API (--bg-engine api)
 3. Save processed images with "_processed" suffix
+
+Each image is decoded once and both steps run on the decoded image in
+memory (see image_chain.py); no temp files are written.
 """
 
+import argparse
 import os
-import sys
-import requests
-import json
-from PIL import Image, ImageOps
-import time
+from image_chain import make_chain, run_chain, run_chains_shared
+from instrumentation import add_profile_arguments, profiled, tracer
+from removebg_client import RemoveBgClient
+from orientation import DEFAULT_MIN_CONFIDENCE
+from rotation_engine import add_jobs_argument
 
 # Free background removal API - remove.bg
 REMOVE_BG_API_KEY = None  # Will need user to provide API key
+BG_ENGINES = ("local", "api")
 
-def get_image_orientation(image_path):
-    """Determine if image needs rotation based on dimensions"""
-    try:
-        with Image.open(image_path) as img:
-            width, height = img.size
-            # If width > height, image is landscape (sideways)
-            # Most wrapper photos should be portrait (height > width)
-            if width > height:
-                return "landscape"  # Needs rotation
-            else:
-                return "portrait"   # Correct orientation
-    except Exception as e:
-        print(f"Error checking orientation for {image_path}: {e}")
+def wrapper_chain(input_path, final_path, bg_engine, detect=False):
+    """Decode once, straighten, then remove the background or encode for upload
+
+    EXIF-oriented photos are transposed while decoding. With detect, the
+    others are checked with the pixel heuristic and rotated in memory when
+    it is confident; it is off by default because the heuristic disagrees
+    with the labelled specs (see orientation.py --check).
+    Nothing touches the disk until the final PNG (or, for the API, nothing
+    at all: a rotated image is encoded into memory and uploaded, an upright
+    one is uploaded as the original file).
+    """
+    steps = [{"op": "orient", "detect": detect, "min_confidence": DEFAULT_MIN_CONFIDENCE}]
+    if bg_engine == "api":
+        if os.path.splitext(input_path)[1].lower() in ('.jpg', '.jpeg'):
+            outputs = [{"format": "JPEG", "options": {"quality": 95}, "if_transformed": True}]
+        else:
+            outputs = [{"format": "PNG", "if_transformed": True}]
+    else:
+        steps.append({"op": "remove_background"})
+        outputs = [{"path": final_path, "format": "PNG"}]
+    return make_chain(input_path, steps, outputs)
+
+def describe_orientation(orientation):
+    """Short description of the orientation a chain applied"""
+    if orientation is None:
         return "unknown"
+    if orientation["source"] == "exif":
+        return "from EXIF"
+    return f"{orientation['angle']}° from heuristic, confidence {orientation['confidence']}"
 
-def rotate_image_90_degrees(image_path, output_path):
-    """Rotate image 90 degrees counterclockwise (upward)"""
-    try:
-        with Image.open(image_path) as img:
-            # Rotate 90 degrees counterclockwise to make sideways images upright
-            rotated = img.rotate(90, expand=True)
-            rotated.save(output_path, quality=95)
-            print(f"Rotated: {image_path} -> {output_path}")
-            return True
-    except Exception as e:
-        print(f"Error rotating {image_path}: {e}")
-        return False
+def run_chains(chains, jobs=None):
+    """Run chains in a process pool, yielding results in order
 
-def remove_background_local(image_path, output_path):
-    """Remove background using simple edge detection (fallback method)"""
-    try:
-        with Image.open(image_path) as img:
-            # Convert to RGBA if not already
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
-            
-            # For now, just copy the image as-is since we need a proper background removal service
-            # This is a placeholder - we'll need the user to provide remove.bg API key for proper background removal
-            img.save(output_path, 'PNG')
-            print(f"Processed (no bg removal): {image_path} -> {output_path}")
-            return True
-    except Exception as e:
-        print(f"Error processing {image_path}: {e}")
-        return False
+    Decoded frames and in-memory uploads cross the pool through shared
+    memory rather than being pickled.
+    """
+    if (jobs is not None and jobs <= 1) or len(chains) <= 1:
+        results = map(run_chain, chains)
+    else:
+        results = run_chains_shared(chains, jobs)
+    for result in results:
+        tracer.add(result["trace"])
+        yield result
 
-def remove_background_with_api(image_path, output_path, api_key):
-    """Remove background using remove.bg API"""
-    try:
-        with open(image_path, 'rb') as image_file:
-            response = requests.post(
-                'https://api.remove.bg/v1.0/removebg',
-                files={'image_file': image_file},
-                data={'size': 'auto'},
-                headers={'X-Api-Key': api_key},
-                timeout=30
-            )
-        
-        if response.status_code == 200:
-            with open(output_path, 'wb') as out_file:
-                out_file.write(response.content)
-            print(f"Background removed: {image_path} -> {output_path}")
-            return True
-        else:
-            print(f"API Error for {image_path}: {response.status_code} - {response.text}")
-            return False
-    except Exception as e:
-        print(f"Error removing background for {image_path}: {e}")
-        return False
+def remove_backgrounds_with_api(jobs, api_key, concurrency=4, rate=1.0):
+    """Remove backgrounds for (input_path, output_path[, data]) jobs using the remove.bg API
 
-def process_wrapper_images():
+    Uploads run concurrently under a token-bucket rate limit and are retried
+    with backoff on 429/5xx responses. Yields one result per job, in order.
+    """
+    with RemoveBgClient(api_key, concurrency=concurrency, rate=rate, burst=concurrency) as client:
+        for result in client.process_batch(jobs):
+            if result["success"]:
+                print(f"Background removed: {result['input_path']} -> {result['output_path']}")
+            else:
+                print(f"API Error for {result['input_path']}: {result['error']}")
+            yield result
+
+def report_processed(success, final_path, image_file):
+    """Print the outcome for one wrapper image"""
+    if success:
+        print(f"  ✅ Successfully processed: {final_path}")
+    else:
+        print(f"  ❌ Failed to process: {image_file}")
+    print()
+
+def process_wrapper_images(api_key=REMOVE_BG_API_KEY, concurrency=4, rate=1.0, bg_engine=None, jobs=None,
+                           detect=False):
     """Main function to process all wrapper images"""
     
+    # Default to the API when a key is available
+    if bg_engine is None:
+        bg_engine = "api" if api_key else "local"
+    
     # Define paths
     input_dir = "attached_assets"
     output_dir = "attached_assets/processed"
@@ -113,73 +122,77 @@ def process_wrapper_images():
     print(f"Processing {len(wrapper_images)} wrapper images...")
     print("=" * 50)
     
+    chains = []
     for image_file in wrapper_images:
         input_path = os.path.join(input_dir, image_file)
         
         if not os.path.exists(input_path):
             print(f"Warning: {input_path} not found, skipping...")
             continue
-            
-        # Check orientation
-        orientation = get_image_orientation(input_path)
-        print(f"Processing: {image_file} (orientation: {orientation})")
         
-        # Determine output filename
-        name, ext = os.path.splitext(image_file)
-        temp_path = os.path.join(output_dir, f"{name}_temp{ext}")
+        name, _ = os.path.splitext(image_file)
         final_path = os.path.join(output_dir, f"{name}_processed.png")
+        chains.append((image_file, final_path, wrapper_chain(input_path, final_path, bg_engine, detect)))
+    
+    # API uploads are queued and sent together once every image is upright
+    api_jobs = []
+    results = run_chains([chain for _, _, chain in chains], jobs)
+    for (image_file, final_path, _), result in zip(chains, results):
+        print(f"Processing: {image_file} (orientation: {describe_orientation(result['orientation'])})")
+        if not result["success"]:
+            print(f"Error processing {result['input_path']}: {result['error']}")
+            report_processed(False, final_path, image_file)
+            continue
         
-        # Step 1: Rotate if needed
-        if orientation == "landscape":
-            print(f"  -> Rotating {image_file} 90 degrees...")
-            if rotate_image_90_degrees(input_path, temp_path):
-                process_path = temp_path
-            else:
-                process_path = input_path
-        else:
-            process_path = input_path
-        
-        # Step 2: Remove background
-        print(f"  -> Removing background from {image_file}...")
-        if REMOVE_BG_API_KEY:
-            success = remove_background_with_api(process_path, final_path, REMOVE_BG_API_KEY)
-        else:
-            success = remove_background_local(process_path, final_path)
-        
-        # Clean up temp file
-        if os.path.exists(temp_path) and temp_path != input_path:
-            os.remove(temp_path)
-        
-        if success:
-            print(f"  ✅ Successfully processed: {final_path}")
-        else:
-            print(f"  ❌ Failed to process: {image_file}")
-        
-        print()
+        if bg_engine == "api":
+            print(f"  -> Queued {image_file} for background removal")
+            # Upright sources are uploaded as they are, without a lossy re-encode
+            data = result["outputs"][0]["data"] if result["transformed"] else None
+            api_jobs.append((result["input_path"], final_path, data, image_file))
+            continue
         
-        # Rate limiting for API calls
-        if REMOVE_BG_API_KEY:
-            time.sleep(1)  # 1 second delay between API calls
+        print(f"Background removed (local): {result['input_path']} -> {final_path}")
+        report_processed(True, final_path, image_file)
+    
+    if api_jobs:
+        print(f"\nRemoving backgrounds from {len(api_jobs)} images with remove.bg...")
+        results = remove_backgrounds_with_api(
+            [(input_path, final_path, data) for input_path, final_path, data, _ in api_jobs],
+            api_key, concurrency, rate
+        )
+        for result, (_, final_path, _, image_file) in zip(results, api_jobs):
+            report_processed(result["success"], final_path, image_file)
     
     print("=" * 50)
     print("Processing complete!")
     print("\nProcessed images are saved in: attached_assets/processed/")
-    print("\nTo use proper background removal:")
-    print("1. Get a free API key from https://www.remove.bg/")
-    print("2. Set REMOVE_BG_API_KEY in this script")
-    print("3. Run the script again")
+    if bg_engine == "local":
+        print("\nBackgrounds were removed offline. For photos on busy backgrounds:")
+        print("1. Get a free API key from https://www.remove.bg/")
+        print("2. Pass it with --with-api YOUR_API_KEY (or set REMOVE_BG_API_KEY in this script)")
+        print("3. Run the script again with --bg-engine api")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vualá Wrapper Image Processor")
+    parser.add_argument("--with-api", metavar="API_KEY", dest="api_key", default=REMOVE_BG_API_KEY,
+                        help="remove backgrounds with the remove.bg API")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel remove.bg uploads")
+    parser.add_argument("--rate", type=float, default=1.0, help="remove.bg requests per second")
+    parser.add_argument("--bg-engine", choices=BG_ENGINES, default=None,
+                        help="background remover to use (default: api with an API key, local otherwise)")
+    parser.add_argument("--detect-orientation", action="store_true", dest="detect",
+                        help="also rotate photos without EXIF orientation by the pixel heuristic")
+    add_jobs_argument(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    if args.bg_engine == "api" and not args.api_key:
+        parser.error("--bg-engine api requires --with-api API_KEY")
+    
     print("Vualá Wrapper Image Processor")
     print("=" * 50)
     
-    if len(sys.argv) > 1 and sys.argv[1] == "--with-api":
-        # User can provide API key as command line argument
-        if len(sys.argv) > 2:
-            REMOVE_BG_API_KEY = sys.argv[2]
-            print(f"Using remove.bg API key: {REMOVE_BG_API_KEY[:8]}...")
-        else:
-            print("Error: --with-api requires API key as second argument")
-            sys.exit(1)
+    if args.api_key and args.bg_engine != "local":
+        print(f"Using remove.bg API key: {args.api_key[:8]}...")
     
-    process_wrapper_images()
\ No newline at end of file
+    with profiled(args, "process_wrapper_images"):
+        process_wrapper_images(args.api_key, args.concurrency, args.rate, args.bg_engine, args.jobs, args.detect)
\ No newline at end of file
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Concurrent, rate-limited remove.bg client.
+
+- A token bucket keeps requests under the API rate limit
+- A thread pool keeps several uploads in flight at once
+- 429 and 5xx responses are retried with exponential backoff (honouring Retry-After)
+- Uploads are streamed from disk instead of being read into memory
+- One pooled requests.Session reuses connections across all uploads
+
+Run with --benchmark to measure throughput against the local stand-in
+server in fake_removebg_server.py without spending API credits:
+    python scripts/removebg_client.py --benchmark attached_assets/*.JPG
+"""
+
+import argparse
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+REMOVE_BG_URL = 'https://api.remove.bg/v1.0/removebg'
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CHUNK_SIZE = 64 * 1024
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class MultipartFileStream:
+    """File-like multipart/form-data body that streams one file from disk
+
+    requests sends objects with read() and a known length chunk by chunk,
+    so the image is never held in memory as a whole. When data is given
+    (an image already encoded in memory) it is sent instead of the file;
+    file_path then only names the upload.
+    """
+
+    def __init__(self, file_path, field_name='image_file', fields=None, data=None):
+        self.boundary = uuid.uuid4().hex
+        self.file_path = file_path
+        self.data = data
+
+        preamble = b''
+        for name, value in (fields or {}).items():
+            preamble += (
+                f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                f'{value}\r\n'
+            ).encode('utf-8')
+        filename = os.path.basename(file_path).replace('"', '')
+        preamble += (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode('utf-8')
+        self.preamble = preamble
+        self.epilogue = f'\r\n--{self.boundary}--\r\n'.encode('utf-8')
+        body_size = len(data) if data is not None else os.path.getsize(file_path)
+        self.length = len(self.preamble) + body_size + len(self.epilogue)
+        self._parts = None
+        self._buffer = b''
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        return self.length
+
+    def _generate(self):
+        yield self.preamble
+        if self.data is not None:
+            for start in range(0, len(self.data), CHUNK_SIZE):
+                yield self.data[start:start + CHUNK_SIZE]
+            yield self.epilogue
+            return
+        with open(self.file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                yield chunk
+        yield self.epilogue
+
+    def read(self, size=-1):
+        if self._parts is None:
+            self._parts = self._generate()
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._parts)
+            except StopIteration:
+                break
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+class RemoveBgClient:
+    """Pooled, rate-limited client for the remove.bg API"""
+
+    def __init__(self, api_key, url=REMOVE_BG_URL, concurrency=4, rate=1.0, burst=1,
+                 max_retries=5, backoff=1.0, max_backoff=60.0, timeout=60):
+        self.api_key = api_key
+        self.url = url
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _retry_delay(self, attempt, response=None):
+        """Seconds to wait before the next attempt"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return min(self.max_backoff, float(retry_after))
+                except ValueError:
+                    pass
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        # Full jitter keeps parallel workers from retrying in lockstep
+        return random.uniform(0, delay)
+
+    def remove_background(self, image_path, output_path, data=None):
+        """Upload one image (or its encoded bytes) and stream the cut-out PNG to output_path"""
+        result = {
+            "input_path": str(image_path),
+            "output_path": str(output_path),
+            "success": False,
+            "status": None,
+            "attempts": 0,
+            "error": None,
+        }
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            result["attempts"] = attempt + 1
+            response = None
+            try:
+                body = MultipartFileStream(str(image_path), fields={'size': 'auto'}, data=data)
+                response = self.session.post(
+                    self.url,
+                    data=body,
+                    headers={'X-Api-Key': self.api_key, 'Content-Type': body.content_type},
+                    timeout=self.timeout,
+                    stream=True
+                )
+                result["status"] = response.status_code
+                if response.status_code == 200:
+                    temp_path = str(output_path) + ".tmp"
+                    try:
+                        with open(temp_path, 'wb') as out_file:
+                            for chunk in response.iter_content(CHUNK_SIZE):
+                                out_file.write(chunk)
+                        os.replace(temp_path, output_path)
+                    except BaseException:
+                        # Never leave a partial download behind, whether it is retried or not
+                        if os.path.exists(temp_path):
+                            os.remove(temp_path)
+                        raise
+                    result["success"] = True
+                    result["error"] = None
+                    return result
+                result["error"] = f"{response.status_code} - {response.text[:200]}"
+                if response.status_code not in RETRY_STATUSES:
+                    return result
+            except requests.RequestException as e:
+                result["error"] = str(e)
+            except OSError as e:
+                # A missing or unreadable input (or an unwritable output) will not fix itself
+                result["error"] = str(e)
+                return result
+            finally:
+                if response is not None:
+                    response.close()
+
+            if attempt < self.max_retries:
+                time.sleep(self._retry_delay(attempt, response))
+        return result
+
+    def process_batch(self, jobs):
+        """Remove backgrounds for (input_path, output_path[, data]) jobs, yielding results in order"""
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(self.remove_background, *job) for job in jobs]
+            for future in futures:
+                yield future.result()
+
+
+def run_benchmark(image_paths, concurrency, rate, burst):
+    """Push images through the client against the local fake server"""
+    import tempfile
+    from fake_removebg_server import start_server
+
+    server, url = start_server()
+    try:
+        with tempfile.TemporaryDirectory() as output_dir, \
+                RemoveBgClient('benchmark', url=url, concurrency=concurrency, rate=rate, burst=burst,
+                               backoff=0.05) as client:
+            jobs = [(path, os.path.join(output_dir, f"{index}.png")) for index, path in enumerate(image_paths)]
+            start = time.perf_counter()
+            results = list(client.process_batch(jobs))
+            elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    succeeded = sum(1 for result in results if result["success"])
+    retries = sum(result["attempts"] - 1 for result in results)
+    print(f"📊 {succeeded}/{len(results)} images in {elapsed:.2f}s "
+          f"({len(results) / elapsed:.1f} images/s, {retries} retries)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent remove.bg client")
+    parser.add_argument("images", nargs="+", help="images to process")
+    parser.add_argument("--api-key", help="remove.bg API key")
+    parser.add_argument("--output-dir", default="attached_assets/processed")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=1.0, help="requests per second")
+    parser.add_argument("--burst", type=int, default=1)
+    parser.add_argument("--benchmark", action="store_true", help="run against the local fake server")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        run_benchmark(args.images, args.concurrency, args.rate, args.burst)
+        return
+    if not args.api_key:
+        parser.error("--api-key is required unless --benchmark is given")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = [
+        (path, os.path.join(args.output_dir, f"{os.path.splitext(os.path.basename(path))[0]}_processed.png"))
+        for path in args.images
+    ]
+    with RemoveBgClient(args.api_key, concurrency=args.concurrency, rate=args.rate, burst=args.burst) as client:
+        for result in client.process_batch(jobs):
+            if result["success"]:
+                print(f"Background removed: {result['input_path']} -> {result['output_path']}")
+            else:
+                print(f"API Error for {result['input_path']}: {result['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,22 +5,11 @@ These images already have transparent backgrounds removed
 """
 
 import os
-from PIL import Image
+from instrumentation import profiled
+from rotation_cache import RotationCache
+from rotation_engine import make_task, parse_args, rotate_batch
 
-def rotate_image_90_right(image_path, output_path):
-    """Rotate image 90 degrees clockwise (to the right)"""
-    try:
-        with Image.open(image_path) as img:
-            # Rotate 90 degrees clockwise (negative 90 degrees)
-            rotated = img.rotate(-90, expand=True)
-            rotated.save(output_path, 'PNG')
-            print(f"Rotated right: {image_path} -> {output_path}")
-            return True
-    except Exception as e:
-        print(f"Error rotating {image_path}: {e}")
-        return False
-
-def process_new_wrapper_images():
+def process_new_wrapper_images(jobs=None, cache=None):
     """Process all new wrapper images"""
     
     input_dir = "attached_assets"
@@ -54,6 +43,7 @@ def process_new_wrapper_images():
     print(f"Processing {len(new_wrapper_images)} new wrapper images...")
     print("=" * 50)
     
+    tasks = []
     for image_file in new_wrapper_images:
         input_path = os.path.join(input_dir, image_file)
         
@@ -65,12 +55,18 @@ def process_new_wrapper_images():
         name, ext = os.path.splitext(image_file)
         output_path = os.path.join(output_dir, f"{name}_rotated.png")
         
-        # Rotate image 90 degrees to the right
-        success = rotate_image_90_right(input_path, output_path)
-        
-        if success:
+        # Rotate 90 degrees clockwise (to the right)
+        tasks.append(make_task(input_path, output_path, -90, 'PNG'))
+    
+    for result in rotate_batch(tasks, jobs, cache):
+        image_file = os.path.basename(result["input_path"])
+        if result["cached"]:
+            print(f"  ↺ Already rotated: {image_file}")
+        elif result["success"]:
+            print(f"Rotated right: {result['input_path']} -> {result['output_path']}")
             print(f"  ✅ Successfully rotated: {image_file}")
         else:
+            print(f"Error rotating {result['input_path']}: {result['error']}")
             print(f"  ❌ Failed to rotate: {image_file}")
     
     print("=" * 50)
@@ -78,6 +74,8 @@ def process_new_wrapper_images():
     print(f"Rotated images saved in: {output_dir}")
 
 if __name__ == "__main__":
+    args = parse_args("Rotate new Vualá wrapper images 90 degrees to the right")
     print("New Vualá Wrapper Image Rotator")
     print("=" * 50)
-    process_new_wrapper_images()
\ No newline at end of file
+    with profiled(args, "rotate_new_wrapper_images"):
+        process_new_wrapper_images(args.jobs, None if args.force else RotationCache.load())
\ No newline at end of file
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Persistent cache for rotation outputs.
+
+Maps (source content hash, angle, output format) to the files already
+rendered from it, so re-running a batch script skips every image whose
+output is still on disk and unchanged. The manifest lives in
+attached_assets/rotation_cache.json.
+"""
+
+import json
+import os
+import shutil
+from asset_store import ASSETS_DIR, hash_file
+
+CACHE_FILE = os.path.join(ASSETS_DIR, "rotation_cache.json")
+
+
+def _stat_entry(path):
+    """Size and mtime used to check that a file has not changed"""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def cache_key(task, source_sha256):
+    """Cache key for a rotation task
+
+    Besides hash, angle and format the key includes the options that change
+    the rendered output (mode conversion, flattening and the encoder's
+    save options, serialized with sorted keys so their order never matters).
+    """
+    angle = task["degrees"] % 360
+    image_format = task["format"] or os.path.splitext(task["output_path"])[1].lstrip('.').upper()
+    variant = "flatten" if task["flatten"] else task["mode"] or "native"
+    if angle == 0 and task["copy_if_unrotated"] and not task["flatten"]:
+        # A copy only happens when the source already matches; the source hash decides
+        variant = f"copy-{variant}"
+    key = f"{source_sha256}:{angle}:{image_format}:{variant}"
+    if task["save_options"]:
+        # Bytes values such as an ICC profile fall back to their repr
+        key += ":" + json.dumps(task["save_options"], sort_keys=True, separators=(',', ':'), default=repr)
+    return key
+
+
+class RotationCache:
+    """Manifest of rendered rotations keyed by source content"""
+
+    def __init__(self, cache_file=CACHE_FILE, entries=None, sources=None):
+        self.cache_file = cache_file
+        self.entries = entries or {}
+        # Source hashes memoised by path, size and mtime so unchanged files are not re-read
+        self.sources = sources or {}
+
+    @classmethod
+    def load(cls, cache_file=CACHE_FILE):
+        """Load the cache manifest, or start an empty one"""
+        if os.path.exists(cache_file):
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return cls(cache_file, data.get("entries"), data.get("sources"))
+        return cls(cache_file)
+
+    def save(self):
+        """Write the cache manifest to disk"""
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump({"entries": self.entries, "sources": self.sources}, f, indent=2, ensure_ascii=False)
+
+    def source_hash(self, path):
+        """Content hash of a source file, re-hashing only when its stat changed"""
+        stat = _stat_entry(path)
+        known = self.sources.get(path)
+        if known and known["size"] == stat["size"] and known["mtime_ns"] == stat["mtime_ns"]:
+            return known["sha256"]
+        sha256, _ = hash_file(path)
+        self.sources[path] = dict(stat, sha256=sha256)
+        return sha256
+
+    def _valid_outputs(self, key):
+        """Outputs recorded for key that are still unchanged on disk"""
+        valid = {}
+        for path, recorded in self.entries.get(key, {}).items():
+            if os.path.exists(path) and _stat_entry(path) == recorded:
+                valid[path] = recorded
+        return valid
+
+    def lookup(self, task):
+        """Return True if the task's output is already available
+
+        When the same rotation was rendered to another path, that file is
+        copied to the task's output instead of rendering it again.
+        """
+        if not os.path.exists(task["input_path"]):
+            return False
+        key = cache_key(task, self.source_hash(task["input_path"]))
+        valid = self._valid_outputs(key)
+        if task["output_path"] in valid:
+            return True
+        if valid:
+            temp_path = task["output_path"] + ".tmp"
+            shutil.copy2(next(iter(valid)), temp_path)
+            os.replace(temp_path, task["output_path"])
+            self.store(task)
+            return True
+        return False
+
+    def refresh(self, paths):
+        """Re-record outputs that were rewritten in place with the same pixels (e.g. recompressed)"""
+        paths = set(paths)
+        for outputs in self.entries.values():
+            for path in paths.intersection(outputs):
+                if os.path.exists(path):
+                    outputs[path] = _stat_entry(path)
+
+    def store(self, task):
+        """Record the task's freshly written output"""
+        key = cache_key(task, self.source_hash(task["input_path"]))
+        outputs = self._valid_outputs(key)
+        outputs[task["output_path"]] = _stat_entry(task["output_path"])
+        self.entries[key] = outputs
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Shared rotation engine for the wrapper batch scripts.
+Rotates images in a process pool so a full re-run over attached_assets
+scales with the number of cores. Every script exposes it through --jobs N.
+Outputs already recorded in the rotation cache are skipped unless --force
+is given.
+"""
+
+import argparse
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from instrumentation import add_profile_arguments, measure, tracer
+from jpeg_lossless import rotate_jpeg_lossless
+
+
+def default_jobs():
+    """Number of worker processes used when --jobs is not given"""
+    return os.cpu_count() or 1
+
+
+def add_jobs_argument(parser):
+    """Add the shared --jobs flag to an argparse parser"""
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=default_jobs(),
+        help=f"number of worker processes (default: {default_jobs()})"
+    )
+    return parser
+
+
+def parse_args(description, argv=None):
+    """Parse the command line of a batch script that only takes --jobs and --force"""
+    parser = argparse.ArgumentParser(description=description)
+    add_jobs_argument(parser)
+    parser.add_argument('--force', action='store_true',
+                        help="ignore the rotation cache and render every image again")
+    add_profile_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def make_task(input_path, output_path, degrees, image_format=None, mode=None,
+              flatten=False, copy_if_unrotated=False, save_options=None):
+    """Describe one rotation job
+
+    image_format: format passed to Image.save (None infers it from the extension)
+    mode: convert to this mode before rotating (e.g. 'RGBA')
+    flatten: paste RGBA/LA images onto a white background first
+    copy_if_unrotated: copy the file byte for byte when degrees is 0 and the
+        source already has the requested format and mode (and no flatten is
+        asked for); otherwise it is re-encoded
+    """
+    return {
+        "input_path": str(input_path),
+        "output_path": str(output_path),
+        "degrees": degrees,
+        "format": image_format,
+        "mode": mode,
+        "flatten": flatten,
+        "copy_if_unrotated": copy_if_unrotated,
+        "save_options": dict(save_options or {}),
+    }
+
+
+def _flatten_on_white(img):
+    """Paste an image with alpha onto a white RGB background"""
+    background = Image.new('RGB', img.size, (255, 255, 255))
+    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+    return background
+
+
+def rotate_task(task):
+    """Run a single rotation job and return its result
+
+    Runs inside the worker processes, so it never prints: the calling
+    script reports each result in its own format.
+    """
+    result = {
+        "input_path": task["input_path"],
+        "output_path": task["output_path"],
+        "degrees": task["degrees"],
+        "copied": False,
+        "cached": False,
+        "lossless": None,
+        "success": False,
+        "error": None,
+        "trace": [],
+    }
+    try:
+        _render(task, result, result["trace"])
+        result["success"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def _output_format(task):
+    """Pillow format of the task's output, from the task or the output extension"""
+    return task["format"] or Image.registered_extensions().get(os.path.splitext(task["output_path"])[1].lower())
+
+
+def _copyable(task):
+    """Whether the source already is the requested output, so a byte copy is enough"""
+    if task["flatten"]:
+        return False
+    with Image.open(task["input_path"]) as img:
+        return img.format == _output_format(task) and (not task["mode"] or img.mode == task["mode"])
+
+
+def _render(task, result, trace):
+    name = os.path.basename(task["input_path"])
+    # Outputs are replaced rather than rewritten, so a hard-linked output never changes its siblings
+    temp_path = task["output_path"] + ".tmp"
+    if task["degrees"] == 0 and task["copy_if_unrotated"] and _copyable(task):
+        with measure("copy", trace=trace, file=name):
+            shutil.copy2(task["input_path"], temp_path)
+            os.replace(temp_path, task["output_path"])
+        result["copied"] = True
+        return
+    if not task["flatten"] and not task["mode"] and task["format"] in (None, 'JPEG'):
+        with measure("lossless rotate", trace=trace, file=name):
+            lossless = rotate_jpeg_lossless(task["input_path"], task["output_path"], task["degrees"])
+        if lossless:
+            # JPEG to JPEG quarter turns never need a decode/re-encode
+            result["lossless"] = True
+            return
+    with Image.open(task["input_path"]) as img:
+        with measure("decode", trace=trace, file=name):
+            img.load()
+            if task["flatten"] and img.mode in ('RGBA', 'LA'):
+                img = _flatten_on_white(img)
+            elif task["mode"] and img.mode != task["mode"]:
+                img = img.convert(task["mode"])
+
+        if task["degrees"] != 0:
+            with measure("rotate", trace=trace, file=name, degrees=task["degrees"]):
+                img = img.rotate(task["degrees"], expand=True)
+        with measure("encode", trace=trace, file=name, format=task["format"]):
+            img.save(temp_path, _output_format(task), **task["save_options"])
+            os.replace(temp_path, task["output_path"])
+
+
+def _cached_result(task):
+    """Result reported for a task served from the rotation cache"""
+    return {
+        "input_path": task["input_path"],
+        "output_path": task["output_path"],
+        "degrees": task["degrees"],
+        "copied": False,
+        "cached": True,
+        "lossless": None,
+        "success": True,
+        "error": None,
+        "trace": None,
+    }
+
+
+def rotate_batch(tasks, jobs=None, cache=None):
+    """Rotate every task across a process pool, yielding results in task order
+
+    When a RotationCache is given, tasks whose output is still valid are
+    reported as cached without touching the image, and fresh outputs are
+    recorded as they complete. The manifest is saved when the batch ends.
+    Tasks that rotate a file
+    in place are never cached since they are not idempotent.
+    """
+    tasks = list(tasks)
+    if jobs is None:
+        jobs = default_jobs()
+
+    cached = set()
+    if cache is not None:
+        for index, task in enumerate(tasks):
+            if task["input_path"] != task["output_path"] and cache.lookup(task):
+                cached.add(index)
+    pending = [task for index, task in enumerate(tasks) if index not in cached]
+
+    if jobs <= 1 or len(pending) <= 1:
+        executor = None
+        pending_results = map(rotate_task, pending)
+    else:
+        executor = ProcessPoolExecutor(max_workers=min(jobs, len(pending)))
+        pending_results = executor.map(rotate_task, pending)
+
+    try:
+        for index, task in enumerate(tasks):
+            if index in cached:
+                yield _cached_result(task)
+                continue
+            result = next(pending_results)
+            if cache is not None and result["success"] and task["input_path"] != task["output_path"]:
+                cache.store(task)
+            tracer.add(result["trace"])
+            yield result
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if cache is not None:
+            cache.save()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Canonical seed dataset for brands, promotions and promotion items.
+
+All catalogue data used to live as TypeScript literals inside
+MemStorage.seedData, so every batch update was a rewrite of
+server/storage.ts. This module owns the same data as NDJSON files (one
+JSON record per line, so diffs stay per-record):
+
+    server/seed/brands.ndjson
+    server/seed/promotions.ndjson
+    server/seed/promotion_items.ndjson
+
+Every record has a stable "key" (the variable name it had in storage.ts).
+Promotions point at their brand with "brand", items at their promotion
+with "promotion". Ids and createdAt are generated at startup by
+server/seedData.ts, which MemStorage uses whenever these files exist.
+
+    python scripts/seed_data.py export   # extract the storage.ts literals once
+    python scripts/seed_data.py check    # validate references
+
+Batch scripts then edit records through SeedDataset, e.g.
+
+    dataset = SeedDataset.load()
+    promotion = dataset.find('promotions', slug='minions')
+    dataset.append_unique('promotions', promotion['key'], 'wrapperPhotosUrls', [url])
+    dataset.save()
+"""
+
+import argparse
+import json
+import os
+import sys
+from storage_ts import StorageFile, parse_value
+
+SEED_DIR = 'server/seed'
+TABLE_FILES = {
+    'brands': 'brands.ndjson',
+    'promotions': 'promotions.ndjson',
+    'promotion_items': 'promotion_items.ndjson',
+}
+# storage.ts type and Map for each table
+TABLE_SOURCES = {
+    'brands': ('Brand', 'brands'),
+    'promotions': ('Promotion', 'promotions'),
+    'promotion_items': ('PromotionItem', 'promotionItems'),
+}
+# Columns from shared/schema.ts, in order, with the value used when a literal omits them
+TABLE_FIELDS = {
+    'brands': {
+        'name': None, 'slug': None, 'description': None, 'logoUrl': None,
+        'primaryColor': None, 'founded': None,
+    },
+    'promotions': {
+        'brand': None, 'name': None, 'slug': None, 'description': None, 'imageUrl': None,
+        'wrapperPhotoUrl': None, 'wrapperPhotosUrls': None, 'promotionImagesUrls': None,
+        'youtubeCommercialUrl': None, 'buffetGamesVideoUrl': None,
+        'startYear': None, 'endYear': None, 'category': None,
+    },
+    'promotion_items': {
+        'promotion': None, 'name': None, 'description': None, 'imageUrl': None,
+        'rarity': None, 'itemNumber': None, 'metadata': None,
+    },
+}
+# Foreign keys: literal property -> (record field, referenced table)
+REFERENCES = {
+    'brandId': ('brand', 'brands'),
+    'promotionId': ('promotion', 'promotions'),
+}
+GENERATED_FIELDS = ('id', 'createdAt')
+
+
+def asset_url(module_path):
+    """Site URL of an image imported through the @assets alias"""
+    if module_path.startswith('@assets/'):
+        return '/attached_assets/' + module_path[len('@assets/'):]
+    return module_path
+
+
+class SeedDataset:
+    """Keyed records for every seed table, loaded from and saved to NDJSON"""
+
+    def __init__(self, tables=None, seed_dir=SEED_DIR):
+        self.seed_dir = seed_dir
+        self.tables = {table: dict((tables or {}).get(table, {})) for table in TABLE_FILES}
+        self._indexes = {}
+
+    @classmethod
+    def load(cls, seed_dir=SEED_DIR):
+        tables = {}
+        for table, filename in TABLE_FILES.items():
+            records = {}
+            path = os.path.join(seed_dir, filename)
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            record = json.loads(line)
+                            records[record['key']] = record
+            tables[table] = records
+        return cls(tables, seed_dir)
+
+    @staticmethod
+    def exists(seed_dir=SEED_DIR):
+        return os.path.exists(os.path.join(seed_dir, TABLE_FILES['promotions']))
+
+    def save(self):
+        """Write every table, replacing each file atomically"""
+        os.makedirs(self.seed_dir, exist_ok=True)
+        for table, filename in TABLE_FILES.items():
+            path = os.path.join(self.seed_dir, filename)
+            temp_path = path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for record in self.tables[table].values():
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            os.replace(temp_path, path)
+
+    # Lookups
+
+    def get(self, table, key):
+        return self.tables[table].get(key)
+
+    def _index(self, table, field):
+        """field value -> key for a table, built on first use (first record wins)"""
+        index = self._indexes.get((table, field))
+        if index is None:
+            index = {}
+            for key, record in self.tables[table].items():
+                index.setdefault(record.get(field), key)
+            self._indexes[(table, field)] = index
+        return index
+
+    def find(self, table, **fields):
+        """First record matching one field, e.g. find('promotions', slug='minions')"""
+        (field, value), = fields.items()
+        key = self._index(table, field).get(value)
+        return self.tables[table].get(key) if key is not None else None
+
+    # Updates
+
+    def upsert(self, table, record):
+        """Insert a record or merge fields into the existing one with the same key"""
+        key = record['key']
+        existing = self.tables[table].get(key)
+        if existing is None:
+            merged = {'key': key, **TABLE_FIELDS[table]}
+            merged.update(record)
+            self.tables[table][key] = merged
+        else:
+            existing.update(record)
+            merged = existing
+        self._indexes = {index: value for index, value in self._indexes.items() if index[0] != table}
+        return merged
+
+    def append_unique(self, table, key, field, values):
+        """Append values to a list field, skipping ones already present; returns the added values"""
+        record = self.tables[table][key]
+        current = list(record.get(field) or [])
+        added = [value for value in dict.fromkeys(values) if value not in current]
+        if added:
+            record[field] = current + added
+        return added
+
+    def delete(self, table, key):
+        removed = self.tables[table].pop(key, None)
+        self._indexes = {index: value for index, value in self._indexes.items() if index[0] != table}
+        return removed
+
+    def check(self):
+        """Problems with the dataset: dangling references and duplicate slugs"""
+        problems = []
+        for table, fields in (('promotions', ('brand', 'brands')), ('promotion_items', ('promotion', 'promotions'))):
+            field, target = fields
+            for key, record in self.tables[table].items():
+                if record.get(field) not in self.tables[target]:
+                    problems.append(f"{table}/{key}: unknown {field} {record.get(field)!r}")
+        for table in ('brands', 'promotions'):
+            seen = {}
+            for key, record in self.tables[table].items():
+                slug = record.get('slug')
+                if slug in seen:
+                    problems.append(f"{table}/{key}: slug {slug!r} already used by {seen[slug]}")
+                seen.setdefault(slug, key)
+        return problems
+
+
+def export_storage(storage):
+    """Build a SeedDataset from the seed literals in storage.ts"""
+    imports = {}
+    for start, end, names in storage.imports:
+        statement = storage.text[start:end]
+        module = parse_value(statement[statement.rindex('from') + 4:].rstrip(';').strip())
+        for name in names:
+            imports[name] = asset_url(module)
+
+    def resolve(expression):
+        if expression in imports:
+            return imports[expression]
+        raise ValueError(f"Cannot export non-literal value {expression!r}")
+
+    dataset = SeedDataset()
+    for table, (type_name, map_name) in TABLE_SOURCES.items():
+        seeded = {call["var"] for call in storage.set_calls if call["map"] == map_name}
+        for block in storage.of_type(type_name):
+            if block.var_name not in seeded:
+                continue
+            record = {'key': block.var_name, **TABLE_FIELDS[table]}
+            for key, prop in block.properties.items():
+                if key in GENERATED_FIELDS:
+                    continue
+                if key in REFERENCES:
+                    field, _ = REFERENCES[key]
+                    record[field] = prop.source[:-len('.id')] if prop.source.endswith('.id') else prop.source
+                    continue
+                try:
+                    record[key] = parse_value(prop.source, resolve)
+                except ValueError as e:
+                    raise ValueError(f"{block.var_name}.{key}: {e}") from None
+            dataset.tables[table][block.var_name] = record
+    return dataset
+
+
+def load_site_dataset(seed_dir=SEED_DIR):
+    """The seed dataset, or the literals of storage.ts when it has not been exported yet"""
+    if SeedDataset.exists(seed_dir):
+        return SeedDataset.load(seed_dir)
+    return export_storage(StorageFile.load())
+
+
+def require_storage_ts(script, alternative="scripts/pipeline.py with a batch spec"):
+    """Exit when the seed dataset exists, for scripts that can only edit storage.ts
+
+    MemStorage reads only the NDJSON files once they exist, so an edit to
+    the storage.ts literals would silently never reach the site.
+    """
+    if SeedDataset.exists():
+        sys.exit(f"✗ {script} edits server/storage.ts, but the site now loads {SEED_DIR}; "
+                 f"use {alternative} instead")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and check the NDJSON seed dataset")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="extract the seed literals from server/storage.ts")
+    export_parser.add_argument("--force", action="store_true", help="overwrite an existing dataset")
+    subparsers.add_parser("check", help="validate references and slugs")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        if SeedDataset.exists() and not args.force:
+            parser.error(f"{SEED_DIR} already holds a dataset; pass --force to overwrite it")
+        dataset = export_storage(StorageFile.load())
+        dataset.save()
+        for table, records in dataset.tables.items():
+            print(f"✓ {len(records)} {table} -> {os.path.join(SEED_DIR, TABLE_FILES[table])}")
+    else:
+        dataset = SeedDataset.load()
+
+    problems = dataset.check()
+    for problem in problems:
+        print(f"⚠️  {problem}")
+    print(f"📊 {sum(len(records) for records in dataset.tables.values())} records, {len(problems)} problems")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Sprite atlases of the promotion-card wrapper thumbnails.
+
+The promotions listing and the brand pages draw every promotion's
+wrapperPhotoUrl in an 80x96 box, and each one is a separate request for
+a full-size PNG. This script renders all those card thumbnails (at 2x,
+fitted inside the box) and packs them into one WebP atlas per page:
+
+    attached_assets/sprites/promotions.webp     every promotion (listing page)
+    attached_assets/sprites/<brand-slug>.webp   the promotions of one brand
+
+with a coordinate map keyed by promotion slug in vuala_sprites.json:
+
+    {
+      "promotions": {
+        "url": "/attached_assets/sprites/promotions.webp?v=3f2a9c0d41b7",
+        "width": 1024, "height": 788, "scale": 2,
+        "sprites": {"minions": {"x": 0, "y": 0, "width": 144, "height": 192, ...}, ...}
+      }
+    }
+
+Coordinates are atlas pixels; divide them (and the atlas size, for
+background-size) by "scale" to get CSS pixels.
+
+Thumbnails are packed with MaxRects (best short side fit) into a fixed
+width. Rebuilds are incremental: a thumbnail is rendered once per source
+content hash into attached_assets/.sprites/, sprites whose source did not
+change keep their place in the atlas, and only new or changed ones are
+packed into the free space left around them. The atlas is repacked from
+scratch when the holes waste too much of it, and is only re-encoded when
+its layout changed.
+
+Usage:
+    python scripts/sprite_atlas.py [--atlas brand page] [--width 1024] [--force] [--jobs N]
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+from asset_store import ASSETS_DIR, update_index
+from derivatives import DEFAULT_WIDTHS, derivative_path, url_to_path
+from rotation_engine import add_jobs_argument
+from seed_data import load_site_dataset
+from wrapper_catalog import WrapperCatalog
+
+SPRITES_DIR = os.path.join(ASSETS_DIR, "sprites")
+SPRITE_CACHE_DIR = os.path.join(ASSETS_DIR, ".sprites")
+MAP_FILE = os.path.join(ASSETS_DIR, "vuala_sprites.json")
+# The thumbnail box of a promotion card, in CSS pixels, and the pixel density rendered
+CARD_SIZE = (80, 96)
+SCALE = 2
+ATLAS_WIDTH = 1024
+# Transparent gap around every sprite, so filtering never bleeds a neighbour in
+SPRITE_PADDING = 2
+# Repack from scratch when sprites cover less than this share of the atlas
+REPACK_FILL = 0.6
+ATLAS_SAVE_OPTIONS = {"format": "WEBP", "quality": 85, "method": 6}
+# Atlas groupings: one per brand, and one for the whole promotions listing
+ATLAS_KINDS = ("brand", "page")
+PAGE_ATLAS = "promotions"
+
+
+class MaxRectsPacker:
+    """MaxRects bin packing into a fixed width that grows downward
+
+    free holds the maximal free rectangles as (x, y, width, height).
+    occupy() marks a rectangle as used (e.g. a sprite kept from the last
+    layout); insert() places a new one with the best short side fit,
+    growing the height when nothing fits.
+    """
+
+    def __init__(self, width):
+        self.width = width
+        self.height = 0
+        self.free = []
+
+    def occupy(self, rect):
+        x, y, width, height = rect
+        if y + height > self.height:
+            self._grow(y + height - self.height)
+        split = []
+        for free in self.free:
+            split.extend(_split(free, rect))
+        self.free = _prune(split)
+
+    def insert(self, width, height):
+        """Top-left corner for a width x height rectangle, which is then occupied"""
+        if width > self.width:
+            raise ValueError(f"Sprite of width {width} does not fit an atlas of width {self.width}")
+        best = self._best_fit(width, height)
+        if best is None:
+            # Grow just enough for the lowest hole that is wide enough to reach it
+            reach = max((free_height for x, y, free_width, free_height in self.free
+                         if y + free_height == self.height and free_width >= width), default=0)
+            self._grow(height - reach)
+            best = self._best_fit(width, height)
+        self.occupy((best[0], best[1], width, height))
+        return best
+
+    def _best_fit(self, width, height):
+        best = None
+        best_key = None
+        for x, y, free_width, free_height in self.free:
+            if free_width >= width and free_height >= height:
+                leftover = (free_width - width, free_height - height)
+                key = (min(leftover), max(leftover), y, x)
+                if best_key is None or key < best_key:
+                    best, best_key = (x, y), key
+        return best
+
+    def _grow(self, extra):
+        """Extend the atlas downward; free rectangles touching the bottom extend with it"""
+        grown = [(x, y, width, height + extra) if y + height == self.height else (x, y, width, height)
+                 for x, y, width, height in self.free]
+        grown.append((0, self.height, self.width, extra))
+        self.height += extra
+        self.free = _prune(grown)
+
+
+def _split(free, used):
+    """Free rectangle minus a used one, as up to four maximal rectangles"""
+    fx, fy, fw, fh = free
+    ux, uy, uw, uh = used
+    if ux >= fx + fw or ux + uw <= fx or uy >= fy + fh or uy + uh <= fy:
+        return [free]
+    parts = []
+    if ux > fx:
+        parts.append((fx, fy, ux - fx, fh))
+    if ux + uw < fx + fw:
+        parts.append((ux + uw, fy, fx + fw - ux - uw, fh))
+    if uy > fy:
+        parts.append((fx, fy, fw, uy - fy))
+    if uy + uh < fy + fh:
+        parts.append((fx, uy + uh, fw, fy + fh - uy - uh))
+    return parts
+
+
+def _prune(rects):
+    """Drop rectangles contained in another one"""
+    rects = list(dict.fromkeys(rect for rect in rects if rect[2] > 0 and rect[3] > 0))
+    return [
+        rect for i, rect in enumerate(rects)
+        if not any(i != j and _contains(other, rect) for j, other in enumerate(rects))
+    ]
+
+
+def _contains(outer, inner):
+    return (outer[0] <= inner[0] and outer[1] <= inner[1]
+            and outer[0] + outer[2] >= inner[0] + inner[2] and outer[1] + outer[3] >= inner[1] + inner[3])
+
+
+def pack(sizes, width, placed=None):
+    """Positions {key: (x, y)} for {key: (width, height)}, keeping the given placed positions
+
+    Sizes include the padding. Returns (positions, atlas height).
+    """
+    packer = MaxRectsPacker(width)
+    positions = {}
+    for key, (x, y) in (placed or {}).items():
+        packer.occupy((x, y) + sizes[key])
+        positions[key] = (x, y)
+    pending = sorted((key for key in sizes if key not in positions),
+                     key=lambda key: (max(sizes[key]), sizes[key][0] * sizes[key][1]), reverse=True)
+    for key in pending:
+        positions[key] = packer.insert(*sizes[key])
+    return positions, packer.height
+
+
+# Thumbnails
+
+def box_size(scale=SCALE):
+    return CARD_SIZE[0] * scale, CARD_SIZE[1] * scale
+
+
+def thumbnail_path(sha256, box, cache_dir=SPRITE_CACHE_DIR):
+    return os.path.join(cache_dir, f"{sha256}-{box[0]}x{box[1]}.png")
+
+
+def thumbnail_source(path, width):
+    """The smallest fresh derivative of an image at least width wide, or the image itself"""
+    mtime = os.path.getmtime(path)
+    for derivative_width in sorted(DEFAULT_WIDTHS):
+        if derivative_width < width:
+            continue
+        for image_format in ("webp", "png"):
+            candidate = derivative_path(path, derivative_width, image_format)
+            if os.path.exists(candidate) and os.path.getmtime(candidate) >= mtime:
+                return candidate
+    return path
+
+
+def make_thumbnail(source_path, output_path, box):
+    """Fit an image inside box (object-fit: contain, never upscaled) and cache it as PNG"""
+    result = {
+        "source_path": source_path,
+        "output_path": output_path,
+        "success": False,
+        "error": None,
+    }
+    try:
+        with Image.open(thumbnail_source(source_path, box[0])) as img:
+            # JPEG sources decode straight at a reduced DCT scale
+            img.draft('RGB', box)
+            img = ImageOps.exif_transpose(img).convert('RGBA')
+        img.thumbnail(box, Image.LANCZOS, reducing_gap=2.0)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        temp_path = output_path + '.tmp'
+        img.save(temp_path, 'PNG')
+        os.replace(temp_path, output_path)
+        result["success"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def _make_thumbnail(args):
+    return make_thumbnail(*args)
+
+
+def generate_thumbnails(jobs_list, box, jobs=None):
+    """Render (source_path, output_path) pairs in a process pool, yielding results in order"""
+    work = [(source_path, output_path, box) for source_path, output_path in jobs_list]
+    if (jobs is not None and jobs <= 1) or len(work) <= 1:
+        yield from map(_make_thumbnail, work)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(_make_thumbnail, work)
+
+
+# Atlases
+
+def atlas_sources(dataset, kinds=ATLAS_KINDS):
+    """{atlas name: {promotion slug: wrapperPhotoUrl}} for the local card images, in dataset order"""
+    atlases = {}
+    for record in dataset.tables['promotions'].values():
+        url = record.get('wrapperPhotoUrl')
+        if not url or not url.startswith(f"/{ASSETS_DIR}/") or not os.path.exists(url_to_path(url)):
+            continue
+        if "page" in kinds:
+            atlases.setdefault(PAGE_ATLAS, {})[record['slug']] = url
+        brand = dataset.get('brands', record.get('brand'))
+        if "brand" in kinds and brand is not None:
+            atlases.setdefault(brand['slug'], {})[record['slug']] = url
+    return atlases
+
+
+def layout_atlas(sprites, previous, width, padding=SPRITE_PADDING):
+    """Positions of the sprites, keeping the previous ones whose thumbnail is unchanged
+
+    sprites maps slug -> {"sha256", "width", "height", ...}; previous is
+    the atlas's last map entry (or None). Returns (positions, height,
+    repacked).
+    """
+    sizes = {slug: (sprite["width"] + 2 * padding, sprite["height"] + 2 * padding) for slug, sprite in sprites.items()}
+    placed = {}
+    if previous is not None and previous["width"] == width:
+        for slug, old in previous["sprites"].items():
+            sprite = sprites.get(slug)
+            if (sprite is not None and old["sha256"] == sprite["sha256"]
+                    and (old["width"], old["height"]) == (sprite["width"], sprite["height"])):
+                placed[slug] = (old["x"] - padding, old["y"] - padding)
+
+    positions, height = pack(sizes, width, placed)
+    used = sum(w * h for w, h in sizes.values())
+    if placed and height and used / (width * height) < REPACK_FILL:
+        repacked, repacked_height = pack(sizes, width)
+        if repacked_height < height:
+            return repacked, repacked_height, True
+    return positions, height, False
+
+
+def render_atlas(sprites, height, width, output_path):
+    """Paste the cached thumbnails into one WebP; returns its version (content hash prefix)"""
+    atlas = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    for sprite in sprites.values():
+        with Image.open(sprite["thumbnail"]) as thumbnail:
+            atlas.paste(thumbnail, (sprite["x"], sprite["y"]))
+    buffer = io.BytesIO()
+    atlas.save(buffer, **ATLAS_SAVE_OPTIONS)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    temp_path = output_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(temp_path, output_path)
+    return hashlib.sha256(buffer.getvalue()).hexdigest()[:12]
+
+
+def load_map(map_file=MAP_FILE):
+    if not os.path.exists(map_file):
+        return {}
+    with open(map_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_map(sprite_map, map_file=MAP_FILE):
+    with open(map_file, 'w', encoding='utf-8') as f:
+        json.dump(sprite_map, f, indent=2, ensure_ascii=False)
+
+
+def update_atlases(kinds=ATLAS_KINDS, width=ATLAS_WIDTH, jobs=None, force=False, map_file=MAP_FILE):
+    """Render missing thumbnails, then re-pack and re-encode every atlas whose sprites changed
+
+    Yields a result per atlas; the map is saved once the batch ends.
+    """
+    box = box_size()
+    atlases = atlas_sources(load_site_dataset(), kinds)
+    urls = list(dict.fromkeys(url for sources in atlases.values() for url in sources.values()))
+
+    with WrapperCatalog.open() as catalog:
+        catalog.hashes, _ = update_index(jobs=jobs)
+        hashes = {url: catalog.content_hash(url)[0] for url in urls}
+
+    # Each source is rendered once, whatever the number of atlases showing it
+    thumbnails = {url: thumbnail_path(hashes[url], box) for url in urls}
+    pending = [url for url in urls if force or not os.path.exists(thumbnails[url])]
+    failed = {}
+    for url, result in zip(pending, generate_thumbnails([(url_to_path(url), thumbnails[url]) for url in pending],
+                                                        box, jobs)):
+        if not result["success"]:
+            failed[url] = result["error"]
+
+    sprite_map = load_map(map_file)
+    try:
+        for name, sources in atlases.items():
+            sprites = {}
+            for slug, url in sources.items():
+                if url in failed:
+                    continue
+                with Image.open(thumbnails[url]) as thumbnail:
+                    sprites[slug] = {"source": url, "sha256": hashes[url], "thumbnail": thumbnails[url],
+                                     "width": thumbnail.width, "height": thumbnail.height}
+
+            previous = None if force else sprite_map.get(name)
+            positions, height, repacked = layout_atlas(sprites, previous, width)
+            for slug, (x, y) in positions.items():
+                sprites[slug]["x"], sprites[slug]["y"] = x + SPRITE_PADDING, y + SPRITE_PADDING
+            entry_sprites = {
+                slug: {field: sprite[field] for field in ("x", "y", "width", "height", "source", "sha256")}
+                for slug, sprite in sprites.items()
+            }
+
+            output_path = os.path.join(SPRITES_DIR, f"{name}.webp")
+            old_sprites = previous["sprites"] if previous is not None else {}
+            result = {
+                "name": name,
+                "path": output_path,
+                "sprites": len(sprites),
+                "kept": sum(1 for slug, sprite in entry_sprites.items() if old_sprites.get(slug) == sprite),
+                "repacked": repacked,
+                "failed": {slug: failed[url] for slug, url in sources.items() if url in failed},
+                "written": False,
+            }
+            if not sprites or (previous is not None and old_sprites == entry_sprites
+                               and previous["height"] == height and os.path.exists(output_path)):
+                yield result
+                continue
+
+            version = render_atlas(sprites, height, width, output_path)
+            result["written"] = True
+            sprite_map[name] = {
+                "url": '/' + output_path.replace(os.sep, '/') + f"?v={version}",
+                "width": width,
+                "height": height,
+                "scale": SCALE,
+                "sprites": entry_sprites,
+            }
+            yield result
+    finally:
+        save_map(sprite_map, map_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack promotion-card thumbnails into WebP sprite atlases")
+    parser.add_argument("--atlas", nargs="+", choices=ATLAS_KINDS, default=list(ATLAS_KINDS),
+                        help="atlases to build: one per brand, and/or one for the promotions page (default: both)")
+    parser.add_argument("--width", type=int, default=ATLAS_WIDTH, help=f"atlas width in pixels (default: {ATLAS_WIDTH})")
+    parser.add_argument("--force", action="store_true", help="re-render every thumbnail and repack every atlas")
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    print("Building sprite atlases...")
+    written = 0
+    for result in update_atlases(args.atlas, args.width, args.jobs, args.force):
+        for slug, error in result["failed"].items():
+            print(f"✗ Error rendering {slug}: {error}")
+        if not result["written"]:
+            print(f"↺ {result['name']}: {result['sprites']} sprites, unchanged")
+            continue
+        written += 1
+        if result["repacked"]:
+            layout = "repacked"
+        elif result["kept"]:
+            layout = f"{result['kept']} kept in place"
+        else:
+            layout = "packed"
+        print(f"✓ {result['name']}: {result['sprites']} sprites ({layout}), "
+              f"{os.path.getsize(result['path']) / 1024:.1f} KB")
+
+    print(f"\n📊 {written} atlases written")
+    print(f"📋 Sprite map saved to: {MAP_FILE}")
+
+
+if __name__ == "__main__":
+    main()
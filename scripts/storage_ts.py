@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+"""
+Structured editor for the seed data in server/storage.ts.
+
+The seed data is a long run of object literals:
+
+    const teen_titans_go_2020: Promotion = {
+      name: "Teen Titans GO 2020",
+      slug: "teen-titans-go-2020",
+      wrapperPhotosUrls: [
+        "/attached_assets/rotated/...png"
+      ],
+      ...
+    };
+    this.promotions.set(teen_titans_go_2020.id, teen_titans_go_2020);
+
+Instead of searching the whole file with DOTALL regexes for every edit,
+StorageFile tokenizes it once (strings, comments and template literals
+included, so a "}" inside a description cannot end a block early) and
+indexes every `const x: Type = {...}` block by variable name, slug and
+name. Edits are queued against offsets in the original text and applied
+in a single splice when the file is saved.
+
+Usage:
+    python scripts/storage_ts.py [--type Promotion]   # list the indexed blocks
+"""
+
+import argparse
+import ast
+import json
+import re
+from instrumentation import tracer
+
+STORAGE_FILE = 'server/storage.ts'
+# Placeholder banner for promotions created by the batch scripts
+DEFAULT_PROMOTION_IMAGE = 'https://images.unsplash.com/photo-1578662996442-48f60103fc96?ixlib=rb-4.0.3&auto=format&fit=crop&w=600&h=300'
+# URL prefixes (and the vite import alias) that point into attached_assets/
+ASSET_PREFIXES = ('/attached_assets/', '@assets/')
+
+TOKEN_RE = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|`(?:[^`\\]|\\.)*`)
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<name>[A-Za-z_$][\w$]*)
+  | (?P<punct>.)
+''', re.VERBOSE | re.DOTALL)
+
+OPENERS = {'{': '}', '[': ']', '(': ')'}
+CLOSERS = {'}', ']', ')'}
+
+
+class StorageParseError(ValueError):
+    """Raised when storage.ts cannot be tokenized or its brackets do not balance"""
+
+
+class Token:
+    __slots__ = ('kind', 'text', 'start', 'end')
+
+    def __init__(self, kind, text, start, end):
+        self.kind = kind
+        self.text = text
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.text!r}, {self.start})"
+
+
+def tokenize(text):
+    """Split TypeScript source into tokens, dropping whitespace and comments"""
+    tokens = []
+    for match in TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+        if kind in ('space', 'comment'):
+            continue
+        tokens.append(Token(kind, match.group(), match.start(), match.end()))
+    return tokens
+
+
+def match_brackets(tokens):
+    """Map the index of every opening bracket token to the index of its closer"""
+    pairs = {}
+    stack = []
+    for index, token in enumerate(tokens):
+        if token.kind != 'punct':
+            continue
+        if token.text in OPENERS:
+            stack.append(index)
+        elif token.text in CLOSERS:
+            if not stack or OPENERS[tokens[stack[-1]].text] != token.text:
+                raise StorageParseError(f"Unbalanced '{token.text}' at offset {token.start}")
+            pairs[stack.pop()] = index
+    if stack:
+        raise StorageParseError(f"Unclosed '{tokens[stack[-1]].text}' at offset {tokens[stack[-1]].start}")
+    return pairs
+
+
+def ts_string(value):
+    """TypeScript string literal for a Python string"""
+    return json.dumps(value, ensure_ascii=False)
+
+
+def ts_literal(source):
+    """Decode a TypeScript literal: strings, numbers, null and booleans
+
+    Anything else (identifiers, `new Date()`, ...) is returned as source text.
+    """
+    source = source.strip()
+    if source == 'null':
+        return None
+    if source in ('true', 'false'):
+        return source == 'true'
+    if source[:1] in ('"', "'"):
+        return ast.literal_eval(source)
+    if re.fullmatch(r'\d+', source):
+        return int(source)
+    if re.fullmatch(r'\d+\.\d+', source):
+        return float(source)
+    return source
+
+
+def parse_value(source, resolve=None):
+    """Convert a TypeScript literal expression (arrays and objects included) to Python
+
+    Sub-expressions that are not literals, such as identifiers or
+    `vuala.id`, are passed to resolve(source_text); without a resolver
+    they are kept as source text.
+    """
+    tokens = tokenize(source)
+    pairs = match_brackets(tokens)
+    value, position = _parse_tokens(source, tokens, pairs, 0, resolve)
+    if position != len(tokens):
+        raise StorageParseError(f"Unexpected {tokens[position].text!r} in {source!r}")
+    return value
+
+
+def _parse_tokens(source, tokens, pairs, position, resolve):
+    """Parse one value starting at tokens[position], returning (value, next position)"""
+    token = tokens[position]
+    if token.text == '[':
+        close = pairs[position]
+        items = []
+        position += 1
+        while position < close:
+            item, position = _parse_tokens(source, tokens, pairs, position, resolve)
+            items.append(item)
+            if tokens[position].text == ',':
+                position += 1
+        return items, close + 1
+    if token.text == '{':
+        close = pairs[position]
+        result = {}
+        position += 1
+        while position < close:
+            key_token = tokens[position]
+            key = ts_literal(key_token.text) if key_token.kind == 'string' else key_token.text
+            value, position = _parse_tokens(source, tokens, pairs, position + 2, resolve)
+            result[key] = value
+            if tokens[position].text == ',':
+                position += 1
+        return result, close + 1
+
+    # A plain literal, or an expression running up to the next top-level separator
+    end = position
+    while end < len(tokens) and tokens[end].text not in (',', ']', '}'):
+        end = pairs.get(end, end) + 1
+    text = source[token.start:tokens[end - 1].end]
+    if end == position + 1 and (token.kind in ('string', 'number') or token.text in ('null', 'true', 'false')):
+        return ts_literal(text), end
+    return (resolve(text) if resolve else text), end
+
+
+def format_array(items, indent='      '):
+    """Multi-line array literal in the layout storage.ts uses"""
+    if not items:
+        return '[]'
+    inner = indent + '  '
+    return '[\n' + ',\n'.join(inner + item for item in items) + '\n' + indent + ']'
+
+
+def asset_file(source, import_paths=None):
+    """Local file behind an image element source, or None for remote URLs
+
+    The element is either a string URL ("/attached_assets/...") or an
+    identifier bound by an `import x from "@assets/..."` statement, looked
+    up in import_paths.
+    """
+    value = ts_literal(source)
+    if not (isinstance(value, str) and source.strip()[:1] in '"\''):
+        value = (import_paths or {}).get(source.strip())
+    if value is None:
+        return None
+    for prefix in ASSET_PREFIXES:
+        if value.startswith(prefix):
+            return 'attached_assets/' + value[len(prefix):]
+    return None
+
+
+def promotion_variable(slug):
+    """TypeScript variable name used for a new promotion"""
+    return slug.replace('-', '_').lower()
+
+
+def promotion_definition(brand_variable, promotion_data):
+    """Declaration and seed set call for a new promotion"""
+    promotion_var = promotion_variable(promotion_data['slug'])
+
+    wrapper_photos = promotion_data.get('wrapper_photos', [])
+    wrapper_photos_str = format_array([ts_string(photo) for photo in wrapper_photos]) if wrapper_photos else 'null'
+
+    return f'''
+    const {promotion_var}: Promotion = {{
+      id: randomUUID(),
+      brandId: {brand_variable}.id,
+      name: {ts_string(promotion_data['name'])},
+      slug: {ts_string(promotion_data['slug'])},
+      description: {ts_string(promotion_data['description'])},
+      imageUrl: {ts_string(promotion_data.get('imageUrl', DEFAULT_PROMOTION_IMAGE))},
+      startYear: {promotion_data.get('startYear', 2000)},
+      endYear: {promotion_data.get('endYear', 2010)},
+      category: {ts_string(promotion_data['category'])},
+      wrapperPhotoUrl: null,
+      wrapperPhotosUrls: {wrapper_photos_str},
+      promotionImagesUrls: null,
+      youtubeCommercialUrl: null,
+      createdAt: new Date(),
+    }};
+    this.promotions.set({promotion_var}.id, {promotion_var});
+'''
+
+
+class Property:
+    """One `key: value` entry of an object literal"""
+
+    __slots__ = ('key', 'start', 'value_start', 'value_end', 'source', 'items')
+
+    def __init__(self, key, start, value_start, value_end, source, items=None):
+        self.key = key
+        self.start = start
+        self.value_start = value_start
+        self.value_end = value_end
+        self.source = source
+        # Element sources when the value is an array literal
+        self.items = items
+
+    @property
+    def value(self):
+        return ts_literal(self.source)
+
+
+class Block:
+    """A `const name: Type = {...};` declaration and its top-level properties"""
+
+    def __init__(self, var_name, type_name, start, end, close_brace, indent, properties):
+        self.var_name = var_name
+        self.type_name = type_name
+        self.start = start
+        self.end = end
+        self.close_brace = close_brace
+        self.indent = indent
+        self.properties = properties
+
+    def get(self, key, default=None):
+        prop = self.properties.get(key)
+        return prop.value if prop is not None else default
+
+    @property
+    def name(self):
+        return self.get('name')
+
+    @property
+    def slug(self):
+        return self.get('slug')
+
+    def __repr__(self):
+        return f"Block({self.type_name} {self.var_name})"
+
+
+class StorageFile:
+    """Indexed view of storage.ts with batched edits"""
+
+    def __init__(self, text, path=STORAGE_FILE):
+        self.path = path
+        self.text = text
+        self.blocks = []
+        self.by_var = {}
+        self.by_slug = {}
+        self.by_name = {}
+        self.set_calls = []
+        self.imports = []
+        self._parse()
+
+        self._replacements = {}
+        self._arrays = {}
+        self._insertions = []
+
+    @classmethod
+    def load(cls, path=STORAGE_FILE):
+        with tracer.span("parse storage.ts", "patch", path=path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return cls(f.read(), path)
+
+    # Parsing
+
+    def _parse(self):
+        tokens = tokenize(self.text)
+        pairs = match_brackets(tokens)
+        texts = [token.text for token in tokens]
+        index = 0
+        while index < len(tokens):
+            text = texts[index]
+            if text == 'import' and (index == 0 or texts[index - 1] == ';'):
+                end = texts.index(';', index)
+                self.imports.append((tokens[index].start, tokens[end].end, self._import_names(tokens[index:end])))
+                index = end + 1
+            elif text == 'const' and texts[index + 2:index + 3] == [':'] and texts[index + 4:index + 6] == ['=', '{']:
+                index = self._parse_block(tokens, texts, pairs, index)
+            elif text == 'this' and texts[index - 1] in (';', '{', '}') and texts[index + 1:index + 2] == ['.'] and \
+                    texts[index + 3:index + 6] == ['.', 'set', '(']:
+                close = pairs[index + 5]
+                arguments = texts[index + 6:close]
+                # Only seed statements of the form this.map.set(x.id, x); the
+                # CRUD methods further down also call set() with other arguments
+                if texts[close + 1:close + 2] == [';'] and len(arguments) == 5 and \
+                        arguments[1:4] == ['.', 'id', ','] and arguments[0] == arguments[4]:
+                    self.set_calls.append({
+                        "map": texts[index + 2],
+                        "var": arguments[0],
+                        "start": tokens[index].start,
+                        "end": tokens[close + 1].end,
+                    })
+                index = close + 1
+            else:
+                index += 1
+
+    @staticmethod
+    def _import_names(tokens):
+        """Identifiers bound by an import statement"""
+        names = []
+        for position, token in enumerate(tokens[1:], 1):
+            if token.text == 'from':
+                break
+            if token.kind == 'name' and token.text not in ('type', 'as') and tokens[position + 1].text != 'as':
+                names.append(token.text)
+        return names
+
+    def _parse_block(self, tokens, texts, pairs, index):
+        var_name, type_name = texts[index + 1], texts[index + 3]
+        open_index = index + 5
+        close_index = pairs[open_index]
+        end_index = close_index + 1 if texts[close_index + 1:close_index + 2] == [';'] else close_index
+
+        properties = {}
+        position = open_index + 1
+        while position < close_index:
+            key_token = tokens[position]
+            if texts[position + 1] != ':':
+                # Shorthand or spread entries carry no editable value
+                position = self._skip_value(texts, pairs, position, close_index) + 1
+                continue
+            value_first = position + 2
+            value_last = self._skip_value(texts, pairs, value_first, close_index) - 1
+            value_start, value_end = tokens[value_first].start, tokens[value_last].end
+            items = None
+            if texts[value_first] == '[' and pairs.get(value_first) == value_last:
+                items = self._array_items(tokens, texts, pairs, value_first, value_last)
+            key = ts_literal(key_token.text) if key_token.kind == 'string' else key_token.text
+            properties[key] = Property(key, key_token.start, value_start, value_end,
+                                       self.text[value_start:value_end], items)
+            position = value_last + 2
+
+        line_start = self.text.rfind('\n', 0, tokens[index].start) + 1
+        block = Block(var_name, type_name, tokens[index].start, tokens[end_index].end,
+                      tokens[close_index].start, self.text[line_start:tokens[index].start], properties)
+        self.blocks.append(block)
+        self.by_var.setdefault(var_name, block)
+        if isinstance(block.slug, str):
+            self.by_slug.setdefault((type_name, block.slug), block)
+        if isinstance(block.name, str):
+            self.by_name.setdefault((type_name, block.name), block)
+        return end_index + 1
+
+    @staticmethod
+    def _skip_value(texts, pairs, position, limit):
+        """Index of the ',' (or closing bracket) ending the value starting at position"""
+        while position < limit and texts[position] != ',':
+            position = pairs.get(position, position) + 1
+        return position
+
+    def _array_items(self, tokens, texts, pairs, open_index, close_index):
+        items = []
+        position = open_index + 1
+        while position < close_index:
+            end = self._skip_value(texts, pairs, position, close_index)
+            items.append(self.text[tokens[position].start:tokens[end - 1].end])
+            position = end + 1
+        return items
+
+    # Lookups
+
+    def find(self, var=None, slug=None, name=None, type_name='Promotion'):
+        """Find a block by variable name, slug or name (first declaration wins)"""
+        if var is not None:
+            return self.by_var.get(var)
+        if slug is not None:
+            return self.by_slug.get((type_name, slug))
+        if name is not None:
+            return self.by_name.get((type_name, name))
+        return None
+
+    def find_conflict(self, definition):
+        """Existing block sharing the variable name, slug or name of a new declaration"""
+        new_block = StorageFile(definition, path=None).blocks[0]
+        for block in (
+            self.by_var.get(new_block.var_name),
+            self.by_slug.get((new_block.type_name, new_block.slug)),
+            self.by_name.get((new_block.type_name, new_block.name)),
+        ):
+            if block is not None:
+                return block
+        return None
+
+    def of_type(self, type_name):
+        return [block for block in self.blocks if block.type_name == type_name]
+
+    def promotions(self):
+        return self.of_type('Promotion')
+
+    def imported_names(self):
+        return {name for _, _, names in self.imports for name in names}
+
+    def import_paths(self):
+        """{identifier: module path} for every import statement"""
+        paths = {}
+        for start, end, names in self.imports:
+            texts = [token.text for token in tokenize(self.text[start:end])]
+            if 'from' in texts[:-1]:
+                module = ts_literal(texts[texts.index('from') + 1])
+                paths.update((name, module) for name in names)
+        return paths
+
+    def set_call(self, map_name, var=None):
+        """The seed `this.<map>.set(<var>.id, <var>);` statement, or the last one for the map"""
+        calls = [call for call in self.set_calls if call["map"] == map_name and (var is None or call["var"] == var)]
+        if not calls:
+            return None
+        return calls[-1] if var is None else calls[0]
+
+    # Edits
+
+    def set_value(self, block, key, source):
+        """Replace (or add) a property value with TypeScript source"""
+        self._arrays.pop((block.var_name, key), None)
+        self._replacements[(block.var_name, key)] = (block, source)
+
+    def array_items(self, block, key):
+        """Current element sources of an array property, including queued appends"""
+        pending = self._arrays.get((block.var_name, key))
+        if pending is not None:
+            return pending[1]
+        prop = block.properties.get(key)
+        return list(prop.items) if prop is not None and prop.items is not None else []
+
+    def append_items(self, block, key, sources):
+        """Append element sources to an array property, skipping ones already present
+
+        A null value becomes a new array. Returns the sources actually added.
+        """
+        items = self.array_items(block, key)
+        present = {_item_key(item) for item in items}
+        added = []
+        for source in sources:
+            if _item_key(source) not in present:
+                present.add(_item_key(source))
+                items.append(source)
+                added.append(source)
+        if added:
+            self._replacements.pop((block.var_name, key), None)
+            self._arrays[(block.var_name, key)] = (block, items)
+        return added
+
+    def insert(self, offset, text):
+        """Insert text at an offset of the original file; same-offset inserts keep their order"""
+        self._insertions.append((offset, len(self._insertions), text))
+
+    def insert_after_line(self, offset, text):
+        """Insert text at the start of the line following offset"""
+        newline = self.text.find('\n', offset)
+        self.insert(len(self.text) if newline == -1 else newline + 1, text)
+
+    @property
+    def dirty(self):
+        return bool(self._replacements or self._arrays or self._insertions)
+
+    def _edits(self):
+        edits = [(offset, offset, order, text) for offset, order, text in self._insertions]
+        order = len(edits)
+        values = [(block, key, source) for (_, key), (block, source) in self._replacements.items()]
+        values += [
+            (block, key, format_array(items, block.indent + '  '))
+            for (_, key), (block, items) in self._arrays.items()
+        ]
+        for block, key, source in values:
+            order += 1
+            prop = block.properties.get(key)
+            if prop is not None:
+                edits.append((prop.value_start, prop.value_end, order, source))
+            else:
+                # New properties go on their own line before the closing brace
+                line_start = self.text.rfind('\n', 0, block.close_brace) + 1
+                edits.append((line_start, line_start, order, f"{block.indent}  {key}: {source},\n"))
+        return sorted(edits)
+
+    def render(self):
+        """Apply every queued edit in one pass over the original text"""
+        parts = []
+        position = 0
+        for start, end, _, text in self._edits():
+            if start < position:
+                raise StorageParseError(f"Overlapping edits at offset {start}")
+            parts.append(self.text[position:start])
+            parts.append(text)
+            position = end
+        parts.append(self.text[position:])
+        return ''.join(parts)
+
+    def save(self, path=None):
+        """Write the edited file once; returns False when nothing changed"""
+        if not self.dirty:
+            return False
+        with tracer.span("render storage.ts", "patch", path=path or self.path):
+            with open(path or self.path, 'w', encoding='utf-8') as f:
+                f.write(self.render())
+        return True
+
+
+def _item_key(source):
+    """Compare string elements by value so quoting style does not matter"""
+    value = ts_literal(source)
+    return ('string', value) if isinstance(value, str) and source.strip()[:1] in '"\'' else ('source', source.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the seed blocks indexed from server/storage.ts")
+    parser.add_argument("--type", default=None, help="only list blocks of this type (e.g. Promotion)")
+    args = parser.parse_args()
+
+    storage = StorageFile.load()
+    blocks = storage.of_type(args.type) if args.type else storage.blocks
+    for block in blocks:
+        photos = block.properties.get('wrapperPhotosUrls')
+        photo_count = len(photos.items) if photos is not None and photos.items is not None else 0
+        print(f"{block.type_name:<14} {block.var_name:<40} {block.slug or '':<40} {photo_count} photos")
+    print(f"\n📊 {len(blocks)} blocks, {len(storage.set_calls)} set() calls, {len(storage.imports)} imports")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The scripts import each other as top-level modules, as when run from the repo root
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(SCRIPTS_DIR)
+sys.path.insert(0, SCRIPTS_DIR)
@@ -0,0 +1,45 @@
+import os
+import pytest
+from PIL import Image
+from asset_store import blob_path, build_alias_map, hash_file, link_duplicates, scan_assets
+from rotation_engine import make_task, rotate_batch
+
+
+@pytest.fixture
+def linked_assets(tmp_path):
+    assets_dir = tmp_path / "attached_assets"
+    (assets_dir / "rotated").mkdir(parents=True)
+    img = Image.new('RGB', (40, 20), (200, 30, 30))
+    img.paste((30, 30, 200), (0, 0, 10, 20))
+    # The generated copy sorts first, so it must still not become the canonical file
+    for name in ("rotated/a_rotated.png", "wrapper_1.png", "wrapper_2.png", "wrapper_3.png"):
+        img.save(assets_dir / name)
+
+    files, _ = scan_assets(str(assets_dir), jobs=1)
+    alias_map = build_alias_map(files)
+    (sha256, blob), = alias_map["blobs"].items()
+    store_dir = str(assets_dir / ".store")
+    link_duplicates(alias_map, str(assets_dir), store_dir)
+    return assets_dir, sha256, blob, blob_path(sha256, store_dir)
+
+
+def test_generated_files_are_never_linked(linked_assets):
+    assets_dir, _, blob, target = linked_assets
+    assert blob["canonical"] == "wrapper_1.png"
+    assert os.path.samefile(assets_dir / "wrapper_2.png", target)
+    assert not os.path.samefile(assets_dir / "rotated" / "a_rotated.png", target)
+
+
+def test_rewriting_a_linked_file_leaves_its_siblings_alone(linked_assets):
+    assets_dir, sha256, _, target = linked_assets
+    rewritten = str(assets_dir / "wrapper_2.png")
+    result, = rotate_batch([make_task(rewritten, rewritten, 90)], jobs=1)
+    assert result["success"]
+
+    assert hash_file(rewritten)[0] != sha256
+    with Image.open(rewritten) as img:
+        assert img.size == (20, 40)
+    assert hash_file(target)[0] == sha256
+    for name in ("wrapper_1.png", "wrapper_3.png"):
+        assert os.path.samefile(assets_dir / name, target)
+        assert hash_file(str(assets_dir / name))[0] == sha256
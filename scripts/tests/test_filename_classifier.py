@@ -0,0 +1,85 @@
+import pytest
+from filename_classifier import FilenameClassifier, PhraseMatcher, fold_accents
+
+CATALOG = [
+    {"key": "reyesOlas", "name": "Tattoo Mania: Reyes de las Olas", "slug": "reyes-de-las-olas",
+     "startYear": 2007, "endYear": 2007},
+    {"key": "chavoAnimado", "name": "El Chavo 2012", "slug": "el-chavo-2012", "startYear": 2012, "endYear": 2012},
+    {"key": "danceMania2008", "name": "Dance Mania 2008", "slug": "dance-mania-2008",
+     "startYear": 2008, "endYear": 2008},
+    {"key": "bobEsponja2012", "name": "Bob Esponja 2012", "slug": "bob-esponja-2012",
+     "startYear": 2012, "endYear": 2012},
+    {"key": "bobEsponja25", "name": "Bob Esponja Edición Especial 25 Años", "slug": "bob-esponja-25-anos-2024",
+     "startYear": 2024, "endYear": 2024},
+    {"key": "avengers", "name": "Avengers Collection", "slug": "avengers-collection",
+     "startYear": 2012, "endYear": 2012},
+    {"key": "pinaColada", "name": "Piña Colada", "slug": "pina-colada", "startYear": 2015, "endYear": 2015},
+    # Second record with the same slug as the first one
+    {"key": "reyesDeLasOlas", "name": "Reyes de las Olas", "slug": "reyes-de-las-olas",
+     "startYear": 2011, "endYear": 2011},
+    # Same name in two years: only the year in the filename tells them apart
+    {"key": "corazones2014", "name": "Corazones", "slug": "corazones-2014", "startYear": 2014, "endYear": 2014},
+    {"key": "corazones2017", "name": "Corazones", "slug": "corazones-2017", "startYear": 2017, "endYear": 2017},
+]
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return FilenameClassifier(CATALOG)
+
+
+@pytest.mark.parametrize("filename, key, year", [
+    # Duplicate slug: each record is still reachable by its own name
+    ("reyes de las olas chocolate_1755196507573.png", "reyesDeLasOlas", "2011"),
+    ("Cajeta frontal reyes de las olas 2011_1755196507573.png", "reyesDeLasOlas", "2011"),
+    ("tattoo mania reyes de las olas vainilla.jpg", "reyesOlas", "2007"),
+    # The year in the filename breaks ties between records
+    ("Trasera corazones 2017 chocolate_1755145664206.JPG", "corazones2017", "2017"),
+    ("corazones 2014 cajeta.png", "corazones2014", "2014"),
+    ("corazones cajeta.png", "corazones2014", "2014"),
+    # Words run together, accents, aliases and years
+    ("dancemania vainilla frontal.png", "danceMania2008", "2008"),
+    ("Dance mania 2008 vainilla frontal_1755196507566.png", "danceMania2008", "2008"),
+    ("Frontal Bob esponja 2012 cajeta.JPG", "bobEsponja2012", "2012"),
+    ("bob esponja 2024 chocolate.png", "bobEsponja25", "2024"),
+    ("Avengers cajeta_1755196507567.png", "avengers", "2012"),
+    ("piña colada trasera.png", "pinaColada", "2015"),
+])
+def test_exact_matches(classifier, filename, key, year):
+    info = classifier.classify(filename)
+    assert (info["key"], info["year"], info["match"]) == (key, year, "exact")
+    assert info["promotion"] == next(promotion["name"] for promotion in CATALOG if promotion["key"] == key)
+
+
+def test_flavor_and_side(classifier):
+    info = classifier.classify("Trasera Lateral chocolate cajeta el chavo 2012.png")
+    assert info["flavor"] == "Chocolate"
+    assert info["side"] == "Trasera"
+    info = classifier.classify("el chavo 2012 piña.png")
+    assert (info["flavor"], info["side"]) == ("Piña", "Frontal")
+
+
+def test_fuzzy_match_for_typos(classifier):
+    info = classifier.classify("El hcavo 2012 Trasera cajeta_1755145664203.JPG")
+    assert info["key"] == "chavoAnimado"
+    assert info["match"] == "fuzzy"
+    assert info["score"] >= 0.75
+
+
+def test_unknown(classifier):
+    info = classifier.classify("IMG_7043 2019.png")
+    assert info["match"] is None
+    assert (info["promotion"], info["slug"], info["key"], info["year"]) == ("Unknown", None, None, "2019")
+
+
+def test_phrase_matcher_overlapping_phrases():
+    matcher = PhraseMatcher()
+    matcher.add(["reyes", "de", "las", "olas"], "long")
+    matcher.add(["las", "olas"], "short")
+    matcher.add(["olas", "2011"], "year")
+    matches = sorted(matcher.matches("frontal reyes de las olas 2011".split()))
+    assert matches == [(1, 5, "long"), (3, 5, "short"), (4, 6, "year")]
+
+
+def test_fold_accents():
+    assert fold_accents("Piña Edición ÁÉ") == "pina edicion ae"
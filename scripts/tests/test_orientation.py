@@ -0,0 +1,35 @@
+import os
+import pytest
+from conftest import REPO_ROOT
+from orientation import DEFAULT_MIN_CONFIDENCE, check_labels, corrections, labelled_rotations, safe_threshold
+
+
+def _result(angle, confidence, expected, source="heuristic"):
+    return {"path": "x.png", "angle": angle, "mirrored": False, "source": source,
+            "confidence": confidence, "error": None, "expected": expected}
+
+
+def test_safe_threshold_clears_the_most_confident_wrong_correction():
+    checked = [
+        _result(180, 0.224, 0),
+        _result(270, 0.223, 90),
+        # Agreeing corrections and wrong "upright" answers never rotate anything
+        _result(90, 0.9, 90),
+        _result(0, 0.495, 90),
+        # EXIF results are applied by exif_transpose, not by corrections()
+        _result(180, 1.0, 0, source="exif"),
+    ]
+    assert safe_threshold(checked) == 0.225
+    assert safe_threshold([_result(0, 0.5, 0)]) == 0.0
+
+
+def test_default_threshold_does_not_contradict_the_labelled_specs(monkeypatch):
+    monkeypatch.chdir(REPO_ROOT)
+    labels = [(path, rotation) for path, rotation in labelled_rotations() if os.path.exists(path)]
+    if not labels:
+        pytest.skip("labelled wrapper photos are not available")
+    checked = check_labels(labels, jobs=1)
+    wrong = [result for result in corrections(checked, DEFAULT_MIN_CONFIDENCE)
+             if result["angle"] != result["expected"]]
+    assert wrong == []
+    assert safe_threshold(checked) <= DEFAULT_MIN_CONFIDENCE
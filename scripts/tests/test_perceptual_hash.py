@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from perceptual_hash import (HashCache, NearDuplicateGuard, _stat_entry, hamming_join, near_duplicate_pairs,
+                             popcount, synthetic_hashes)
+
+
+def brute_force_join(queries, hashes, radius):
+    distances = popcount((queries[:, None] ^ hashes[None, :]).ravel()).reshape(len(queries), len(hashes))
+    query_index, hash_index = np.nonzero(distances <= radius)
+    return set(zip(query_index.tolist(), hash_index.tolist(), distances[query_index, hash_index].tolist()))
+
+
+def as_set(query_index, hash_index, distances):
+    return set(zip(query_index.tolist(), hash_index.tolist(), distances.tolist()))
+
+
+@pytest.mark.parametrize("radius", [0, 1, 3, 4, 6, 10])
+def test_hamming_join_matches_brute_force(radius):
+    # Families of near copies, so every radius has matches to find and to reject
+    hashes = synthetic_hashes(600, family_size=5, noise_bits=3, seed=radius)[:, 0]
+    queries = synthetic_hashes(150, family_size=5, noise_bits=4, seed=radius)[:, 0]
+    assert as_set(*hamming_join(queries, hashes, radius)) == brute_force_join(queries, hashes, radius)
+
+
+def test_hamming_join_edge_bits_and_empty_inputs():
+    base = np.uint64(0xF0F0_0000_0000_000F)
+    # Flips in the highest and lowest bits of the word, i.e. at the chunk edges
+    hashes = np.array([base, base ^ np.uint64(1 << 63), base ^ np.uint64(0b11), base ^ np.uint64(0xFF00)],
+                      dtype=np.uint64)
+    assert as_set(*hamming_join(hashes[:1], hashes, 2)) == {(0, 0, 0), (0, 1, 1), (0, 2, 2)}
+    assert as_set(*hamming_join(np.empty(0, dtype=np.uint64), hashes, 6)) == set()
+    assert as_set(*hamming_join(hashes, np.empty(0, dtype=np.uint64), 6)) == set()
+
+
+@pytest.mark.parametrize("radius, rotated_radius", [(4, 4), (6, 4), (6, 6), (3, 6)])
+def test_near_duplicate_pairs_matches_brute_force_over_rotations(radius, rotated_radius):
+    hashes = synthetic_hashes(240, family_size=3, noise_bits=2, seed=7)
+    # Images whose quarter turn is a near copy of another image, 1 to 6 bits apart
+    rng = np.random.default_rng(7)
+    for index in rng.choice(len(hashes), 30, replace=False):
+        noise = sum(1 << int(bit) for bit in rng.choice(64, int(rng.integers(1, 7)), replace=False))
+        hashes[index, 1] = hashes[(index + 100) % len(hashes), 0] ^ np.uint64(noise)
+
+    expected = {}
+    for i in range(len(hashes)):
+        for j in range(len(hashes)):
+            if i == j:
+                continue
+            for turn, distance in enumerate(popcount(hashes[i] ^ hashes[j, 0]).tolist()):
+                pair = (min(i, j), max(i, j))
+                limit = radius if turn == 0 else min(radius, rotated_radius)
+                if distance <= limit and distance < expected.get(pair, radius + 1):
+                    expected[pair] = distance
+    first, second, distances = near_duplicate_pairs(hashes, radius, rotated_radius)
+    assert {(i, j): d for i, j, d in zip(first.tolist(), second.tolist(), distances.tolist())} == expected
+
+
+def test_quarter_turns_need_the_stricter_radius():
+    base = np.uint64(0x0123_4567_89AB_CDEF)
+    six_bits = np.uint64(0b111111)
+    # The second image only matches the first at a quarter turn, 6 bits apart
+    other = synthetic_hashes(4, family_size=1, seed=1)[:, 0]
+    hashes = np.array([[base, other[0], other[1], other[2]], [other[3], base ^ six_bits, ~base, base ^ ~six_bits]],
+                      dtype=np.uint64)
+    assert len(near_duplicate_pairs(hashes, radius=6)[0]) == 0
+    assert near_duplicate_pairs(hashes, radius=6, rotated_radius=6)[2].tolist() == [6]
+    # The same distance without a turn is still a match
+    hashes[1, 0] = base ^ six_bits
+    assert near_duplicate_pairs(hashes, radius=6)[2].tolist() == [6]
+
+
+def test_guard_rejects_rotated_copies_only_within_the_stricter_radius(tmp_path, monkeypatch):
+    # The guard takes site URLs, which are relative to the repo root
+    monkeypatch.chdir(tmp_path)
+    base = np.uint64(0x0123_4567_89AB_CDEF)
+    other = iter(synthetic_hashes(12, family_size=1, seed=2)[:, 0])
+    turns = {
+        "existing.png": [base, next(other), next(other), next(other)],
+        # 6 bits away at a quarter turn: beyond ROTATED_RADIUS, so not a copy
+        "turned_6.png": [next(other), base ^ np.uint64(0b111111), next(other), next(other)],
+        # 6 bits away upright: within the radius
+        "upright_6.png": [base ^ np.uint64(0b111111), next(other), next(other), next(other)],
+        # 3 bits away at a half turn: within ROTATED_RADIUS
+        "turned_3.png": [next(other), next(other), base ^ np.uint64(0b111), next(other)],
+    }
+    files = {}
+    for name, hashes in turns.items():
+        open(name, 'wb').close()
+        files[name] = dict(_stat_entry(name), phash=[f"{int(value):016x}" for value in hashes])
+    paths = list(files)
+
+    guard = NearDuplicateGuard(radius=6, cache=HashCache("hashes.json", files))
+    accepted, rejected = guard.filter(paths[:1], paths[1:])
+    assert accepted == [paths[1]]
+    assert rejected == [(paths[2], paths[0], 6), (paths[3], paths[0], 3)]
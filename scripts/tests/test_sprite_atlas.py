@@ -0,0 +1,70 @@
+import random
+import pytest
+from sprite_atlas import MaxRectsPacker, layout_atlas, pack
+
+WIDTH = 512
+
+
+def assert_valid_layout(sizes, positions, height, width=WIDTH):
+    assert set(positions) == set(sizes)
+    rects = [(x, y) + sizes[key] for key, (x, y) in positions.items()]
+    for x, y, w, h in rects:
+        assert x >= 0 and y >= 0 and x + w <= width and y + h <= height
+    # Sweep by x so overlapping pairs are found without comparing every pair
+    rects.sort()
+    for i, (x, y, w, h) in enumerate(rects):
+        for other_x, other_y, other_w, other_h in rects[i + 1:]:
+            if other_x >= x + w:
+                break
+            assert other_y >= y + h or other_y + other_h <= y, f"{(x, y, w, h)} overlaps {(other_x, other_y, other_w, other_h)}"
+
+
+def random_sizes(rng, count, prefix="s"):
+    return {f"{prefix}{index}": (rng.randint(8, 160), rng.randint(8, 200)) for index in range(count)}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_pack_has_no_overlaps(seed):
+    sizes = random_sizes(random.Random(seed), 80)
+    positions, height = pack(sizes, WIDTH)
+    assert_valid_layout(sizes, positions, height)
+    # Never worse than twice the area lower bound on these sizes
+    assert height * WIDTH <= 2 * sum(w * h for w, h in sizes.values())
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_pack_keeps_a_placed_subset(seed):
+    rng = random.Random(seed)
+    sizes = random_sizes(rng, 60)
+    previous, _ = pack(sizes, WIDTH)
+    # Keep some sprites where they were, drop others, and add new ones
+    kept = {key: position for key, position in previous.items() if rng.random() < 0.5}
+    sizes = {key: size for key, size in sizes.items() if key in kept or rng.random() < 0.5}
+    sizes.update(random_sizes(rng, 30, prefix="new"))
+
+    positions, height = pack(sizes, WIDTH, kept)
+    assert all(positions[key] == position for key, position in kept.items())
+    assert_valid_layout(sizes, positions, height)
+
+
+def test_sprite_wider_than_the_atlas():
+    with pytest.raises(ValueError):
+        MaxRectsPacker(64).insert(65, 10)
+
+
+def test_layout_atlas_keeps_unchanged_sprites():
+    sprites = {f"p{index}": {"sha256": str(index), "width": 100, "height": 150} for index in range(12)}
+    positions, height, repacked = layout_atlas(sprites, None, WIDTH, padding=2)
+    previous = {"width": WIDTH, "sprites": {
+        slug: {"sha256": sprite["sha256"], "width": 100, "height": 150,
+               "x": positions[slug][0] + 2, "y": positions[slug][1] + 2}
+        for slug, sprite in sprites.items()
+    }}
+    sprites["p3"] = {"sha256": "changed", "width": 120, "height": 150}
+    sprites["p12"] = {"sha256": "12", "width": 100, "height": 150}
+
+    new_positions, new_height, repacked = layout_atlas(sprites, previous, WIDTH, padding=2)
+    assert not repacked
+    assert all(new_positions[slug] == positions[slug] for slug in sprites if slug not in ("p3", "p12"))
+    sizes = {slug: (sprite["width"] + 4, sprite["height"] + 4) for slug, sprite in sprites.items()}
+    assert_valid_layout(sizes, new_positions, new_height)
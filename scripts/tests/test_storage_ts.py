@@ -0,0 +1,130 @@
+import os
+import pytest
+from conftest import REPO_ROOT
+from seed_data import SeedDataset, export_storage
+from storage_ts import StorageFile, parse_value, promotion_definition, ts_string
+
+SAMPLE = '''import { type Promotion } from "@shared/schema";
+import chavoCajeta from "@assets/El chavo cajeta_1.png";
+
+export class MemStorage {
+  private seedData() {
+    const vuala: Brand = {
+      id: randomUUID(),
+      name: "Vualá",
+      slug: "vuala",
+    };
+    this.brands.set(vuala.id, vuala);
+
+    const chavo: Promotion = {
+      id: randomUUID(),
+      brandId: vuala.id,
+      name: "El Chavo",
+      slug: "el-chavo-2012",
+      // a "}" in a comment or string must not end the block
+      description: "Tazos {edición} especial",
+      startYear: 2012,
+      wrapperPhotosUrls: [
+        chavoCajeta,
+        "/attached_assets/rotated/chavo_rotated.png"
+      ],
+      promotionImagesUrls: null,
+      createdAt: new Date(),
+    };
+    this.promotions.set(chavo.id, chavo);
+  }
+
+  async createPromotion(promotion: InsertPromotion) {
+    this.promotions.set(id, newPromotion);
+  }
+}
+'''
+
+
+@pytest.fixture
+def storage():
+    return StorageFile(SAMPLE, path=None)
+
+
+def test_render_without_edits_is_identity(storage):
+    assert not storage.dirty
+    assert storage.render() == SAMPLE
+
+
+def test_real_storage_file_round_trips():
+    path = os.path.join(REPO_ROOT, 'server', 'storage.ts')
+    if not os.path.exists(path):
+        pytest.skip("server/storage.ts not present")
+    storage = StorageFile.load(path)
+    assert storage.promotions()
+    assert storage.render() == storage.text
+
+
+def test_index_and_values(storage):
+    promotion = storage.find(slug="el-chavo-2012")
+    assert promotion is storage.find(var="chavo") is storage.find(name="El Chavo")
+    assert promotion.get('description') == "Tazos {edición} especial"
+    assert promotion.get('startYear') == 2012
+    assert promotion.properties['wrapperPhotosUrls'].items == [
+        'chavoCajeta', '"/attached_assets/rotated/chavo_rotated.png"']
+    assert storage.imported_names() == {'Promotion', 'chavoCajeta'}
+    # CRUD set() calls further down are not seed statements
+    assert [call["var"] for call in storage.set_calls] == ["vuala", "chavo"]
+
+
+def test_edits_round_trip_through_a_reparse(storage):
+    promotion = storage.find(slug="el-chavo-2012")
+    added = storage.append_items(promotion, 'wrapperPhotosUrls', [
+        "'/attached_assets/rotated/chavo_rotated.png'",  # same value, other quotes
+        ts_string("/attached_assets/rotated/chavo_2_rotated.png"),
+    ])
+    assert added == ['"/attached_assets/rotated/chavo_2_rotated.png"']
+    storage.append_items(promotion, 'promotionImagesUrls', [ts_string("/attached_assets/tazo.png")])
+    storage.set_value(promotion, 'category', ts_string("Tazos"))
+    storage.set_value(promotion, 'startYear', '2011')
+
+    edited = StorageFile(storage.render(), path=None)
+    promotion = edited.find(slug="el-chavo-2012")
+    assert promotion.properties['wrapperPhotosUrls'].items == [
+        'chavoCajeta',
+        '"/attached_assets/rotated/chavo_rotated.png"',
+        '"/attached_assets/rotated/chavo_2_rotated.png"',
+    ]
+    assert parse_value(promotion.properties['promotionImagesUrls'].source) == ["/attached_assets/tazo.png"]
+    assert promotion.get('category') == "Tazos"
+    assert promotion.get('startYear') == 2011
+    # Untouched parts of the file are kept byte for byte
+    assert edited.text.startswith(SAMPLE[:SAMPLE.index('    const chavo')])
+    assert edited.text.endswith(SAMPLE[SAMPLE.index('    this.promotions.set(chavo.id'):])
+
+
+def test_inserted_definition_is_indexed(storage):
+    definition = promotion_definition('vuala', {
+        "name": "Dance Mania 2008", "slug": "dance-mania-2008", "description": "Baile",
+        "category": "Juguetes", "startYear": 2008, "endYear": 2008,
+        "wrapper_photos": ["/attached_assets/rotated/dance_rotated.png"],
+    })
+    assert storage.find_conflict(definition) is None
+    storage.insert_after_line(storage.set_call('promotions')['end'], definition)
+
+    edited = StorageFile(storage.render(), path=None)
+    promotion = edited.find(slug="dance-mania-2008")
+    assert promotion.get('name') == "Dance Mania 2008"
+    assert promotion.properties['wrapperPhotosUrls'].items == ['"/attached_assets/rotated/dance_rotated.png"']
+    assert edited.set_call('promotions')['var'] == "dance_mania_2008"
+    assert edited.find_conflict(definition) is not None
+
+
+def test_seed_export_round_trips(storage, tmp_path):
+    dataset = export_storage(storage)
+    dataset.seed_dir = str(tmp_path)
+    dataset.save()
+
+    loaded = SeedDataset.load(str(tmp_path))
+    assert loaded.tables == dataset.tables
+    promotion = loaded.find('promotions', slug="el-chavo-2012")
+    assert promotion['key'] == "chavo"
+    assert promotion['brand'] == "vuala"
+    assert promotion['wrapperPhotosUrls'] == [
+        "/attached_assets/El chavo cajeta_1.png", "/attached_assets/rotated/chavo_rotated.png"]
+    assert loaded.check() == []
@@ -1,109 +1,189 @@
 #!/usr/bin/env python3
 """
 Update promotion categories based on description content analysis
+
+Every keyword of every category is compiled into one automaton, and each
+description is scanned once with accents folded ("imán" and "iman" are
+the same keyword) and matches kept only on word boundaries, so "pin" no
+longer fires inside "Pinky" nor "cap" inside "capitán". A keyword with a
+leading or trailing "*" may match inside a word ("*stix" for Askistix,
+"*lápices" for Decoralápices).
+
+Each category gets a confidence from its keyword hits (one hit 0.5, two
+0.75, ...). The whole catalog is scored first and the changes are
+written in one splice; the scores go to attached_assets/category_report.json
+for auditing. Once scripts/seed_data.py export has run, the categories
+are read from and written to the NDJSON seed dataset instead.
+
+Usage:
+    python scripts/update_promotion_categories.py [--dry-run] [--min-confidence 0.5]
 """
 
+import argparse
+import json
+import os
 import re
+from functools import lru_cache
+from asset_store import ASSETS_DIR
+from filename_classifier import PhraseMatcher, fold_accents
+from seed_data import SeedDataset
+from storage_ts import StorageFile, ts_string
+
+REPORT_FILE = os.path.join(ASSETS_DIR, "category_report.json")
+DEFAULT_CATEGORY = 'figuras'
+DEFAULT_MIN_CONFIDENCE = 0.5
+
+# Category mapping based on keywords
+CATEGORY_KEYWORDS = {
+    'stickers': ['sticker', 'stickers', '*stix', 'calcomanía', 'calcomanías', 'pegajosos'],
+    'figuras': ['figura', 'figuras', 'miniatura', 'miniaturas', 'muñeco', 'muñecos'],
+    'colgantes': ['colgante', 'colgantes', 'colgar', 'para celular', 'para celulares'],
+    'llaveros': ['llavero', 'llaveros', 'chain'],
+    'tatuajes': ['tatuaje', 'tatuajes', 'tattoo', 'tattoos', 'tattoo mania'],
+    'spinners': ['spinner', 'spinners', 'lucha-attacks', 'girando', 'lanzar'],
+    'tarjetas': ['tarjeta', 'tarjetas', 'carta', 'cartas'],
+    'juguetes': ['juguete', 'juguetes', 'lanzador', 'lanzadores', 'lanzadiscos', 'juego', 'juegos'],
+    'accesorios': ['accesorio', 'accesorios', 'decorativo', 'decorativos'],
+    'caps': ['caps', 'cap', 'tapa', 'tapas'],
+    'pins': ['pin', 'pins', 'broche', 'broches'],
+    'imanes': ['imán', 'imanes', 'magnet', 'magnets'],
+    'cupones': ['cupón', 'cupones', 'canjeable', 'canjeables'],
+    'gomas': ['goma', 'gomas', 'borrador', 'borradores'],
+    'lapices': ['lápiz', '*lápices', 'funki lápices'],
+    'laser': ['laser', 'holográfico', 'holográficos'],
+    'ventosas': ['ventosa', 'ventosas', 'pegatronix', 'mordelones'],
+    'navitrones': ['navitrón', 'navitrones', 'nave espacial'],
+    'tazos': ['tazo', '*tazos'],
+}
+
+
+def _fold(text):
+    """Accent-free lowercase text with every run of other characters as one space, padded"""
+    return ' ' + re.sub(r'[^a-z0-9*]+', ' ', fold_accents(text)).strip() + ' '
+
+
+class CategoryClassifier:
+    """Keyword categories of promotion descriptions, from a single automaton"""
+
+    def __init__(self, category_keywords=CATEGORY_KEYWORDS):
+        self.matcher = PhraseMatcher()
+        for category, keywords in category_keywords.items():
+            for keyword in keywords:
+                folded = _fold(keyword).strip()
+                self.matcher.add(folded.strip('*'), (category, keyword, folded.startswith('*'), folded.endswith('*')))
+        self.matcher.build()
+
+    def scores(self, description):
+        """{category: {"keywords": [...], "confidence": c}} for the categories found in a description"""
+        text = _fold(description)
+        hits = {}
+        for start, end, (category, keyword, prefix_open, suffix_open) in self.matcher.matches(text):
+            if (prefix_open or text[start - 1] == ' ') and (suffix_open or text[end] == ' '):
+                hits.setdefault(category, []).append(keyword)
+        return {
+            category: {"keywords": keywords, "confidence": round(1 - 0.5 ** len(keywords), 3)}
+            for category, keywords in sorted(hits.items())
+        }
+
+    def classify(self, description, min_confidence=DEFAULT_MIN_CONFIDENCE):
+        """(category string, scores): the confident categories comma-separated, or the default"""
+        scores = self.scores(description)
+        categories = [category for category, score in scores.items() if score["confidence"] >= min_confidence]
+        return ','.join(categories) if categories else DEFAULT_CATEGORY, scores
+
+
+@lru_cache(maxsize=None)
+def default_classifier():
+    return CategoryClassifier()
+
 
 def extract_categories_from_description(description):
     """Extract categories based on keywords in the description"""
-    categories = set()
-    
-    # Normalize description for analysis
-    desc_lower = description.lower()
-    
-    # Category mapping based on keywords
-    category_keywords = {
-        'stickers': ['sticker', 'stix', 'calcomanías', 'pegajosos'],
-        'figuras': ['figura', 'figuras', 'miniatura', 'miniaturas', 'muñeco', 'muñecos'],
-        'colgantes': ['colgante', 'colgantes', 'colgar', 'para celular', 'para celulares'],
-        'llaveros': ['llavero', 'llaveros', 'chain', 'llaver'],
-        'tatuajes': ['tatuaje', 'tatuajes', 'tattoo', 'tattoo mania'],
-        'spinners': ['spinner', 'spinners', 'lucha-attacks', 'girando', 'lanzar'],
-        'tarjetas': ['tarjeta', 'tarjetas', 'carta', 'cartas'],
-        'juguetes': ['juguete', 'juguetes', 'lanzador', 'lanzadiscos', 'juego'],
-        'accesorios': ['accesorio', 'accesorios', 'decorativo', 'decorativos'],
-        'caps': ['caps', 'cap', 'tapa', 'tapas'],
-        'pins': ['pin', 'pins', 'broche', 'broches'],
-        'imanes': ['imán', 'imanes', 'magnet', 'magnets'],
-        'cupones': ['cupón', 'cupones', 'canjeable', 'canjeables'],
-        'gomas': ['goma', 'gomas', 'borrador', 'borradores'],
-        'lapices': ['lápiz', 'lápices', 'funki lápices'],
-        'laser': ['laser', 'láser', 'holográfico', 'holográficos'],
-        'ventosas': ['ventosa', 'ventosas', 'pegatronix', 'mordelones'],
-        'navitrones': ['navitrón', 'navitrones', 'nave espacial']
-    }
-    
-    # Check for keywords in description
-    for category, keywords in category_keywords.items():
-        if any(keyword in desc_lower for keyword in keywords):
-            categories.add(category)
-    
-    # Special rules for complex descriptions
-    if 'pokemon' in desc_lower and 'tarjeta' in desc_lower:
-        categories.add('tarjetas')
-    
-    if 'plants vs zombies' in desc_lower or 'pvz' in desc_lower:
-        if 'figuras' in desc_lower:
-            categories.add('figuras')
-        if 'caps' in desc_lower:
-            categories.add('caps')
-        if 'llavero' in desc_lower:
-            categories.add('llaveros')
-    
-    # Return primary category or comma-separated multiple categories
-    if not categories:
-        return 'figuras'  # Default fallback
-    elif len(categories) == 1:
-        return list(categories)[0]
-    else:
-        # Return comma-separated for multiple categories
-        return ','.join(sorted(categories))
+    return default_classifier().classify(description)[0]
+
 
 def main():
-    # Read the current storage file
-    with open('server/storage.ts', 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Extract all Vualá promotions and their descriptions
-    promotion_pattern = r'const (\w+): Promotion = \{[^}]+brandId: vuala\.id,[^}]+name: "([^"]+)",[^}]+slug: "([^"]+)",[^}]+description: "([^"]+)",[^}]+category: "([^"]+)"'
-    
-    promotions = re.findall(promotion_pattern, content, re.DOTALL)
-    
-    updates_made = 0
-    
-    for var_name, name, slug, description, current_category in promotions:
+    parser = argparse.ArgumentParser(description="Update promotion categories from their descriptions")
+    parser.add_argument("--dry-run", action="store_true", help="report the changes without writing the promotion data")
+    parser.add_argument("--min-confidence", type=float, default=DEFAULT_MIN_CONFIDENCE,
+                        help=f"minimum confidence for a category to be assigned (default: {DEFAULT_MIN_CONFIDENCE})")
+    args = parser.parse_args()
+
+    # The seed dataset replaces the storage.ts literals once it has been exported
+    dataset = SeedDataset.load() if SeedDataset.exists() else None
+    classifier = default_classifier()
+
+    # Extract all Vualá promotions and their descriptions, as (record or block, fields)
+    if dataset is not None:
+        candidates = [
+            (record, record) for record in dataset.tables['promotions'].values() if record.get('brand') == 'vuala'
+        ]
+    else:
+        # Parse the storage file once
+        storage = StorageFile.load()
+        candidates = [
+            (block, {key: block.get(key) for key in ('slug', 'name', 'description', 'category')})
+            for block in storage.promotions() if block.get('brandId') == 'vuala.id'
+        ]
+    promotions = [
+        (promotion, fields) for promotion, fields in candidates
+        if isinstance(fields.get('description'), str) and isinstance(fields.get('category'), str)
+    ]
+
+    # Score the whole catalog before touching anything
+    report = []
+    for promotion, fields in promotions:
         # Clean up description (remove newlines and extra spaces)
-        clean_description = ' '.join(description.split())
-        
-        # Get suggested categories
-        suggested_categories = extract_categories_from_description(clean_description)
-        
-        print(f"\n=== {name} ({slug}) ===")
-        print(f"Current: {current_category}")
-        print(f"Suggested: {suggested_categories}")
-        print(f"Description excerpt: {clean_description[:100]}...")
-        
+        clean_description = ' '.join(fields['description'].split())
+        suggested, scores = classifier.classify(clean_description, args.min_confidence)
+        report.append({
+            "promotion": promotion,
+            "slug": fields['slug'],
+            "name": fields['name'],
+            "current": fields['category'],
+            "suggested": suggested,
+            "scores": scores,
+            "description": clean_description,
+        })
+
+    updates_made = 0
+    for entry in report:
+        print(f"\n=== {entry['name']} ({entry['slug']}) ===")
+        print(f"Current: {entry['current']}")
+        print(f"Suggested: {entry['suggested']}")
+        for category, score in entry["scores"].items():
+            print(f"  {score['confidence']:.2f} {category}: {', '.join(score['keywords'])}")
+        if not entry["scores"]:
+            print(f"  (no keywords, default {DEFAULT_CATEGORY})")
+        print(f"Description excerpt: {entry['description'][:100]}...")
+
         # Update if different and makes sense
-        if suggested_categories != current_category:
-            # Replace the category in the content
-            old_pattern = f'(const {var_name}: Promotion = \\{{[^}}]+category: )"{current_category}"'
-            new_replacement = f'\\1"{suggested_categories}"'
-            
-            if re.search(old_pattern, content, re.DOTALL):
-                content = re.sub(old_pattern, new_replacement, content, flags=re.DOTALL)
-                updates_made += 1
-                print(f"✓ Updated category to: {suggested_categories}")
+        if entry["suggested"] != entry["current"]:
+            if dataset is not None:
+                dataset.upsert('promotions', {'key': entry["promotion"]['key'], 'category': entry["suggested"]})
             else:
-                print(f"✗ Could not find pattern to update")
-    
-    # Write the updated content back
-    if updates_made > 0:
-        with open('server/storage.ts', 'w', encoding='utf-8') as f:
-            f.write(content)
+                storage.set_value(entry["promotion"], 'category', ts_string(entry["suggested"]))
+            updates_made += 1
+            print(f"✓ Updated category to: {entry['suggested']}")
+
+    with open(REPORT_FILE, 'w', encoding='utf-8') as f:
+        json.dump({"min_confidence": args.min_confidence, "promotions": [
+            {key: value for key, value in entry.items() if key not in ("promotion", "description")}
+            for entry in report
+        ]}, f, indent=2, ensure_ascii=False)
+    print(f"\n📋 Category scores saved to: {REPORT_FILE}")
+
+    # Write every change back in one splice
+    if updates_made > 0 and args.dry_run:
+        print(f"\n• Dry run: {updates_made} category updates not written")
+    elif updates_made > 0:
+        if dataset is not None:
+            dataset.save()
+        else:
+            storage.save()
         print(f"\n✓ Applied {updates_made} category updates!")
     else:
         print("\n• No updates needed - all categories are appropriate")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
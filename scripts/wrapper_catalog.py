@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+SQLite catalog of the organized Vualá wrapper photos.
+
+vuala_wrappers_organized.json used to be the only record: every run
+loaded it whole, appended each photo to both the "flavors" and "images"
+arrays of its promotion and dumped the file again, and readers deduped
+the URLs with a set. The catalog keeps one row per photo (keyed by its
+path) in attached_assets/.catalog/wrappers.sqlite, indexed by promotion,
+flavor, side, year and content hash:
+
+    with WrapperCatalog.open() as catalog:
+        catalog.upsert_many(entries)      # one transaction
+        catalog.find(promotion="El Chavo", flavor="Cajeta")
+        catalog.export_json()             # the legacy file, unchanged format
+
+The legacy JSON is still written for compatibility (organize_vuala_images.js
+and older scripts), and it stays the bootstrap source: the database is
+not committed, so the first open imports the JSON, and an edited JSON is
+merged again on the next open. Its older promotion keys ("Avengers",
+"Tortugas Ninja") are mapped to the catalog names the filename classifier
+files new photos under ("Avengers Collection", "Las Tortugas Ninja"), and
+the JSON is rewritten with them once.
+
+The trims table records the crop box of every image cut down by
+alpha_trim.py (catalog.trim(url)), so trimmed images can be placed back
+at their original offset, and the placeholders table the BlurHash and
+LQIP of every site image (placeholders.py).
+
+Usage:
+    python scripts/wrapper_catalog.py import
+    python scripts/wrapper_catalog.py export
+    python scripts/wrapper_catalog.py find --promotion "El Chavo" --flavor Cajeta
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from asset_store import ASSETS_DIR, hash_file, load_index
+from filename_classifier import default_classifier
+
+CATALOG_DIR = os.path.join(ASSETS_DIR, ".catalog")
+CATALOG_FILE = os.path.join(CATALOG_DIR, "wrappers.sqlite")
+WRAPPERS_FILE = os.path.join(ASSETS_DIR, "vuala_wrappers_organized.json")
+
+# Legacy entry keys, in the order the JSON has always used
+ENTRY_FIELDS = ("filename", "side", "flavor", "year", "path", "rotated_path")
+QUERY_FIELDS = ("promotion", "flavor", "side", "year", "sha256")
+PLACEHOLDER_FIELDS = ("url", "sha256", "width", "height", "blurhash", "lqip")
+# Uploads are the photos dropped straight into attached_assets
+UPLOAD_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS promotions (
+    name TEXT PRIMARY KEY,
+    year TEXT,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS wrappers (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    promotion TEXT NOT NULL REFERENCES promotions (name),
+    filename TEXT NOT NULL,
+    side TEXT,
+    flavor TEXT,
+    year TEXT,
+    rotated_path TEXT,
+    sha256 TEXT,
+    size INTEGER,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS wrappers_promotion ON wrappers (promotion, flavor, side);
+CREATE INDEX IF NOT EXISTS wrappers_flavor ON wrappers (flavor);
+CREATE INDEX IF NOT EXISTS wrappers_side ON wrappers (side);
+CREATE INDEX IF NOT EXISTS wrappers_year ON wrappers (year);
+CREATE INDEX IF NOT EXISTS wrappers_sha256 ON wrappers (sha256);
+CREATE TABLE IF NOT EXISTS trims (
+    path TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    source_width INTEGER NOT NULL,
+    source_height INTEGER NOT NULL,
+    left INTEGER NOT NULL,
+    top INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    padding INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trims_source ON trims (source);
+CREATE TABLE IF NOT EXISTS placeholders (
+    url TEXT PRIMARY KEY,
+    sha256 TEXT,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    blurhash TEXT NOT NULL,
+    lqip TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+UPSERT_WRAPPER = """
+INSERT INTO wrappers (path, promotion, filename, side, flavor, year, rotated_path, sha256, size, updated_at)
+VALUES (:path, :promotion, :filename, :side, :flavor, :year, :rotated_path, :sha256, :size, :updated_at)
+ON CONFLICT (path) DO UPDATE SET
+    promotion = excluded.promotion,
+    filename = excluded.filename,
+    side = excluded.side,
+    flavor = excluded.flavor,
+    year = excluded.year,
+    rotated_path = COALESCE(excluded.rotated_path, wrappers.rotated_path),
+    sha256 = COALESCE(excluded.sha256, wrappers.sha256),
+    size = COALESCE(excluded.size, wrappers.size),
+    updated_at = excluded.updated_at
+WHERE (wrappers.promotion, wrappers.filename, wrappers.side, wrappers.flavor, wrappers.year)
+      IS NOT (excluded.promotion, excluded.filename, excluded.side, excluded.flavor, excluded.year)
+   OR (excluded.rotated_path IS NOT NULL AND excluded.rotated_path IS NOT wrappers.rotated_path)
+   OR (excluded.sha256 IS NOT NULL AND excluded.sha256 IS NOT wrappers.sha256)
+"""
+
+
+def _local_path(url):
+    """Filesystem path of an /attached_assets/... URL"""
+    return url.lstrip('/')
+
+
+def catalog_name(name, year=None):
+    """Catalog name of a legacy promotion key ("Avengers" -> "Avengers Collection")
+
+    Keys that already are catalog names, or that the filename classifier
+    cannot match exactly, are kept as they are.
+    """
+    classifier = default_classifier()
+    if any(promotion["name"] == name for promotion in classifier.promotions):
+        return name
+    info = classifier.classify(f"{name} {year or ''}")
+    return info["promotion"] if info["match"] == "exact" else name
+
+
+def _legacy_hash(path):
+    """SHA-256 of a file, or None when it is missing"""
+    if not os.path.exists(path):
+        return None
+    sha256, _ = hash_file(path)
+    return sha256
+
+
+class WrapperCatalog:
+    """Wrapper photos by promotion, flavor, side, year and content hash"""
+
+    def __init__(self, connection, catalog_file=CATALOG_FILE, wrappers_file=WRAPPERS_FILE):
+        self.connection = connection
+        self.catalog_file = catalog_file
+        self.wrappers_file = wrappers_file
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+        # Content hashes already known to the asset index, so imports do not re-read files
+        self.hashes = None
+
+    @classmethod
+    def open(cls, catalog_file=CATALOG_FILE, wrappers_file=WRAPPERS_FILE, sync=True):
+        """Open (or create) the catalog, merging the legacy JSON if it changed since the last sync"""
+        os.makedirs(os.path.dirname(catalog_file) or '.', exist_ok=True)
+        catalog = cls(sqlite3.connect(catalog_file), catalog_file, wrappers_file)
+        if sync:
+            catalog.sync_legacy()
+            catalog.migrate_names()
+        return catalog
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Content hashes
+
+    def content_hash(self, url):
+        """(sha256, size) of a photo, from the asset index when it has the file"""
+        if self.hashes is None:
+            self.hashes = load_index()
+        prefix = f"/{ASSETS_DIR}/"
+        entry = self.hashes.get(url[len(prefix):]) if url.startswith(prefix) else None
+        if entry:
+            return entry["sha256"], entry["size"]
+        path = _local_path(url)
+        if not os.path.exists(path):
+            return None, None
+        return hash_file(path)
+
+    # Updates
+
+    def _promotion(self, name, year):
+        """Insert a promotion at the end of the catalog order; the first year recorded is kept"""
+        self.connection.execute(
+            "INSERT INTO promotions (name, year, position) "
+            "VALUES (?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM promotions)) "
+            "ON CONFLICT (name) DO NOTHING",
+            (name, year),
+        )
+
+    def upsert_many(self, entries, hash_files=True):
+        """Insert or update wrapper entries in one transaction
+
+        Each entry is a legacy dict (filename, side, flavor, year, path and
+        optionally rotated_path) plus "promotion". Returns the number of rows
+        inserted or changed.
+        """
+        now = time.time()
+        changed = 0
+        with self.connection:
+            for entry in entries:
+                self._promotion(entry["promotion"], entry.get("year"))
+                row = {field: entry.get(field) for field in ENTRY_FIELDS}
+                row["promotion"] = entry["promotion"]
+                row["sha256"], row["size"] = entry.get("sha256"), entry.get("size")
+                if hash_files and row["sha256"] is None:
+                    row["sha256"], row["size"] = self.content_hash(row["path"])
+                row["updated_at"] = now
+                changed += self.connection.execute(UPSERT_WRAPPER, row).rowcount
+        return changed
+
+    def upsert(self, entry, hash_files=True):
+        return self.upsert_many([entry], hash_files)
+
+    def delete(self, path):
+        with self.connection:
+            return self.connection.execute("DELETE FROM wrappers WHERE path = ?", (path,)).rowcount
+
+    # Lookups
+
+    def find(self, **fields):
+        """Entries matching every given field (promotion, flavor, side, year, sha256), in catalog order"""
+        unknown = set(fields) - set(QUERY_FIELDS)
+        if unknown:
+            raise ValueError(f"Cannot query wrappers by {', '.join(sorted(unknown))}")
+        where = ' AND '.join(f"w.{field} = :{field}" for field in fields) or '1'
+        rows = self.connection.execute(
+            "SELECT w.* FROM wrappers w JOIN promotions p ON p.name = w.promotion "
+            f"WHERE {where} ORDER BY p.position, w.id",
+            fields,
+        )
+        return [dict(row) for row in rows]
+
+    def get(self, path):
+        row = self.connection.execute("SELECT * FROM wrappers WHERE path = ?", (path,)).fetchone()
+        return dict(row) if row else None
+
+    def promotions(self):
+        """{name: year} in catalog order"""
+        rows = self.connection.execute("SELECT name, year FROM promotions ORDER BY position")
+        return {row["name"]: row["year"] for row in rows}
+
+    def photo_urls(self, promotion=None):
+        """URLs the site shows for each promotion, preferring the rotated copies, without repeats
+
+        Returns {promotion: [url, ...]} in catalog order.
+        """
+        urls = {}
+        for entry in self.find(**({"promotion": promotion} if promotion else {})):
+            promotion_urls = urls.setdefault(entry["promotion"], [])
+            url = entry["rotated_path"] or entry["path"]
+            if url not in promotion_urls:
+                promotion_urls.append(url)
+        return urls
+
+    # New uploads
+
+    def pending_uploads(self, files):
+        """Photos of a scan index seen after the last mark_uploads() and not catalogued yet
+
+        files is the asset_store index. The first call has nothing to compare
+        with: it records the current uploads as the baseline and returns None.
+        """
+        cursor = self._meta("uploads_seen_ns")
+        if cursor is None:
+            self.mark_uploads(files)
+            return None
+        return [
+            name for name, entry in files.items()
+            if '/' not in name and name.lower().endswith(UPLOAD_EXTENSIONS)
+            and entry["seen_ns"] > int(cursor) and self.get(f"/{ASSETS_DIR}/{name}") is None
+        ]
+
+    def mark_uploads(self, files, retry=()):
+        """Move the upload cursor past every file of a scan index, except the uploads in retry
+
+        Uploads that failed or could not be identified stay pending: the
+        cursor stops just before the earliest of them, and the later ones
+        that were catalogued are not pending anyway.
+        """
+        retried = [files[name]["seen_ns"] for name in retry if name in files]
+        cursor = min(retried) - 1 if retried else max((entry["seen_ns"] for entry in files.values()), default=0)
+        with self.connection:
+            self._set_meta("uploads_seen_ns", str(cursor))
+
+    # Trimmed images
+
+    def record_trims(self, trims):
+        """Upsert the crop boxes of trimmed images in one transaction
+
+        Each trim has "path" and "source" (site URLs), "source_width",
+        "source_height", "box" [left, top, right, bottom] and "padding".
+        """
+        now = time.time()
+        with self.connection:
+            for trim in trims:
+                left, top, right, bottom = trim["box"]
+                self.connection.execute(
+                    "INSERT INTO trims (path, source, source_width, source_height, left, top, width, height, "
+                    "padding, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (path) DO UPDATE SET source = excluded.source, "
+                    "source_width = excluded.source_width, source_height = excluded.source_height, "
+                    "left = excluded.left, top = excluded.top, width = excluded.width, height = excluded.height, "
+                    "padding = excluded.padding, updated_at = excluded.updated_at",
+                    (trim["path"], trim["source"], trim["source_width"], trim["source_height"],
+                     left, top, right - left, bottom - top, trim["padding"], now),
+                )
+
+    def trim(self, path):
+        """Crop box of a trimmed image (by its URL): source, source size, left, top, width, height"""
+        row = self.connection.execute("SELECT * FROM trims WHERE path = ?", (path,)).fetchone()
+        return dict(row) if row else None
+
+    # Placeholders
+
+    def record_placeholders(self, placeholders):
+        """Upsert image placeholders (url, sha256, width, height, blurhash, lqip) in one transaction"""
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO placeholders (url, sha256, width, height, blurhash, lqip, updated_at) "
+                "VALUES (:url, :sha256, :width, :height, :blurhash, :lqip, :updated_at) "
+                "ON CONFLICT (url) DO UPDATE SET sha256 = excluded.sha256, width = excluded.width, "
+                "height = excluded.height, blurhash = excluded.blurhash, lqip = excluded.lqip, "
+                "updated_at = excluded.updated_at",
+                [dict({field: placeholder[field] for field in PLACEHOLDER_FIELDS}, updated_at=now)
+                 for placeholder in placeholders],
+            )
+
+    def placeholders(self, urls=None):
+        """{url: placeholder} for the given URLs, or for every recorded image"""
+        if urls is None:
+            rows = self.connection.execute("SELECT * FROM placeholders")
+        else:
+            rows = []
+            urls = list(dict.fromkeys(urls))
+            # Stay below SQLite's bound parameter limit
+            for start in range(0, len(urls), 500):
+                chunk = urls[start:start + 500]
+                rows.extend(self.connection.execute(
+                    f"SELECT * FROM placeholders WHERE url IN ({', '.join('?' * len(chunk))})", chunk))
+        return {row["url"]: dict(row) for row in rows}
+
+    # Legacy JSON
+
+    def to_legacy(self):
+        """The catalog in the vuala_wrappers_organized.json layout"""
+        data = {
+            name: {"name": name, "year": year, "flavors": {}, "images": []}
+            for name, year in self.promotions().items()
+        }
+        for row in self.find():
+            entry = {field: row[field] for field in ENTRY_FIELDS if row[field] is not None or field != "rotated_path"}
+            promotion = data[row["promotion"]]
+            promotion["flavors"].setdefault(row["flavor"], []).append(entry)
+            promotion["images"].append(entry)
+        return {name: promotion for name, promotion in data.items() if promotion["images"]}
+
+    def _set_meta(self, key, value):
+        self.connection.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def _meta(self, key):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def import_json(self, wrappers_file=None):
+        """Merge a legacy JSON file into the catalog; returns the number of rows inserted or changed"""
+        wrappers_file = wrappers_file or self.wrappers_file
+        with open(wrappers_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        entries = []
+        renamed = False
+        for legacy_name, promotion in data.items():
+            name = catalog_name(legacy_name, promotion.get("year"))
+            renamed = renamed or name != legacy_name
+            self._promotion(name, promotion.get("year"))
+            # The "flavors" arrays repeat the "images" entries
+            for image in promotion.get("images", []):
+                entries.append(dict(image, promotion=name))
+        changed = self.upsert_many(entries)
+        if renamed and wrappers_file == self.wrappers_file:
+            # Rewrite the legacy keys once, so both records use the catalog names
+            self.export_json()
+        else:
+            with self.connection:
+                self._set_meta("legacy_sha256", _legacy_hash(wrappers_file))
+        return changed
+
+    def migrate_names(self):
+        """Rename promotions recorded under legacy keys to their catalog names (once)
+
+        Returns the number of promotions renamed.
+        """
+        if self._meta("names_migrated"):
+            return 0
+        renamed = 0
+        with self.connection:
+            for name, year in self.promotions().items():
+                new_name = catalog_name(name, year)
+                if new_name == name:
+                    continue
+                exists = self.connection.execute("SELECT 1 FROM promotions WHERE name = ?", (new_name,)).fetchone()
+                if exists:
+                    self.connection.execute("DELETE FROM promotions WHERE name = ?", (name,))
+                else:
+                    # Keeps the catalog position of the legacy group
+                    self.connection.execute("UPDATE promotions SET name = ? WHERE name = ?", (new_name, name))
+                self.connection.execute("UPDATE wrappers SET promotion = ? WHERE promotion = ?", (new_name, name))
+                renamed += 1
+            self._set_meta("names_migrated", "1")
+        if renamed and os.path.exists(self.wrappers_file):
+            self.export_json()
+        return renamed
+
+    def sync_legacy(self):
+        """Import the legacy JSON when it was changed outside the catalog (or never imported)"""
+        if not os.path.exists(self.wrappers_file):
+            return 0
+        if _legacy_hash(self.wrappers_file) == self._meta("legacy_sha256"):
+            return 0
+        return self.import_json()
+
+    def export_json(self, wrappers_file=None):
+        """Write the legacy JSON file atomically and remember its hash"""
+        wrappers_file = wrappers_file or self.wrappers_file
+        temp_path = wrappers_file + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_legacy(), f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, wrappers_file)
+        with self.connection:
+            self._set_meta("legacy_sha256", _legacy_hash(wrappers_file))
+        return wrappers_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite catalog of the organized wrapper photos")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("import", help=f"merge {WRAPPERS_FILE} into the catalog")
+    subparsers.add_parser("export", help=f"write {WRAPPERS_FILE} from the catalog")
+    find_parser = subparsers.add_parser("find", help="list the photos matching every given field")
+    for field in QUERY_FIELDS:
+        find_parser.add_argument(f"--{field}")
+    args = parser.parse_args()
+
+    with WrapperCatalog.open(sync=False) as catalog:
+        if args.command == "import":
+            changed = catalog.import_json()
+            print(f"✓ Imported {WRAPPERS_FILE}: {changed} rows inserted or changed")
+            print(f"📋 Catalog saved to: {CATALOG_FILE}")
+        elif args.command == "export":
+            catalog.sync_legacy()
+            print(f"📋 Legacy JSON saved to: {catalog.export_json()}")
+        else:
+            catalog.sync_legacy()
+            fields = {field: getattr(args, field) for field in QUERY_FIELDS if getattr(args, field) is not None}
+            entries = catalog.find(**fields)
+            for entry in entries:
+                print(f"{entry['promotion']} ({entry['year']}) {entry['flavor']} {entry['side']}: "
+                      f"{entry['rotated_path'] or entry['path']}")
+            print(f"📊 {len(entries)} photos")
+
+
+if __name__ == "__main__":
+    main()
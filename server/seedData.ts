@@ -0,0 +1,69 @@
+import { existsSync, readFileSync } from "fs";
+import path from "path";
+import { randomUUID } from "crypto";
+import { type Brand, type Promotion, type PromotionItem } from "@shared/schema";
+
+// NDJSON seed dataset written by scripts/seed_data.py. Records carry a stable
+// `key` and point at each other by key; ids and timestamps are generated here.
+export const SEED_DIR = path.resolve("server/seed");
+
+type BrandRecord = Omit<Brand, "id" | "createdAt"> & { key: string };
+type PromotionRecord = Omit<Promotion, "id" | "brandId" | "createdAt"> & { key: string; brand: string };
+type PromotionItemRecord = Omit<PromotionItem, "id" | "promotionId" | "createdAt"> & { key: string; promotion: string };
+
+export interface SeedData {
+  brands: Brand[];
+  promotions: Promotion[];
+  promotionItems: PromotionItem[];
+}
+
+function readRecords<T>(file: string): T[] {
+  if (!existsSync(file)) {
+    return [];
+  }
+  return readFileSync(file, "utf-8")
+    .split("\n")
+    .filter((line) => line.trim())
+    .map((line, index) => {
+      try {
+        return JSON.parse(line) as T;
+      } catch (error) {
+        throw new Error(`${file}:${index + 1}: invalid seed record (${(error as Error).message})`);
+      }
+    });
+}
+
+export function hasSeedData(dir: string = SEED_DIR): boolean {
+  return existsSync(path.join(dir, "promotions.ndjson"));
+}
+
+export function loadSeedData(dir: string = SEED_DIR): SeedData {
+  const brandIds = new Map<string, string>();
+  const promotionIds = new Map<string, string>();
+
+  const brands = readRecords<BrandRecord>(path.join(dir, "brands.ndjson")).map(({ key, ...fields }) => {
+    const brand: Brand = { ...fields, id: randomUUID(), createdAt: new Date() };
+    brandIds.set(key, brand.id);
+    return brand;
+  });
+
+  const promotions = readRecords<PromotionRecord>(path.join(dir, "promotions.ndjson")).map(({ key, brand, ...fields }) => {
+    const brandId = brandIds.get(brand);
+    if (!brandId) {
+      throw new Error(`Promotion "${key}" references unknown brand "${brand}"`);
+    }
+    const promotion: Promotion = { ...fields, id: randomUUID(), brandId, createdAt: new Date() };
+    promotionIds.set(key, promotion.id);
+    return promotion;
+  });
+
+  const promotionItems = readRecords<PromotionItemRecord>(path.join(dir, "promotion_items.ndjson")).map(({ key, promotion, ...fields }) => {
+    const promotionId = promotionIds.get(promotion);
+    if (!promotionId) {
+      throw new Error(`Promotion item "${key}" references unknown promotion "${promotion}"`);
+    }
+    return { ...fields, id: randomUUID(), promotionId, createdAt: new Date() };
+  });
+
+  return { brands, promotions, promotionItems };
+}
@@ -1,5 +1,6 @@
 import { type Brand, type Promotion, type PromotionItem, type InsertBrand, type InsertPromotion, type InsertPromotionItem } from "@shared/schema";
 import { randomUUID } from "crypto";
+import { hasSeedData, loadSeedData } from "./seedData";
 
 export interface IStorage {
   // Brands
@@ -41,6 +42,15 @@ export class MemStorage implements IStorage {
   }
 
   private seedData() {
+    // Prefer the NDJSON dataset exported by scripts/seed_data.py
+    if (hasSeedData()) {
+      const seed = loadSeedData();
+      seed.brands.forEach((brand) => this.brands.set(brand.id, brand));
+      seed.promotions.forEach((promotion) => this.promotions.set(promotion.id, promotion));
+      seed.promotionItems.forEach((item) => this.promotionItems.set(item.id, item));
+      return;
+    }
+
     // Seed authentic Mexican promotional data
     const sabritas: Brand = {
       id: randomUUID(),